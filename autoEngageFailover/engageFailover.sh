@@ -6,6 +6,10 @@
 #
 # Script will fail early if the lockFile from previous engage is present.
 #
+# The gocdb-autofailover service runs monitor.py, which probes production
+# and runs this script with 'now' after a prolonged outage. The ping loop
+# below is only used when this script is run without 'now'.
+#
 # Note, after the main instance has been restored, you will need to manually
 # do the following steps:
 # Revert this swap:
@@ -14,6 +18,9 @@
 #
 # Restore hourly cron job:
 # mv /root/cronRunDbUpdate.sh /etc/cron.hourly/
+#
+# Resume the import service (failover_import.py --daemon), if used:
+# rm /etc/gocdb/nofailoverimport
 
 
 # ====================Setup Variables===========================
@@ -25,6 +32,9 @@ lockFile=/root/autoEngageFailover/engage.lock
 # Dir containing the import DB scripts and log file
 importDBdmpFile=/root/importDBdmpFile
 
+# The noImport file of failover_import.py, which pauses its service
+noImportFile=/etc/gocdb/nofailoverimport
+
 # maintainthe current fail count
 failcount=0
 
@@ -188,6 +198,9 @@ errorLogger "Attempting to move cron"
 # - Move hourly cron job to disable (don't want this to execute while in failover mode)
 mv /etc/cron.hourly/cronRunDbUpdate.sh /root
 
+# - Pause the import service, if it runs as one instead of from cron
+echo "Failover engaged $(date), imports paused by engageFailover.sh" > $noImportFile
+
 errorLogger "Swapping server certs"
 
 ## - Swap server cert
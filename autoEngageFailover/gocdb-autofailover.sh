@@ -9,7 +9,9 @@
 # Usage: ./gocdb-autofailover.sh {start|stop|restart|status}
 
 LOCATION=/root/autoEngageFailover
-SCRIPT=engageFailover.sh
+# monitor.py probes production and runs engageFailover.sh after a prolonged outage
+SCRIPT=monitor.py
+CONFIG=$LOCATION/config.ini
 LOGFILE=gocdb-autofailover-log
 LOCKFILE=/var/lock/subsys/gocdb-autofailover
 
@@ -19,7 +21,7 @@ start() {
         then
         echo "gocdb-autofailover LOCK File is Present..."
         else
-        $LOCATION/$SCRIPT 1>> $LOCATION/$LOGFILE  2>> $LOCATION/$LOGFILE &
+        $LOCATION/$SCRIPT -c $CONFIG 1>> $LOCATION/$LOGFILE  2>> $LOCATION/$LOGFILE &
         sleep 1
         ps aux | grep $SCRIPT | grep -v grep &> /dev/null && touch $LOCKFILE && echo "gocdb-autofailover started successfully..." || echo "gocdb-autofailover failed to start..."
         fi
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Monitor the production instance and engage the failover after a prolonged outage.
+
+The production instance and an external site are probed at the same time,
+every few seconds, each over a kept-alive HTTP(S) connection, so a probe
+does not pay for a new TLS handshake. Each probe has its own timeout.
+
+The production instance is counted as down while its probe fails and the
+external site's succeeds. If the external site cannot be reached either,
+it is more likely the local network is down, and that is not counted.
+Once the production instance has been down for downMinutes of the last
+windowMinutes, engageFailover.sh is run with 'now', which emails the
+admins, moves the import cron job aside and creates the lockFile.
+
+The latency of each probe is recorded as a histogram, which can be written
+to a node_exporter textfile.
+"""
+import argparse
+import asyncio
+import collections
+import configparser
+import logging
+import os
+import ssl
+import subprocess
+import sys
+from time import gmtime, monotonic
+import urllib.parse
+
+from mariadbdmp.metrics import PREFIX, quoteLabel
+
+# The upper bounds of the probe latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# The most bytes of a response read.
+MAX_RESPONSE_BYTES = 1024 * 1024
+
+
+class ProbeError(Exception):
+    """The response to a probe was not understood."""
+
+
+class Histogram:
+    """The number of probes taking up to each of LATENCY_BUCKETS seconds."""
+
+    def __init__(self):
+        """Start with no probes."""
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """Count a probe taking seconds."""
+        for number, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.counts[number] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def textLines(self, metric, labels):
+        """Return the lines of a textfile for the histogram, cumulative as Prometheus expects."""
+        lines = ['{0}_bucket{{{1},le="{2}"}} {3}'.format(metric, labels, bound, count)
+                 for bound, count in zip(LATENCY_BUCKETS, self.counts)]
+
+        return lines + ['{0}_bucket{{{1},le="+Inf"}} {2}'.format(metric, labels, self.count),
+                        '{0}_sum{{{1}}} {2}'.format(metric, labels, repr(self.sum)),
+                        '{0}_count{{{1}}} {2}'.format(metric, labels, self.count)]
+
+
+class Probe:
+    """Requests a URL, over a connection kept open between requests."""
+
+    def __init__(self, name, url, timeout, sslContext=None):
+        """Probe url, giving up after timeout seconds, with sslContext for https."""
+        parts = urllib.parse.urlsplit(url)
+
+        if parts.scheme not in ('http', 'https'):
+            raise Exception('Unknown scheme in URL: ' + url + '. Use http or https.')
+
+        self.name = name
+        self.url = url
+        self.timeout = timeout
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self.ssl = (sslContext or ssl.create_default_context()) if parts.scheme == 'https' \
+            else None
+
+        self.reader = None
+        self.writer = None
+        self.latency = Histogram()
+
+        # The outcome of the last probe, True if it succeeded.
+        self.up = None
+
+    async def connect(self):
+        """Open a new connection."""
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl)
+
+    def close(self):
+        """Close the connection, if it is open."""
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = None
+        self.writer = None
+
+    async def request(self):
+        """Send a request and read the response, returning its status."""
+        self.writer.write(('GET {0} HTTP/1.1\r\nHost: {1}\r\n'
+                           'User-Agent: gocdb-failover-monitor\r\n'
+                           'Connection: keep-alive\r\n\r\n').format(
+                               self.target, self.host).encode('ascii'))
+
+        statusLine = await self.reader.readline()
+        if not statusLine:
+            raise ConnectionResetError('connection closed by ' + self.host)
+
+        parts = statusLine.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+            raise ProbeError('bad status line: ' + repr(statusLine))
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if headers.get('transfer-encoding') == 'chunked':
+            await self.readChunks()
+        elif 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length > MAX_RESPONSE_BYTES:
+                raise ProbeError('response too long: ' + headers['content-length'])
+            await self.reader.readexactly(length)
+        else:
+            # The response ends when the connection is closed.
+            await self.reader.read(MAX_RESPONSE_BYTES)
+            headers['connection'] = 'close'
+
+        if headers.get('connection') == 'close' or parts[0] == b'HTTP/1.0':
+            self.close()
+
+        return int(parts[1])
+
+    async def readChunks(self):
+        """Read a chunked response body."""
+        read = 0
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                break
+            read += size
+            if read > MAX_RESPONSE_BYTES:
+                raise ProbeError('response too long')
+            # Each chunk is followed by a line break.
+            await self.reader.readexactly(size + 2)
+
+        # The last chunk is followed by any trailer fields and a blank line.
+        while (await self.reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+
+    async def fetch(self):
+        """Request the URL, on a new connection if the kept-alive one was closed."""
+        reused = self.writer is not None
+        if not reused:
+            await self.connect()
+
+        try:
+            return await self.request()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close()
+            if not reused:
+                raise
+
+        # The server closed the kept-alive connection while it was idle.
+        await self.connect()
+        return await self.request()
+
+    async def check(self):
+        """Probe the URL, returning True if it responded ok in time."""
+        start = monotonic()
+        try:
+            status = await asyncio.wait_for(self.fetch(), self.timeout)
+            self.up = status < 400
+            if not self.up:
+                logging.warning('%s probe of %s returned status %s', self.name, self.url, status)
+        except asyncio.TimeoutError:
+            self.close()
+            self.up = False
+            logging.warning('%s probe of %s timed out after %s secs', self.name, self.url,
+                            self.timeout)
+        except (OSError, ValueError, ProbeError, asyncio.IncompleteReadError) as exc:
+            self.close()
+            self.up = False
+            logging.warning('%s probe of %s failed: %s', self.name, self.url, exc)
+
+        elapsed = monotonic() - start
+        self.latency.observe(elapsed)
+        logging.debug('%s probe took %.3f secs, up %s', self.name, elapsed, self.up)
+
+        return self.up
+
+
+class DownWindow:
+    """How long the production instance was down in the last windowSeconds."""
+
+    def __init__(self, downSeconds, windowSeconds):
+        """Count as an outage being down for downSeconds out of windowSeconds."""
+        if downSeconds > windowSeconds:
+            raise Exception('downMinutes must not be more than windowMinutes.')
+
+        self.downSeconds = downSeconds
+        self.windowSeconds = windowSeconds
+
+        # When each probe in the window was made, and whether it found
+        # production down. Each lasts until the next.
+        self.probes = collections.deque()
+
+    def record(self, when, down):
+        """Record a probe made at when, in monotonic seconds."""
+        self.probes.append((when, down))
+
+        # Drop the probes ended before the window started.
+        while len(self.probes) > 1 and self.probes[1][0] <= when - self.windowSeconds:
+            self.probes.popleft()
+
+    def downtime(self, now):
+        """Return the seconds production was down in the window ending at now."""
+        start = now - self.windowSeconds
+        probes = list(self.probes)
+        total = 0.0
+
+        for (when, down), (ended, _) in zip(probes, probes[1:] + [(now, None)]):
+            if down:
+                total += max(0.0, min(ended, now) - max(when, start))
+
+        return total
+
+    def isOutage(self, now):
+        """Return True if production was down long enough in the window to fail over."""
+        return self.downtime(now) >= self.downSeconds
+
+
+class Conf:
+    """Wrapper class for the config parameters."""
+
+    def __init__(self, path):
+        """Read in the parameters, configuration and set up logging."""
+        config = configparser.ConfigParser()
+
+        config.read(path)
+
+        self.url = config.get('probes', 'url')
+        self.externalUrl = config.get('probes', 'externalUrl')
+        self.key = config.get('probes', 'key', fallback='')
+        self.cert = config.get('probes', 'cert', fallback='')
+        self.verify = config.getboolean('probes', 'verify', fallback=False)
+        self.interval = config.getfloat('probes', 'interval', fallback=30)
+        self.timeout = config.getfloat('probes', 'timeout', fallback=10)
+
+        if self.timeout >= self.interval:
+            raise Exception('[probes] timeout must be less than interval.')
+
+        self.downMinutes = config.getfloat('policy', 'downMinutes', fallback=30)
+        self.windowMinutes = config.getfloat('policy', 'windowMinutes', fallback=60)
+
+        self.engageScript = config.get('failover', 'engageScript')
+        self.lockFile = config.get('failover', 'lockFile')
+
+        self.metricsTextfile = config.get('metrics', 'textfile', fallback='')
+
+        logfile = config.get('logs', 'file')
+
+        if logfile == '':
+            logging.basicConfig(stream=sys.stdout,
+                                format=config.get('logs', 'format'),
+                                datefmt=config.get('logs', 'dateFormat'),
+                                level=config.get('logs', 'level').upper())
+        else:
+            logging.basicConfig(filename=logfile,
+                                format=config.get('logs', 'format'),
+                                datefmt=config.get('logs', 'dateFormat'),
+                                level=config.get('logs', 'level').upper())
+
+        # Ensure all python log times are expressed in UTC, for simplicity and
+        # consistency with other timestamps in the relevant log files.
+        logging.Formatter.converter = gmtime
+
+
+def getConfig():
+    """Set up the arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'config.ini'))
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.config):
+        return args
+
+    raise Exception('Configuration file ' + args.config + ' does not exist')
+
+
+def productionSsl(cnf):
+    """Return the SSL context to probe production with, with the host certificate."""
+    context = ssl.create_default_context()
+
+    if not cnf.verify:
+        # As wget --no-check-certificate did.
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+
+    if cnf.cert != '':
+        context.load_cert_chain(cnf.cert, cnf.key or None)
+
+    return context
+
+
+def writeTextfile(path, probes, window, now):
+    """Write the probe latencies and state to a node_exporter textfile."""
+    metric = PREFIX + 'probe_seconds'
+    lines = ['# HELP ' + metric + ' Latency of the probes, including those that failed.',
+             '# TYPE ' + metric + ' histogram']
+    for probe in probes:
+        lines += probe.latency.textLines(metric, 'probe=' + quoteLabel(probe.name))
+
+    lines += ['# HELP ' + PREFIX + 'probe_up Whether the last probe succeeded.',
+              '# TYPE ' + PREFIX + 'probe_up gauge']
+    lines += ['{0}probe_up{{probe={1}}} {2}'.format(PREFIX, quoteLabel(probe.name),
+                                                      int(bool(probe.up)))
+              for probe in probes]
+
+    lines += ['# HELP ' + PREFIX + 'production_down_seconds'
+              ' Time production was down in the failover window.',
+              '# TYPE ' + PREFIX + 'production_down_seconds gauge',
+              '{0}production_down_seconds {1}'.format(PREFIX, repr(window.downtime(now)))]
+
+    try:
+        with open(path + '.part', 'w', encoding='utf-8') as textfile:
+            textfile.write('\n'.join(lines) + '\n')
+        os.replace(path + '.part', path)
+    except OSError as exc:
+        logging.error('could not write the probe metrics: %s', exc)
+
+
+async def monitor(cnf, production, external, window):
+    """Probe until production has been down long enough to fail over."""
+    wasDown = False
+
+    while True:
+        start = monotonic()
+
+        productionUp, externalUp = await asyncio.gather(production.check(), external.check())
+
+        # If the external site cannot be reached either, it is probably the
+        # local network that is down.
+        down = not productionUp and externalUp
+        if not externalUp:
+            logging.warning("can't reach the external site, not counting the production probe")
+
+        window.record(start, down)
+        now = monotonic()
+
+        if down != wasDown:
+            if down:
+                logging.warning('production is down')
+            else:
+                logging.info('production is up, after %.0f secs down in the last %g mins',
+                             window.downtime(now), cnf.windowMinutes)
+            wasDown = down
+
+        if cnf.metricsTextfile != '':
+            writeTextfile(cnf.metricsTextfile, (production, external), window, now)
+
+        if window.isOutage(now):
+            logging.error('production down for %.0f secs of the last %g mins',
+                          window.downtime(now), cnf.windowMinutes)
+            return
+
+        await asyncio.sleep(max(0.0, cnf.interval - (monotonic() - start)))
+
+
+def engageFailover(cnf):
+    """Run the script that engages the failover, returning its exit status."""
+    logging.error('engaging the failover with %s now', cnf.engageScript)
+
+    return subprocess.call([cnf.engageScript, 'now'])
+
+
+def main():
+    """Execute the program."""
+    try:
+        args = getConfig()
+
+        cnf = Conf(args.config)
+
+        # As engageFailover.sh, fail early if the failover was engaged before.
+        if os.path.exists(cnf.lockFile):
+            logging.error('Lock file from previous failover-engage exists,'
+                          ' to startup delete: %s', cnf.lockFile)
+            return 0
+
+        production = Probe('production', cnf.url, cnf.timeout, productionSsl(cnf))
+        external = Probe('external', cnf.externalUrl, cnf.timeout)
+        window = DownWindow(cnf.downMinutes * 60, cnf.windowMinutes * 60)
+
+        logging.info('monitoring %s every %s secs, failing over after %s mins down'
+                     ' in %s mins', cnf.url, cnf.interval, cnf.downMinutes, cnf.windowMinutes)
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(monitor(cnf, production, external, window))
+        finally:
+            production.close()
+            external.close()
+            loop.close()
+
+        return engageFailover(cnf)
+
+    except Exception:
+        logging.error(sys.exc_info()[1])
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
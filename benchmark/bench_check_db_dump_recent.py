@@ -0,0 +1,133 @@
+#!/usr/bin/python3
+
+"""
+This file benchmarks the script that checks the GOCDB failover process is
+happening.
+
+It compares the time and memory taken to find the last successful run in a
+large, synthetic, log file by the backwards block reader used by
+check.check_db_dump_recent and by the previous approach of reading the whole
+file into a list of lines. Run it from the top of the repository with:
+
+    python3 -m benchmark.bench_check_db_dump_recent [--size-mb N]
+"""
+import argparse
+from datetime import datetime, timedelta
+import os
+import tempfile
+import time
+import tracemalloc
+
+from check import check_db_dump_recent
+
+# The timestamp format used in the update logs.
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S+0000"
+
+
+def write_log(path, size_mb, failures_at_end):
+    """
+    Write a synthetic update log of roughly size_mb megabytes to path.
+
+    Each hour has a successful run, except for the last failures_at_end runs,
+    which fail. This puts the most recent success some distance from the end
+    of the file, as it would be after a few failed cycles.
+    """
+    target_size = size_mb * 1024 * 1024
+    timestamp = datetime(2010, 1, 1)
+    written = 0
+    runs = []
+    with open(path, "w") as log_file:
+        while written < target_size:
+            start = timestamp.strftime(TIMESTAMP_FORMAT)
+            end = (timestamp + timedelta(minutes=1)).strftime(TIMESTAMP_FORMAT)
+            run = "%s\n%s INFO: completed ok\n" % (start, end)
+            log_file.write(run)
+            written += len(run)
+            timestamp += timedelta(hours=1)
+
+        for _ in range(failures_at_end):
+            start = timestamp.strftime(TIMESTAMP_FORMAT)
+            runs.append("%s\n%s ERROR: An Error\n" % (start, start))
+            timestamp += timedelta(hours=1)
+        log_file.write("".join(runs))
+
+    return timestamp
+
+
+def read_whole_file(log_file_path, ok_string):
+    """Find the last success the way the check originally did."""
+    with open(log_file_path, "r") as log_file:
+        line_list = log_file.read().splitlines()
+
+    for line in reversed(line_list):
+        if ok_string in line:
+            return datetime.strptime(line.split(" ")[0], TIMESTAMP_FORMAT)
+
+    return None
+
+
+def read_backwards(log_file_path, checker):
+    """Find the last success using the backwards block reader."""
+    with open(log_file_path, "rb") as log_file:
+        return checker._scan(log_file, 0)
+
+
+def measure(function, *args):
+    """Return the result, wall time and peak allocation of function(*args)."""
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    # Measure memory in a second call, so tracemalloc's overhead is not
+    # included in the timing.
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=300,
+                        help="approximate size of the synthetic log")
+    parser.add_argument("--failures-at-end", type=int, default=24,
+                        help="number of failed runs after the last success")
+    args = parser.parse_args()
+
+    checker = check_db_dump_recent.CheckDBDumpRecent(
+        grace_period=timedelta(hours=7)
+    )
+
+    temp_file, log_file_path = tempfile.mkstemp()
+    os.close(temp_file)
+    try:
+        print("Writing a %s MB synthetic log to %s" % (
+            args.size_mb, log_file_path
+        ))
+        write_log(log_file_path, args.size_mb, args.failures_at_end)
+
+        results = [
+            ("read whole file", measure(
+                read_whole_file, log_file_path, checker.OK_STRING
+            )),
+            ("backwards blocks", measure(
+                read_backwards, log_file_path, checker
+            )),
+        ]
+
+        if results[0][1][0] != results[1][1][0]:
+            raise Exception("The two approaches found different successes.")
+
+        for name, (_, elapsed, peak) in results:
+            print("%-18s %10.4f s %12.1f KiB peak" % (
+                name, elapsed, peak / 1024.0
+            ))
+    finally:
+        os.remove(log_file_path)
+
+
+if __name__ == "__main__":
+    main()
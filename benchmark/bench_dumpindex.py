@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+
+"""
+This file benchmarks the module that indexes the tables of a dump.
+
+It writes a large, synthetic, mysqldump file, uncompressed and gzipped,
+and reports how fast the index is built, in MB of SQL a second, and the
+peak memory it takes, against just reading the lines of the dump. Run it
+from the top of the repository with:
+
+    python3 -m benchmark.bench_dumpindex [--size-mb N]
+"""
+import argparse
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from mariadbdmp import dumpindex
+from mariadbdmp.load import fileBlocks
+from mariadbdmp.stream import blockLines, decompressBlocks
+
+HEADER = (b"-- MySQL dump 10.19  Distrib 10.5.22-MariaDB\n"
+          b"/*!40101 SET NAMES utf8mb4 */;\n"
+          b"/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n")
+
+TABLE = (b"--\n-- Table structure for table `%s`\n--\n\n"
+         b"DROP TABLE IF EXISTS `%s`;\n"
+         b"CREATE TABLE `%s` (\n"
+         b"  `ID` bigint(20) NOT NULL,\n"
+         b"  `NAME` varchar(255) DEFAULT NULL,\n"
+         b"  `DESCRIPTION` longtext DEFAULT NULL,\n"
+         b"  PRIMARY KEY (`ID`),\n"
+         b"  KEY `NAME_IDX` (`NAME`)\n"
+         b") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;\n\n"
+         b"--\n-- Dumping data for table `%s`\n--\n\n"
+         b"LOCK TABLES `%s` WRITE;\n")
+
+# The tables of a GOCDB dump making up most of its size, and their share.
+TABLES = [(b'SERVICES', 4), (b'SITES', 2), (b'DOWNTIMES', 3), (b'USERS', 1)]
+
+# Rows in each extended INSERT statement, about 1 MB with the row below.
+ROWS_PER_INSERT = 8000
+
+
+def write_dump(path, size_mb):
+    """Write a synthetic dump of roughly size_mb megabytes to path, returning its rows."""
+    shares = sum(share for _, share in TABLES)
+    rows = 0
+
+    with open(path, "wb") as dump:
+        dump.write(HEADER)
+        for table, share in TABLES:
+            dump.write(TABLE % ((table,) * 5))
+            target = size_mb * 1024 * 1024 * share // shares
+            written = 0
+            while written < target:
+                values = b",".join(
+                    b"(%d,'host%d.example.org','Notes, with (brackets),(and) \\'quotes\\'')"
+                    % (rows + i, rows + i) for i in range(ROWS_PER_INSERT))
+                statement = b"INSERT INTO `" + table + b"` VALUES " + values + b";\n"
+                dump.write(statement)
+                written += len(statement)
+                rows += ROWS_PER_INSERT
+            dump.write(b"UNLOCK TABLES;\n\n")
+        dump.write(b"-- Dump completed on 2024-01-01  0:00:00\n")
+
+    return rows
+
+
+def read_lines(path):
+    """Read the lines of the dump, as the index does, without indexing them."""
+    size = 0
+    with open(path, "rb") as source:
+        for line in blockLines(decompressBlocks(fileBlocks(source), path)):
+            size += len(line)
+    return size
+
+
+def measure(function, *args):
+    """Return the result, wall time and peak allocation of function(*args)."""
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+
+    # Measure memory in a second call, so tracemalloc's overhead is not
+    # included in the timing.
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return result, elapsed, peak
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=200,
+                        help="approximate size of the synthetic dump")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "dump.sql")
+        print("Writing a %s MB synthetic dump to %s" % (args.size_mb, path))
+        rows = write_dump(path, args.size_mb)
+
+        with open(path, "rb") as source, gzip.open(path + ".gz", "wb", 1) as output:
+            shutil.copyfileobj(source, output)
+
+        for name in (path, path + ".gz"):
+            size, read_elapsed, read_peak = measure(read_lines, name)
+            index, elapsed, peak = measure(dumpindex.buildIndex, name)
+
+            indexed_rows = sum(table["rows"] for table in dumpindex.tables(index))
+            if indexed_rows != rows:
+                raise Exception("Indexed %s rows, but wrote %s." % (indexed_rows, rows))
+
+            mb = size / 1024.0 / 1024.0
+            print("%s" % os.path.basename(name))
+            for label, seconds, peak_bytes in (("read lines", read_elapsed, read_peak),
+                                               ("build index", elapsed, peak)):
+                print("  %-12s %8.2f s %8.1f MB/s %10.1f KiB peak" % (
+                    label, seconds, mb / seconds, peak_bytes / 1024.0
+                ))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
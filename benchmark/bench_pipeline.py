@@ -0,0 +1,187 @@
+#!/usr/bin/python3
+
+"""
+This file benchmarks a whole failover cycle, offline.
+
+It writes a synthetic dump shaped like a GOCDB dump at each scale factor,
+and runs it through the phases of failover_import.py: fetching it from a
+local "remote" path, indexing it, loading it with mysql, and archiving it,
+and then checks a synthetic log as check_db_dump_recent.py does. It
+reports the time, throughput and child CPU time of each phase, and can
+append them to a JSON lines history file, so changes in performance can be
+compared between releases.
+
+By default the dump is loaded into a fake mysql client that reads its
+input at a given rate, so only the script's own overhead is measured. With
+--mysql and --defaults-file it is loaded into a real, throwaway, server
+instead, whose client options must name the database to load. Run it from
+the top of the repository with:
+
+    python3 -m benchmark.bench_pipeline [--scale N ...] [--compression gzip]
+        [--rate-mb N] [--workers N] [--history PATH]
+        [--mysql PATH --defaults-file PATH]
+"""
+import argparse
+import contextlib
+from datetime import timedelta
+import gzip
+import io
+import os
+import shutil
+import stat
+import sys
+import tempfile
+
+from benchmark.bench_check_db_dump_recent import write_log
+from benchmark.gocdb_dump import write_dump
+from check.check_db_dump_recent import CheckDBDumpRecent
+from importMariaDBdmpFile import failover_import
+from mariadbdmp import client
+from mariadbdmp.checkpoint import Checkpoint
+from mariadbdmp.metrics import Metrics
+from mariadbdmp.remote import Remote
+
+# A mysql client that reads its input at a given rate, in bytes a second,
+# and answers the markers a Session sends after each statement.
+FAKE_MYSQL = '''#!{python}
+import sys
+import time
+rate = {rate}
+start = time.monotonic()
+read = 0
+for line in sys.stdin.buffer:
+    read += len(line)
+    if rate:
+        ahead = read / rate - (time.monotonic() - start)
+        if ahead > 0:
+            time.sleep(ahead)
+    if line.startswith(b"SELECT '--end-"):
+        sys.stdout.buffer.write(line[8:-3] + b"\\n")
+        sys.stdout.flush()
+'''
+
+# The timestamp format of the archived dumps.
+TIME_FORMAT = "%Y-%m-%dT%H%M%S"
+
+# The size of the synthetic log checked.
+LOG_SIZE_MB = 10
+
+
+def write_fake_mysql(directory, rate_mb):
+    """Write the fake mysql client to directory, returning its path."""
+    path = os.path.join(directory, "mysql")
+    with open(path, "w") as fake:
+        fake.write(FAKE_MYSQL.format(python=sys.executable, rate=int(rate_mb * 1024 * 1024)))
+    os.chmod(path, stat.S_IRWXU)
+    return path
+
+
+def run_cycle(directory, scale, args, options_path):
+    """
+    Run the phases of a cycle on a dump at the scale factor.
+
+    Returns their Metrics, the rows and bytes of SQL in the dump, and the
+    bytes of input of the phases that do not read the SQL.
+    """
+    remote_dir = os.path.join(directory, "remote")
+    work_dir = os.path.join(directory, "work")
+    archive_dir = os.path.join(directory, "archive")
+    for path in (remote_dir, work_dir, archive_dir):
+        os.makedirs(path, exist_ok=True)
+
+    remote_path = os.path.join(remote_dir, "gocdb.sql")
+    rows = write_dump(remote_path, scale)
+    sql_size = os.path.getsize(remote_path)
+    if args.compression == "gzip":
+        with open(remote_path, "rb") as source, gzip.open(remote_path + ".gz", "wb") as output:
+            shutil.copyfileobj(source, output)
+        os.remove(remote_path)
+        remote_path += ".gz"
+
+    log_path = os.path.join(directory, "update.log")
+    write_log(log_path, LOG_SIZE_MB, 2)
+
+    metrics = Metrics("bench_pipeline_%gx" % scale, history=args.history or "")
+    ok = False
+    try:
+        with metrics.phase("fetch"):
+            dump = failover_import.getDump(Remote("", ""), remote_path, work_dir, "scp")
+
+        with metrics.phase("index"):
+            index = failover_import.indexDump(dump)
+
+        with metrics.phase("import"):
+            checkpoint = Checkpoint(os.path.join(work_dir, failover_import.CHECKPOINT_NAME),
+                                    {"bench": scale})
+            load = failover_import.dumpLoader(dump, args.workers, False, index)
+            failover_import.importDB(options_path, 1, False, load, checkpoint)
+            checkpoint.clear()
+
+        with metrics.phase("archive"):
+            failover_import.archiveDump(dump, archive_dir, TIME_FORMAT,
+                                        {"digest": None, "source": None})
+
+        with metrics.phase("check"), contextlib.redirect_stdout(io.StringIO()):
+            CheckDBDumpRecent(timedelta(hours=2), archive_dir=archive_dir).run(log_path)
+
+        ok = True
+    finally:
+        metrics.write(ok)
+
+    # The bytes each phase reads: the dump as fetched, its SQL, or the log.
+    sizes = {"fetch": os.path.getsize(remote_path), "check": os.path.getsize(log_path)}
+
+    return metrics, sum(rows.values()), sql_size, sizes
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", type=float, nargs="+", default=[1],
+                        help="scale factors of the dump, 1 being about a production dump")
+    parser.add_argument("--compression", choices=("none", "gzip"), default="none",
+                        help="how the fetched dump is compressed")
+    parser.add_argument("--rate-mb", type=float, default=0,
+                        help="MB a second the fake mysql client reads, 0 for no limit")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="concurrent connections to load the dump's tables with")
+    parser.add_argument("--history", help="a JSON lines file to append the results to")
+    parser.add_argument("--mysql", help="a real mysql client to load the dump with")
+    parser.add_argument("--defaults-file",
+                        help="the client options of the real server, naming the database")
+    args = parser.parse_args()
+
+    if (args.mysql is None) != (args.defaults_file is None):
+        parser.error("--mysql and --defaults-file must be given together")
+
+    directory = tempfile.mkdtemp()
+    real_mysql = client.MYSQL
+    try:
+        if args.mysql is not None:
+            client.MYSQL = args.mysql
+            options_path = os.path.abspath(args.defaults_file)
+        else:
+            client.MYSQL = write_fake_mysql(directory, args.rate_mb)
+            options_path = os.path.join(directory, "options.cnf")
+            with open(options_path, "w") as options:
+                options.write("[client]\n")
+
+        for scale in args.scale:
+            cycle_dir = os.path.join(directory, "%gx" % scale)
+            metrics, rows, sql_size, sizes = run_cycle(cycle_dir, scale, args, options_path)
+            shutil.rmtree(cycle_dir)
+
+            print("scale %gx: %d rows, %.1f MB of SQL, compression %s" % (
+                scale, rows, sql_size / 1024.0 / 1024.0, args.compression))
+            for name, phase in metrics.phases.items():
+                mb = sizes.get(name, sql_size) / 1024.0 / 1024.0
+                print("  %-8s %8.2f s %8.1f MB/s %8.2f s child CPU" % (
+                    name, phase["seconds"], mb / max(phase["seconds"], 1e-6),
+                    phase["childCpuSeconds"]))
+    finally:
+        client.MYSQL = real_mysql
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
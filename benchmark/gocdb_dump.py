@@ -0,0 +1,269 @@
+#!/usr/bin/python3
+
+"""
+This file writes synthetic mysqldump files shaped like a GOCDB dump.
+
+The tables, their keys and foreign keys, and the relative number of rows
+in each follow the GOCDB schema, at a scale factor of the size of a
+production dump: 1 is roughly the size of the production database, 10 and
+100 what it might grow to. The rows are random, but the same for the same
+scale and seed, so runs can be compared. Run it from the top of the
+repository to write a dump with:
+
+    python3 -m benchmark.gocdb_dump [--scale N] [--seed N] <path>
+"""
+import argparse
+import random
+
+HEADER = (b"-- MySQL dump 10.19  Distrib 10.5.22-MariaDB, for Linux (x86_64)\n"
+          b"--\n-- Host: localhost    Database: gocdb\n"
+          b"-- ------------------------------------------------------\n"
+          b"-- Server version\t10.5.22-MariaDB\n\n"
+          b"/*!40101 SET @OLD_CHARACTER_SET_CLIENT=@@CHARACTER_SET_CLIENT */;\n"
+          b"/*!40101 SET NAMES utf8mb4 */;\n"
+          b"/*!40103 SET @OLD_TIME_ZONE=@@TIME_ZONE */;\n"
+          b"/*!40103 SET TIME_ZONE='+00:00' */;\n"
+          b"/*!40014 SET @OLD_UNIQUE_CHECKS=@@UNIQUE_CHECKS, UNIQUE_CHECKS=0 */;\n"
+          b"/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;\n"
+          b"/*!40101 SET @OLD_SQL_MODE=@@SQL_MODE, SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;\n"
+          b"/*!40111 SET @OLD_SQL_NOTES=@@SQL_NOTES, SQL_NOTES=0 */;\n\n")
+
+FOOTER = (b"/*!40103 SET TIME_ZONE=@OLD_TIME_ZONE */;\n"
+          b"/*!40101 SET SQL_MODE=@OLD_SQL_MODE */;\n"
+          b"/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n"
+          b"/*!40014 SET UNIQUE_CHECKS=@OLD_UNIQUE_CHECKS */;\n"
+          b"/*!40111 SET SQL_NOTES=@OLD_SQL_NOTES */;\n\n"
+          b"-- Dump completed on 2024-01-01  0:00:00\n")
+
+# The most bytes of rows in each extended INSERT statement, as mysqldump
+# writes with its default net_buffer_length.
+INSERT_BYTES = 1024 * 1024
+
+# Each table of the schema, in the order mysqldump writes them: its name,
+# rows at scale 1, column definitions, keys and a function of
+# (generator, row number, rows of each table) returning the row's SQL
+# values.
+TABLES = [
+    ("NGIS", 60, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`NAME` varchar(255) NOT NULL",
+        "`EMAIL` varchar(255) DEFAULT NULL",
+        "`DESCRIPTION` longtext DEFAULT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "UNIQUE KEY `UNIQ_NGI_NAME` (`NAME`)",
+    ], lambda rng, number, rows: "(%d,'NGI_%d','ngi%d@example.org','%s')" % (
+        number + 1, number, number, words(rng, 12))),
+    ("SITES", 800, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`SHORTNAME` varchar(255) NOT NULL",
+        "`OFFICIALNAME` varchar(255) DEFAULT NULL",
+        "`NGI_ID` bigint(20) DEFAULT NULL",
+        "`COUNTRY` varchar(255) DEFAULT NULL",
+        "`LATITUDE` double DEFAULT NULL",
+        "`LONGITUDE` double DEFAULT NULL",
+        "`CREATIONDATE` datetime NOT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "UNIQUE KEY `UNIQ_SITE_SHORTNAME` (`SHORTNAME`)",
+        "KEY `IDX_SITE_NGI` (`NGI_ID`)",
+        "CONSTRAINT `FK_SITE_NGI` FOREIGN KEY (`NGI_ID`) REFERENCES `NGIS` (`ID`)",
+    ], lambda rng, number, rows: "(%d,'SITE-%d','%s',%d,'%s',%.4f,%.4f,'%s')" % (
+        number + 1, number, words(rng, 4), rng.randint(1, rows["NGIS"]),
+        rng.choice(COUNTRIES), rng.uniform(-90, 90), rng.uniform(-180, 180),
+        date(rng))),
+    ("SERVICETYPES", 200, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`NAME` varchar(255) NOT NULL",
+        "`DESCRIPTION` longtext DEFAULT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "UNIQUE KEY `UNIQ_SERVICETYPE_NAME` (`NAME`)",
+    ], lambda rng, number, rows: "(%d,'org.example.type%d','%s')" % (
+        number + 1, number, words(rng, 20))),
+    ("SERVICES", 10000, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`HOSTNAME` varchar(255) NOT NULL",
+        "`SITE_ID` bigint(20) DEFAULT NULL",
+        "`SERVICETYPE_ID` bigint(20) DEFAULT NULL",
+        "`PRODUCTION` tinyint(1) NOT NULL",
+        "`MONITORED` tinyint(1) NOT NULL",
+        "`DESCRIPTION` longtext DEFAULT NULL",
+        "`CREATIONDATE` datetime NOT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "KEY `IDX_SERVICE_SITE` (`SITE_ID`)",
+        "KEY `IDX_SERVICE_TYPE` (`SERVICETYPE_ID`)",
+        "KEY `IDX_SERVICE_HOSTNAME` (`HOSTNAME`)",
+        "CONSTRAINT `FK_SERVICE_SITE` FOREIGN KEY (`SITE_ID`) REFERENCES `SITES` (`ID`)",
+        "CONSTRAINT `FK_SERVICE_TYPE` FOREIGN KEY (`SERVICETYPE_ID`)"
+        " REFERENCES `SERVICETYPES` (`ID`)",
+    ], lambda rng, number, rows: "(%d,'host%d.example.org',%d,%d,%d,%d,'%s','%s')" % (
+        number + 1, number, rng.randint(1, rows["SITES"]),
+        rng.randint(1, rows["SERVICETYPES"]), rng.randint(0, 1), rng.randint(0, 1),
+        words(rng, 15), date(rng))),
+    ("ENDPOINTLOCATIONS", 12000, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`NAME` varchar(255) DEFAULT NULL",
+        "`URL` varchar(2000) DEFAULT NULL",
+        "`INTERFACENAME` varchar(255) NOT NULL",
+        "`SERVICE_ID` bigint(20) DEFAULT NULL",
+        "`MONITORED` tinyint(1) NOT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "KEY `IDX_ENDPOINT_SERVICE` (`SERVICE_ID`)",
+        "CONSTRAINT `FK_ENDPOINT_SERVICE` FOREIGN KEY (`SERVICE_ID`)"
+        " REFERENCES `SERVICES` (`ID`)",
+    ], lambda rng, number, rows: "(%d,'endpoint%d','https://host%d.example.org:%d/%s',"
+                                 "'org.example.if%d',%d,%d)" % (
+        number + 1, number, number, rng.randint(1024, 65535), rng.choice(WORDS),
+        rng.randint(1, 50), rng.randint(1, rows["SERVICES"]), rng.randint(0, 1))),
+    ("USERS", 15000, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`FORENAME` varchar(255) NOT NULL",
+        "`SURNAME` varchar(255) NOT NULL",
+        "`EMAIL` varchar(255) DEFAULT NULL",
+        "`CERTIFICATEDN` varchar(255) DEFAULT NULL",
+        "`CREATIONDATE` datetime NOT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "KEY `IDX_USER_SURNAME` (`SURNAME`)",
+    ], lambda rng, number, rows: "(%d,'%s','%s','user%d@example.org',"
+                                 "'/C=UK/O=eScience/OU=Example/CN=%s %s %d','%s')" % (
+        number + 1, rng.choice(FORENAMES), rng.choice(SURNAMES), number,
+        rng.choice(FORENAMES), rng.choice(SURNAMES), number, date(rng))),
+    ("ROLES", 25000, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`USER_ID` bigint(20) DEFAULT NULL",
+        "`ROLETYPE` varchar(255) NOT NULL",
+        "`OWNEDENTITY_ID` bigint(20) DEFAULT NULL",
+        "`STATUS` varchar(255) NOT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "KEY `IDX_ROLE_USER` (`USER_ID`)",
+        "CONSTRAINT `FK_ROLE_USER` FOREIGN KEY (`USER_ID`) REFERENCES `USERS` (`ID`)",
+    ], lambda rng, number, rows: "(%d,%d,'%s',%d,'%s')" % (
+        number + 1, rng.randint(1, rows["USERS"]), rng.choice(ROLE_TYPES),
+        rng.randint(1, rows["SITES"]), rng.choice(("STATUS_GRANTED", "STATUS_PENDING")))),
+    ("DOWNTIMES", 60000, [
+        "`ID` bigint(20) NOT NULL AUTO_INCREMENT",
+        "`SEVERITY` varchar(255) NOT NULL",
+        "`DESCRIPTION` longtext DEFAULT NULL",
+        "`STARTDATE` datetime NOT NULL",
+        "`ENDDATE` datetime NOT NULL",
+        "`INSERTDATE` datetime NOT NULL",
+        "`PRIMARYKEY` varchar(255) NOT NULL",
+    ], [
+        "PRIMARY KEY (`ID`)",
+        "UNIQUE KEY `UNIQ_DOWNTIME_PRIMARYKEY` (`PRIMARYKEY`)",
+        "KEY `IDX_DOWNTIME_START` (`STARTDATE`)",
+    ], lambda rng, number, rows: "(%d,'%s','%s','%s','%s','%s','%dG0')" % (
+        number + 1, rng.choice(("OUTAGE", "WARNING")), words(rng, 25),
+        date(rng), date(rng), date(rng), number)),
+    ("DOWNTIMES_SERVICES", 90000, [
+        "`DOWNTIME_ID` bigint(20) NOT NULL",
+        "`SERVICE_ID` bigint(20) NOT NULL",
+    ], [
+        "PRIMARY KEY (`DOWNTIME_ID`,`SERVICE_ID`)",
+        "KEY `IDX_DS_SERVICE` (`SERVICE_ID`)",
+        "CONSTRAINT `FK_DS_DOWNTIME` FOREIGN KEY (`DOWNTIME_ID`)"
+        " REFERENCES `DOWNTIMES` (`ID`)",
+        "CONSTRAINT `FK_DS_SERVICE` FOREIGN KEY (`SERVICE_ID`) REFERENCES `SERVICES` (`ID`)",
+    ], lambda rng, number, rows: "(%d,%d)" % (
+        number * rows["DOWNTIMES"] // rows["DOWNTIMES_SERVICES"] + 1,
+        number % rows["SERVICES"] + 1)),
+]
+
+WORDS = ["grid", "storage", "compute", "site", "tier", "cloud", "network",
+         "upgrade", "kernel", "maintenance", "power", "cooling", "O\\'Brien",
+         "(scheduled)", "intervention", "dCache", "ARC-CE", "HTCondor", "xrootd"]
+
+COUNTRIES = ["United Kingdom", "France", "Germany", "Italy", "Spain",
+             "Netherlands", "Poland", "Czech Republic", "Greece", "Portugal"]
+
+FORENAMES = ["Alex", "Sam", "Jo", "Chris", "Kim", "Robin", "Max", "Charlie"]
+
+SURNAMES = ["Smith", "Jones", "Garcia", "Muller", "Rossi", "Dubois", "Novak"]
+
+ROLE_TYPES = ["Site Administrator", "Site Operations Manager",
+              "NGI Operations Manager", "Regional Staff (ROD)", "Security Officer"]
+
+
+def words(rng, count):
+    """Return count random words, as they would be quoted in an INSERT."""
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def date(rng):
+    """Return a random datetime value, as written by mysqldump."""
+    return "20%02d-%02d-%02d %02d:%02d:%02d" % (
+        rng.randint(10, 24), rng.randint(1, 12), rng.randint(1, 28),
+        rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+
+
+def table_rows(scale):
+    """Return the number of rows of each table at the scale factor."""
+    return {name: max(1, int(rows * scale)) for name, rows, _, _, _ in TABLES}
+
+
+def write_dump(path, scale=1, seed=0):
+    """Write a synthetic GOCDB dump at the scale factor to path, returning its rows."""
+    rng = random.Random(seed)
+    rows = table_rows(scale)
+
+    with open(path, "wb") as dump:
+        dump.write(HEADER)
+
+        for name, _, columns, keys, row in TABLES:
+            dump.write(("--\n-- Table structure for table `%s`\n--\n\n"
+                        "DROP TABLE IF EXISTS `%s`;\n"
+                        "CREATE TABLE `%s` (\n  %s\n) ENGINE=InnoDB AUTO_INCREMENT=%d"
+                        " DEFAULT CHARSET=utf8mb4;\n\n"
+                        "--\n-- Dumping data for table `%s`\n--\n\n"
+                        "LOCK TABLES `%s` WRITE;\n"
+                        "/*!40000 ALTER TABLE `%s` DISABLE KEYS */;\n" % (
+                            name, name, name, ",\n  ".join(columns + keys),
+                            rows[name] + 1, name, name, name)).encode())
+
+            values = []
+            size = 0
+            for number in range(rows[name]):
+                value = row(rng, number, rows)
+                values.append(value)
+                size += len(value) + 1
+                if size >= INSERT_BYTES:
+                    write_insert(dump, name, values)
+                    values = []
+                    size = 0
+            if values:
+                write_insert(dump, name, values)
+
+            dump.write(("/*!40000 ALTER TABLE `%s` ENABLE KEYS */;\n"
+                        "UNLOCK TABLES;\n\n" % name).encode())
+
+        dump.write(FOOTER)
+
+    return rows
+
+
+def write_insert(dump, name, values):
+    """Write an extended INSERT statement of the values to the dump."""
+    dump.write(("INSERT INTO `%s` VALUES %s;\n" % (name, ",".join(values))).encode())
+
+
+def main():
+    """Write a dump."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="where to write the dump")
+    parser.add_argument("--scale", type=float, default=1,
+                        help="the scale factor, 1 being about a production dump")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="the seed of the random rows")
+    args = parser.parse_args()
+
+    rows = write_dump(args.path, args.scale, args.seed)
+    print("Wrote %d rows to %s" % (sum(rows.values()), args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,36 @@ This file contains a script to check the GOCDB failover process is happening.
 
 Specifically, it checks the log file passed as the first argument for evidence
 the process has succeeded recently.
+
+If the log file has no successful runs, for instance because it has just been
+rotated by logrotate, the rotated (and possibly compressed) copies of it are
+searched, newest first.
+
+Optionally, with --state-file, the position reached in the log file and the
+last success found are saved between runs, so that later runs only need to
+read the lines appended to the log file since the previous run.
+
+The output includes performance data for icinga to graph: the seconds since
+the last success, the duration of the last run, the number of runs that
+succeeded and failed in a window, and with --archive-dir the size of the
+last archived dump. Each run of the update script starts with a line
+holding just a timestamp, written by cron, and ends with its last
+timestamped line; the runs are read in a second pass backwards through the
+logs, of at most --history-blocks blocks, so the search for the last success
+still stops at the first one found. A warning is returned if the last run
+took longer than --duration-warning seconds, before runs start to overlap.
 """
+import argparse
+import bz2
 from datetime import datetime, timedelta
+import glob
+import gzip
+import json
+import lzma
+import os
+import re
 import sys
+import tempfile
 
 # These are the return codes icinga expects.
 RETURN_CODE_OK = 0
@@ -15,27 +42,279 @@ RETURN_CODE_WARNING = 1
 RETURN_CODE_CRITICAL = 2
 RETURN_CODE_UNKNOWN = 3
 
+# The size, in bytes, of the blocks read backwards from the end of the log
+# file when looking for the most recent successful run.
+BLOCK_SIZE = 64 * 1024
+
+# The most blocks read back through the log files for the runs in the
+# performance data, so a log without run start lines is not read in full.
+HISTORY_BLOCKS = 16
+
+# The format of the timestamps in the log file.
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S+0000"
+
+# A line of the log file starting with a timestamp, and the rest of it.
+TIMESTAMPED_LINE = re.compile(
+    r"^([0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}\+0000)(.*)$"
+)
+
+# The number of bytes, immediately before the saved offset, kept in the state
+# file to recognise that the log file has been replaced or rewritten.
+STATE_TAIL_SIZE = 64
+
+# The suffixes logrotate adds to rotated copies of the log file, e.g.
+# updateLog.txt.1, updateLog.txt.2.gz or updateLog.txt-20230101.xz.
+ROTATED_SUFFIX = re.compile(r"^[.-][0-9][0-9.-]*(\.(gz|xz|lzma|bz2))?$")
+
+# How to open compressed rotated log files, so they are decompressed as they
+# are read, rather than inflated in full.
+DECOMPRESSORS = {
+    ".gz": gzip.open,
+    ".xz": lzma.open,
+    ".lzma": lzma.open,
+    ".bz2": bz2.open,
+}
+
+
+def reverse_lines(log_file, start=0, block_size=BLOCK_SIZE, max_blocks=None):
+    """
+    Yield the lines of log_file, starting with the last line.
+
+    log_file must be open in binary mode. Rather than reading the whole file,
+    fixed size blocks are read by seeking backwards from the end of the file,
+    so the cost of finding a line is proportional to its distance from the
+    end of the file, not to the size of the file.
+
+    Lines before the offset start, which must be the start of a line, are not
+    read. If max_blocks is given, no more than that many blocks are read, and
+    the earliest line read, which may be incomplete, is not yielded.
+    """
+    log_file.seek(0, os.SEEK_END)
+    position = log_file.tell()
+
+    # The start of the earliest line seen so far, which may carry on into
+    # the block before the one we have just read.
+    remainder = b""
+    blocks = 0
+    while position > start:
+        if max_blocks is not None and blocks == max_blocks:
+            return
+        blocks += 1
+        read_size = min(block_size, position - start)
+        position -= read_size
+        log_file.seek(position)
+        lines = (log_file.read(read_size) + remainder).split(b"\n")
+
+        remainder = lines.pop(0)
+        for line in reversed(lines):
+            yield line.rstrip(b"\r").decode(errors="replace")
+
+    yield remainder.rstrip(b"\r").decode(errors="replace")
+
+
+def rotated_log_paths(log_file_path):
+    """Return the paths of the rotated copies of a log file, newest first."""
+    rotated_paths = [
+        path for path in glob.glob(glob.escape(log_file_path) + "[.-]*")
+        if ROTATED_SUFFIX.match(path[len(log_file_path):])
+    ]
+
+    # logrotate numbers and dates copies differently depending on its
+    # configuration, but in every case the newest copy was written to last.
+    # A copy removed since it was listed, by logrotate say, is left out.
+    mtimes = {}
+    for path in rotated_paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except OSError:
+            pass
+
+    return sorted(mtimes, key=lambda path: (-mtimes[path], path))
+
+
+def last_dump_size(archive_dir):
+    """Return the size, in bytes, of the newest dump in archive_dir, or None."""
+    dump_paths = [
+        path for path in glob.glob(os.path.join(glob.escape(archive_dir), "*.dmp*"))
+        if not path.endswith(".json")
+    ]
+    if not dump_paths:
+        return None
+
+    newest = max(dump_paths, key=lambda path: os.stat(path).st_mtime)
+    if not os.path.isdir(newest):
+        return os.stat(newest).st_size
+
+    # A chunked dump directory.
+    return sum(
+        os.stat(os.path.join(directory, name)).st_size
+        for directory, _, names in os.walk(newest)
+        for name in names
+    )
+
+
+class RunHistory():
+    """
+    The runs of the update script in a window, read backwards from its log.
+
+    A run starts with a line holding just a timestamp, and ends with its
+    last timestamped line. A run is finished once it has succeeded, or a
+    later run has started; the newest run may still be going.
+
+    runs maps the start timestamp of each finished run in the window to its
+    end timestamp, or None if it logged none, and whether it succeeded.
+    open_run is [start, end, succeeded] of the newest run, if unfinished.
+    """
+
+    def __init__(self, ok_string, window_start, runs=None, open_run=None):
+        self.ok_string = ok_string
+        self.window_start = window_start.strftime(TIMESTAMP_FORMAT)
+        self.runs = {
+            start: run for start, run in (runs or {}).items()
+            if start >= self.window_start
+        }
+        self.open_run = None
+
+        # The open run when the state file was saved.
+        self.saved_open_run = open_run
+
+        # The end, and success, of the run whose lines are being read, and
+        # whether any of its lines have been read.
+        self.pending_end = None
+        self.pending_ok = False
+        self.pending_lines = False
+
+        # Whether a run has been seen to start after the run being read.
+        self.later_start = False
+
+        # Whether no more lines are needed, because a line from before the
+        # window has been read, or no earlier lines can be.
+        self.complete = False
+
+    def add_line(self, line):
+        """Add the line before all those added so far."""
+        if self.complete:
+            return
+
+        match = TIMESTAMPED_LINE.match(line)
+        if match is None:
+            # A line from the Oracle update script, or an empty line.
+            self.pending_lines = self.pending_lines or line != ""
+            return
+
+        timestamp, rest = match.groups()
+        if rest.strip() != "":
+            self.pending_lines = True
+            if self.pending_end is None:
+                self.pending_end = timestamp
+            if self.ok_string in rest:
+                self.pending_ok = True
+            return
+
+        self._add_run(timestamp, self.pending_end, self.pending_ok)
+        self.pending_end = None
+        self.pending_ok = False
+        self.pending_lines = False
+
+        if timestamp < self.window_start:
+            self.complete = True
+
+    def _add_run(self, start, end, succeeded):
+        """Record a run, as finished, or as the newest run if it may not be."""
+        if succeeded or self.later_start:
+            if start >= self.window_start:
+                self.runs[start] = [end, succeeded]
+        else:
+            self.open_run = [start, end, succeeded]
+        self.later_start = True
+
+    def finish(self):
+        """
+        Join the oldest lines read, before any run start, to the saved open run.
+
+        Call this once the lines after the position saved in the state file
+        have all been added.
+        """
+        if self.saved_open_run is None:
+            return
+
+        start, end, succeeded = self.saved_open_run
+        if self.pending_lines:
+            end = self.pending_end or end
+            succeeded = succeeded or self.pending_ok
+        self._add_run(start, end, succeeded)
+
+    def counts(self):
+        """Return the number of finished runs in the window that succeeded and failed."""
+        successes = sum(1 for _, succeeded in self.runs.values() if succeeded)
+        return successes, len(self.runs) - successes
+
+    def last_duration(self):
+        """Return the seconds the newest finished run took, or None."""
+        if not self.runs:
+            return None
+
+        start = max(self.runs)
+        end = self.runs[start][0]
+        if end is None:
+            return None
+
+        return (
+            datetime.strptime(end, TIMESTAMP_FORMAT)
+            - datetime.strptime(start, TIMESTAMP_FORMAT)
+        ).total_seconds()
+
 
 class CheckDBDumpRecent():
 
-    def __init__(self, grace_period):
+    def __init__(self, grace_period, state_file_path=None,
+                 window=timedelta(hours=24), duration_warning=None,
+                 archive_dir=None, history_blocks=HISTORY_BLOCKS):
         # This script will not return a critical error code unless the last
         # successful run was this long ago.
         self.GRACE_PERIOD = grace_period
 
+        # If set, where to save how far through the log file this script got,
+        # so the next run can carry on from there.
+        self.state_file_path = state_file_path
+
         # The string the database update script outputs on a successful restore.
         self.OK_STRING = "completed ok"
 
+        # The runs counted in the performance data are those started this
+        # long ago at most.
+        self.window = window
+
+        # If set, a warning is returned if the last run took longer than
+        # this many seconds.
+        self.duration_warning = duration_warning
+
+        # If set, the directory holding the archived dumps.
+        self.archive_dir = archive_dir
+
+        # The most blocks read for the runs in the window, or 0 for none.
+        self.history_blocks = history_blocks
+
+        # The runs read from the log file.
+        self.history = None
+
+        # Problems, such as an unreadable rotated log file, that do not
+        # change the result, printed after it.
+        self.warnings = []
+
     def run(self, log_file_path):
         # Wrap everything in a try...except block so we can return
         # RETURN_CODE_UNKNOWN on a unexpected failure.
         try:
-            # Extract the last line of the log file.
+            # Find the last successful run recorded in the log file.
             # Use a inner try...except block to handle the more expected error
             # of "Couldn't open/read the provided file" differently.
             try:
-                with open(log_file_path, 'r') as log_file:
-                    line_list = log_file.read().splitlines()
+                with open(log_file_path, 'rb') as log_file:
+                    last_success = self._find_last_success(
+                        log_file,
+                        log_file_path,
+                    )
             except IOError:
                 print(
                     "An error occured trying to open/read {0}".format(
@@ -45,38 +324,38 @@ class CheckDBDumpRecent():
 
                 return RETURN_CODE_CRITICAL
 
-            # Assume the failover process has never run, then attempt to
-            # disprove that by looping through the logs.
-            last_success = None
-            for line in reversed(line_list):
-                # If OK_STRING is in the line we are looking at, we need to extract
-                # the timestamp from that line to determine when the failover
-                # process last succeeded.
-                if self.OK_STRING in line:
-                    last_success_timestamp = line.split(" ")[0]
-                    last_success = datetime.strptime(
-                        last_success_timestamp,
-                        "%Y-%m-%dT%H:%M:%S+0000",
-                    )
-                    # We only want the most recent success, so once we have
-                    # found it, break out of this loop
-                    break
+            perfdata = self._perfdata(last_success)
 
             if last_success is None:
                 print(
                     "The failover process has never succeeded, "
-                    "according to %s." % (
-                        log_file_path
+                    "according to %s. | %s" % (
+                        log_file_path,
+                        perfdata,
                     )
                 )
+                self._print_warnings()
                 return RETURN_CODE_CRITICAL
 
-            print("The failover process last succeeded at %s" % last_success)
+            last_duration = self.history.last_duration()
+            message = "The failover process last succeeded at %s" % last_success
+            if (self.duration_warning is not None and last_duration is not None
+                    and last_duration > self.duration_warning):
+                message += ", but its last run took %d seconds" % last_duration
+            print("%s | %s" % (message, perfdata))
+            self._print_warnings()
+
             # If the failover process hasn't succeeded in a while, the
             # timestamp will be old and we want to treat that as an error.
             if last_success < (datetime.now() - self.GRACE_PERIOD):
                 return RETURN_CODE_CRITICAL
 
+            # A run taking nearly as long as the interval between runs will
+            # soon overrun into the next.
+            if (self.duration_warning is not None and last_duration is not None
+                    and last_duration > self.duration_warning):
+                return RETURN_CODE_WARNING
+
             # If we get here, it's all good man.
             return RETURN_CODE_OK
 
@@ -84,15 +363,378 @@ class CheckDBDumpRecent():
             print("An unexpected error occured: {0}".format(error))
             return RETURN_CODE_UNKNOWN
 
+    def _print_warnings(self):
+        """Print the warnings, after the status line."""
+        for warning in self.warnings:
+            print("Warning: %s" % warning)
+
+    def _perfdata(self, last_success):
+        """Return the performance data, in the format icinga expects."""
+        perfdata = []
+
+        if last_success is not None:
+            perfdata.append("since_success=%ds;;%d;0" % (
+                (datetime.now() - last_success).total_seconds(),
+                self.GRACE_PERIOD.total_seconds(),
+            ))
+
+        last_duration = self.history.last_duration()
+        if last_duration is not None:
+            perfdata.append("last_run_duration=%ds;%s;;0" % (
+                last_duration,
+                "" if self.duration_warning is None else "%g" % self.duration_warning,
+            ))
+
+        if self.history_blocks > 0:
+            successes, failures = self.history.counts()
+            perfdata.append("successes=%d;;;0" % successes)
+            perfdata.append("failures=%d;;;0" % failures)
+
+        if self.archive_dir is not None:
+            try:
+                dump_size = last_dump_size(self.archive_dir)
+            except OSError as error:
+                # A dump removed as the archive was read, say.
+                self.warnings.append("could not read the size of the dump in %s: %s" % (
+                    self.archive_dir,
+                    error,
+                ))
+                dump_size = None
+            if dump_size is not None:
+                perfdata.append("dump_size=%dB;;;0" % dump_size)
+
+        return " ".join(perfdata)
+
+    def _find_last_success(self, log_file, log_file_path):
+        """
+        Return the time of the last success in log_file, or None.
+
+        The runs in the window are read into self.history on the way.
+        """
+        window_start = datetime.now() - self.window
+
+        if self.state_file_path is None:
+            self.history = RunHistory(self.OK_STRING, window_start)
+
+            last_success = self._scan(log_file, 0)
+            if last_success is None:
+                last_success = self._scan_rotated(log_file_path)
+
+            self._read_runs(log_file, 0, log_file_path)
+
+            return last_success
+
+        # If the log file is the same file, holding the same lines, as on
+        # the previous run, only the lines appended since need to be read.
+        log_stat = os.fstat(log_file.fileno())
+        saved_state = self._read_state()
+        state = self._load_state(log_file, log_stat, saved_state)
+
+        # The runs finished are kept even if the log file has been rotated.
+        runs = None
+        if isinstance(saved_state, dict) and isinstance(saved_state.get("runs"), dict):
+            runs = saved_state["runs"]
+
+        if state is None:
+            start = 0
+            last_success = None
+            self.history = RunHistory(self.OK_STRING, window_start, runs)
+        else:
+            start = state["offset"]
+            last_success = state["last_success"]
+            if last_success is not None:
+                last_success = datetime.strptime(
+                    last_success,
+                    TIMESTAMP_FORMAT,
+                )
+            self.history = RunHistory(
+                self.OK_STRING, window_start, runs, state.get("open_run"),
+            )
+
+        new_success = self._scan(log_file, start)
+        if new_success is not None:
+            last_success = new_success
+
+        if last_success is None:
+            last_success = self._scan_rotated(log_file_path)
+
+        if state is None:
+            self._read_runs(log_file, 0, log_file_path)
+        elif self._scan_runs(log_file, start, self.history_blocks) is not None:
+            # The lines before the saved offset were read by earlier runs.
+            self.history.finish()
+
+        self._save_state(log_file, log_stat, start, last_success)
+
+        return last_success
+
+    def _scan(self, log_file, start):
+        """
+        Return the time of the last success after offset start, or None.
+
+        Reading stops at the last success.
+        """
+        last_success = None
+
+        # Assume the failover process has never run, then attempt to
+        # disprove that by looping backwards through the logs.
+        for line in reverse_lines(log_file, start):
+            # If OK_STRING is in the line we are looking at, we need to extract
+            # the timestamp from that line to determine when the failover
+            # process last succeeded.
+            if last_success is None and self.OK_STRING in line:
+                last_success_timestamp = line.split(" ")[0]
+                last_success = datetime.strptime(
+                    last_success_timestamp,
+                    TIMESTAMP_FORMAT,
+                )
+
+                # We only want the most recent success, so once we have
+                # found it, stop reading the file.
+                break
+
+        return last_success
+
+    def _scan_rotated(self, log_file_path):
+        """
+        Return the time of the last success in the rotated log files, or None.
+
+        The rotated log files are searched newest first, stopping at the first
+        one with a success in it. Uncompressed files are read backwards, like
+        the log file itself. Compressed files cannot be read backwards, so are
+        decompressed as a stream, a line at a time, keeping only the last
+        success seen.
+        """
+        for path in rotated_log_paths(log_file_path):
+            decompressor = DECOMPRESSORS.get(os.path.splitext(path)[1])
+            try:
+                if decompressor is None:
+                    with open(path, "rb") as rotated_file:
+                        last_success = self._scan(rotated_file, 0)
+                else:
+                    with decompressor(path, "rb") as rotated_file:
+                        last_success = self._scan_forwards(rotated_file)
+            except (IOError, EOFError, lzma.LZMAError) as error:
+                # The older copies may still hold a success.
+                self.warnings.append("could not read %s: %s" % (path, error))
+                continue
+
+            if last_success is not None:
+                return last_success
+
+        return None
+
+    def _read_runs(self, log_file, start, log_file_path):
+        """
+        Read the runs in the window into self.history.
+
+        The log file after offset start is read backwards, then the
+        uncompressed rotated log files, newest first, until a compressed
+        one is reached, as its lines cannot be read backwards. No more than
+        self.history_blocks blocks are read in all.
+        """
+        blocks_left = self._scan_runs(log_file, start, self.history_blocks)
+
+        for path in rotated_log_paths(log_file_path):
+            if self.history.complete or not blocks_left:
+                break
+
+            if os.path.splitext(path)[1] in DECOMPRESSORS:
+                break
+
+            try:
+                with open(path, "rb") as rotated_file:
+                    blocks_left = self._scan_runs(rotated_file, 0, blocks_left)
+            except IOError as error:
+                # The runs cannot be read in order past this file.
+                self.warnings.append("could not read %s: %s" % (path, error))
+                break
+
+    def _scan_runs(self, log_file, start, blocks_left):
+        """
+        Add the lines of log_file after offset start to self.history.
+
+        Return the blocks left of blocks_left, or None if they ran out
+        before the runs in the window, or the start, were read.
+        """
+        size = os.fstat(log_file.fileno()).st_size
+        blocks = -(-(size - start) // BLOCK_SIZE)
+
+        for line in reverse_lines(log_file, start, max_blocks=blocks_left):
+            self.history.add_line(line)
+            if self.history.complete:
+                break
+
+        if blocks > blocks_left and not self.history.complete:
+            # Earlier runs cannot be told apart from the lines not read.
+            self.history.complete = True
+            return None
+
+        return max(0, blocks_left - blocks)
+
+    def _scan_forwards(self, log_file):
+        """Return the time of the last success in log_file, or None."""
+        last_success_line = None
+        for line in log_file:
+            if self.OK_STRING.encode() in line:
+                last_success_line = line
+
+        if last_success_line is None:
+            return None
+
+        return datetime.strptime(
+            last_success_line.decode(errors="replace").split(" ")[0],
+            TIMESTAMP_FORMAT,
+        )
+
+    def _read_state(self):
+        """Return the state saved by the previous run, or None."""
+        try:
+            with open(self.state_file_path, "r") as state_file:
+                return json.load(state_file)
+        except (IOError, ValueError):
+            return None
+
+    def _load_state(self, log_file, log_stat, state):
+        """
+        Return the state saved by the previous run, if it is still valid.
+
+        None is returned, meaning the whole log file must be read, if there is
+        no saved state, or if the log file has since been rotated (it is a
+        different file) or truncated (it is smaller, or the bytes before the
+        saved offset have changed).
+        """
+        if state is None:
+            return None
+
+        try:
+            if (state["device"] != log_stat.st_dev
+                    or state["inode"] != log_stat.st_ino
+                    or state["offset"] > log_stat.st_size):
+                return None
+
+            tail_start = max(0, state["offset"] - STATE_TAIL_SIZE)
+            log_file.seek(tail_start)
+            tail = log_file.read(state["offset"] - tail_start)
+            if tail.hex() != state["tail"]:
+                return None
+        except (KeyError, TypeError):
+            return None
+
+        return state
+
+    def _save_state(self, log_file, log_stat, start, last_success):
+        """Save the end of the last complete line and the last success."""
+        # The last line may still be being written, so only record the
+        # position after the last newline. If there is no newline in the
+        # last block, keep the offset the scan started from.
+        offset = start
+        block_start = max(start, log_stat.st_size - BLOCK_SIZE)
+        log_file.seek(block_start)
+        last_newline = log_file.read(log_stat.st_size - block_start).rfind(b"\n")
+        if last_newline != -1:
+            offset = block_start + last_newline + 1
+
+        tail_start = max(0, offset - STATE_TAIL_SIZE)
+        log_file.seek(tail_start)
+        tail = log_file.read(offset - tail_start)
+
+        if last_success is not None:
+            last_success = last_success.strftime(TIMESTAMP_FORMAT)
+
+        state = {
+            "device": log_stat.st_dev,
+            "inode": log_stat.st_ino,
+            "offset": offset,
+            "tail": tail.hex(),
+            "last_success": last_success,
+            "runs": self.history.runs,
+            "open_run": self.history.open_run,
+        }
+
+        # Write to a temporary file and rename it into place, so a
+        # concurrent run never reads a partially written state file.
+        state_dir = os.path.dirname(os.path.abspath(self.state_file_path))
+        try:
+            temp_file, temp_file_path = tempfile.mkstemp(dir=state_dir)
+            try:
+                with os.fdopen(temp_file, "w") as state_file:
+                    json.dump(state, state_file)
+                os.replace(temp_file_path, self.state_file_path)
+            except BaseException:
+                os.remove(temp_file_path)
+                raise
+        except IOError as error:
+            # The result found in the log file still stands, only the next
+            # run will read the whole log file again.
+            self.warnings.append("could not save the state to %s: %s" % (
+                self.state_file_path,
+                error,
+            ))
+
+
+class ArgumentParser(argparse.ArgumentParser):
+    """An ArgumentParser that reports bad usage as RETURN_CODE_UNKNOWN."""
+
+    def error(self, message):
+        print(message)
+        sys.exit(RETURN_CODE_UNKNOWN)
+
 
 if __name__ == "__main__":
+    parser = ArgumentParser()
     # Handle error when no file path is provided.
-    try:
-        log_file = sys.argv[1]
-    except IndexError:
+    parser.add_argument(
+        "log_file",
+        nargs="?",
+        help="the log file of the failover process to check",
+    )
+    parser.add_argument(
+        "--state-file",
+        help="a file, writable by this script, in which to save how far "
+             "through the log file this run got, so that the next run only "
+             "reads newly appended lines",
+    )
+    parser.add_argument(
+        "--window-hours",
+        type=float,
+        default=24,
+        help="count the runs that succeeded and failed in this many hours, "
+             "in the performance data (default 24)",
+    )
+    parser.add_argument(
+        "--duration-warning",
+        type=float,
+        help="warn if the last run took longer than this many seconds, e.g. "
+             "2880 (80%% of the hourly interval between runs)",
+    )
+    parser.add_argument(
+        "--history-blocks",
+        type=int,
+        default=HISTORY_BLOCKS,
+        help="read at most this many 64KiB blocks back through the logs for "
+             "the runs in the performance data, or 0 for none (default %d)" % (
+                 HISTORY_BLOCKS
+             ),
+    )
+    parser.add_argument(
+        "--archive-dir",
+        help="the directory of archived dumps, to report the size of the "
+             "newest in the performance data",
+    )
+    args = parser.parse_args()
+
+    if args.log_file is None:
         print("No file path provided as the first argument")
         sys.exit(RETURN_CODE_UNKNOWN)
 
-    checker = CheckDBDumpRecent(grace_period=timedelta(hours=7))
+    checker = CheckDBDumpRecent(
+        grace_period=timedelta(hours=7),
+        state_file_path=args.state_file,
+        window=timedelta(hours=args.window_hours),
+        duration_warning=args.duration_warning,
+        archive_dir=args.archive_dir,
+        history_blocks=args.history_blocks,
+    )
     # Run the checker and report the status code back.
-    sys.exit(checker.run(log_file))
+    sys.exit(checker.run(args.log_file))
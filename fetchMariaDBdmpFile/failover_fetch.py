@@ -4,6 +4,9 @@ Perform a dump of a (remote) database and save locally.
 
 Use the mysqldump utility to execute a (remote) database dump
 and store the result locally, keeping a copy of the previous dump.
+
+The options, such as compression and parallel dumps, are described in
+failover_fetch.ini_TEMPLATE.
 """
 import argparse
 import configparser
@@ -12,6 +15,14 @@ import os
 import shutil
 import subprocess
 import sys
+from time import time
+
+from mariadbdmp.client import clientOptions
+from mariadbdmp.compression import COMPRESSORS, SUFFIXES, compressCommand
+from mariadbdmp.daemon import Service, locked
+from mariadbdmp.dumpindex import INDEX_SUFFIX, buildIndex, summary, writeIndex
+from mariadbdmp.metrics import Metrics
+from mariadbdmp.paralleldump import FORMAT_SUFFIXES, MYSQLDUMP, parallelDump
 
 
 class Conf:
@@ -31,6 +42,38 @@ class Conf:
         self.dumpFile = config.get('local', 'dumpFile')
         self.databaseName = config.get('local', 'databaseName')
 
+        self.compression = config.get('local', 'compression', fallback='')
+        self.compressionLevel = config.get('local', 'compressionLevel', fallback='')
+        self.compressionThreads = config.getint('local', 'compressionThreads', fallback=1)
+
+        self.dumpWorkers = config.getint('local', 'dumpWorkers', fallback=1)
+        self.chunkRows = config.getint('local', 'chunkRows', fallback=500000)
+        self.dumpFormat = config.get('local', 'dumpFormat', fallback='sql')
+
+        self.index = config.getboolean('local', 'index', fallback=False)
+
+        self.metricsTextfile = config.get('metrics', 'textfile', fallback='')
+        self.metricsHistory = config.get('metrics', 'history', fallback='')
+
+        self.lockFile = config.get('daemon', 'lockFile', fallback=self.dumpFile + '.lock')
+        self.intervalSeconds = config.getint('daemon', 'intervalSeconds', fallback=3600)
+        self.pollSeconds = config.getint('daemon', 'pollSeconds', fallback=60)
+        self.retrySeconds = config.getint('daemon', 'retrySeconds', fallback=600)
+
+        if self.compression != '' and self.compression not in COMPRESSORS:
+            raise Exception('Unknown compression: ' + self.compression
+                            + '. Expected one of: ' + ', '.join(sorted(COMPRESSORS)))
+
+        # The import decompresses a single file dump going by its suffix.
+        if (self.compression != '' and self.dumpWorkers == 1 and self.dumpFormat == 'sql'
+                and not self.dumpFile.endswith(SUFFIXES[self.compression])):
+            raise Exception('dumpFile must end with ' + SUFFIXES[self.compression]
+                            + ' with compression=' + self.compression)
+
+        if self.dumpFormat not in FORMAT_SUFFIXES:
+            raise Exception('Unknown dumpFormat: ' + self.dumpFormat
+                            + '. Expected one of: ' + ', '.join(sorted(FORMAT_SUFFIXES)))
+
         logfile = config.get('logs', 'file')
 
         if logfile == '':
@@ -64,6 +107,8 @@ def getConfig():
     """Set up the single argument."""
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', default='./fetchMariaDBdmpFile/failover_fetch.ini')
+    parser.add_argument('--daemon', action='store_true',
+                        help='run as a service, dumping every [daemon] intervalSeconds')
 
     args = parser.parse_args()
 
@@ -89,7 +134,7 @@ def runDump(mysqlOptionsPath, databaseName):
     """Run the dump."""
     logging.debug('running mysqldump ... ')
 
-    args = ['/usr/bin/mysqldump',
+    args = [MYSQLDUMP,
             '--defaults-extra-file=' + mysqlOptionsPath,
             databaseName]
 
@@ -98,47 +143,185 @@ def runDump(mysqlOptionsPath, databaseName):
     logging.debug('mysqldump completed')
 
 
+def runCompressedDump(mysqlOptionsPath, databaseName, compressArgs, outputPath):
+    """Run the dump, compressing its output straight into outputPath."""
+    logging.debug('running mysqldump | %s ... ', compressArgs[0])
+
+    # Override any result-file in the options file so the dump is
+    # written to stdout, and from there to the compressor.
+    dumpArgs = [MYSQLDUMP,
+                '--defaults-extra-file=' + mysqlOptionsPath,
+                '--result-file=/dev/stdout',
+                databaseName]
+
+    logging.debug('running command: %s | %s', ' '.join(dumpArgs), ' '.join(compressArgs))
+
+    # there is clear text personal data in the dump so make sure
+    # the permissions are appropriate
+    outputFd = os.open(outputPath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+
+    with os.fdopen(outputFd, 'wb') as output:
+        compressor = subprocess.Popen(compressArgs, stdin=subprocess.PIPE,
+                                      stdout=output, stderr=subprocess.PIPE)
+        dump = subprocess.Popen(dumpArgs, stdout=compressor.stdin,
+                                stderr=subprocess.PIPE)
+        # Only the dump should hold the write end of the pipe open, so the
+        # compressor sees end of file when the dump exits.
+        compressor.stdin.close()
+
+        dumpErr = dump.communicate()[1]
+        compressErr = compressor.stderr.read()
+        compressor.stderr.close()
+        compressor.wait()
+
+    for args, process, err in ((dumpArgs, dump, dumpErr),
+                               (compressArgs, compressor, compressErr)):
+        if process.returncode != 0:
+            logging.error('command failed: %s', ' '.join(args))
+            os.remove(outputPath)
+            raise Exception(err.decode(errors='replace').rstrip())
+
+    logging.debug('mysqldump completed')
+
+
+def runParallelDump(cnf, directory):
+    """Run the dump over several connections into a directory of chunk files."""
+    compressArgs = None
+    suffix = ''
+    if cnf.compression != '':
+        compressArgs = compressCommand(cnf.compression, cnf.compressionLevel, 1)
+        suffix = SUFFIXES[cnf.compression]
+
+    with clientOptions(cnf.mysqlOptionsPath) as clientOptionsPath:
+        parallelDump(cnf.mysqlOptionsPath, clientOptionsPath, cnf.databaseName,
+                     directory, cnf.dumpWorkers, cnf.chunkRows,
+                     cnf.compression, compressArgs, suffix, cnf.dumpFormat)
+
+
+def indexDump(resultFile):
+    """Write the index of the dump file to its sidecar file."""
+    logging.debug('indexing dump ...')
+
+    index = buildIndex(resultFile)
+    writeIndex(resultFile, index)
+
+    logging.info('dump has %s', summary(index))
+
+
 def archiveDump(resultFile, dumpFile):
-    """Archive the dump file."""
+    """Archive the dump file, or chunked dump directory, and any index of it."""
     logging.debug('archiving dump ...')
 
     destination = dumpFile + '_old'
 
-    if os.path.exists(destination):
-        os.remove(destination)
+    for suffix in ('', INDEX_SUFFIX):
+        if os.path.isdir(destination + suffix):
+            shutil.rmtree(destination + suffix)
+        elif os.path.exists(destination + suffix):
+            os.remove(destination + suffix)
 
-    if os.path.exists(dumpFile):
-        shutil.move(dumpFile, destination)
+        if os.path.exists(dumpFile + suffix):
+            shutil.move(dumpFile + suffix, destination + suffix)
 
     shutil.move(resultFile, dumpFile)
 
+    if os.path.exists(resultFile + INDEX_SUFFIX):
+        shutil.move(resultFile + INDEX_SUFFIX, dumpFile + INDEX_SUFFIX)
+
     logging.debug('archive completed ')
 
 
-def main():
-    """Execute the program."""
+def runCycle(cnf):
+    """Dump the database, unless noFetch exists, returning the exit status."""
+    metrics = Metrics('failover_fetch', cnf.metricsTextfile, cnf.metricsHistory)
+    ok = False
     try:
-        args = getConfig()
+        with metrics.phase('noFetch'):
+            noFetch = os.path.isfile(cnf.noFetch)
 
-        cnf = Conf(args.config)
-
-        if os.path.isfile(cnf.noFetch):
+        if noFetch:
             logging.error('%s exists. No fetch attempted. File contents -', cnf.noFetch)
             with open(cnf.noFetch, encoding='utf-8') as fileText:
                 logging.error(fileText.read().rstrip())
             return 1
 
-        runDump(cnf.mysqlOptionsPath, cnf.databaseName)
+        # Tab delimited data is always dumped into a chunked dump directory.
+        if cnf.dumpWorkers > 1 or cnf.dumpFormat == 'tab':
+            # Dump into a directory alongside dumpFile, so archiving it is
+            # just a rename.
+            partDir = cnf.dumpFile + '.part'
+
+            with metrics.phase('mysqldump'):
+                runParallelDump(cnf, partDir)
+
+            with metrics.phase('archive'):
+                archiveDump(partDir, cnf.dumpFile)
+        elif cnf.compression == '':
+            with metrics.phase('mysqldump'):
+                runDump(cnf.mysqlOptionsPath, cnf.databaseName)
+
+            if cnf.index:
+                with metrics.phase('index'):
+                    indexDump(cnf.resultFile)
+
+            with metrics.phase('archive'):
+                archiveDump(cnf.resultFile, cnf.dumpFile)
+        else:
+            # Compress into a file alongside dumpFile, so archiving it is
+            # just a rename. It keeps the suffix, so it is indexed decompressed.
+            suffix = SUFFIXES[cnf.compression]
+            partFile = cnf.dumpFile[:-len(suffix)] + '.part' + suffix
 
-        archiveDump(cnf.resultFile, cnf.dumpFile)
+            with metrics.phase('mysqldump'):
+                runCompressedDump(cnf.mysqlOptionsPath, cnf.databaseName,
+                                  compressCommand(cnf.compression,
+                                                  cnf.compressionLevel,
+                                                  cnf.compressionThreads),
+                                  partFile)
+
+            if cnf.index:
+                with metrics.phase('index'):
+                    indexDump(partFile)
+
+            with metrics.phase('archive'):
+                archiveDump(partFile, cnf.dumpFile)
 
         logging.info('completed ok')
+        ok = True
         return 0
 
     except Exception:
         logging.error(sys.exc_info()[1])
         return 1
 
+    finally:
+        metrics.write(ok)
+
+
+def main():
+    """Execute the program."""
+    try:
+        args = getConfig()
+
+        cnf = Conf(args.config)
+
+        if args.daemon:
+            # Each interval is a new input, dumped once.
+            Service(lambda: int(time() // cnf.intervalSeconds), lambda: runCycle(cnf) == 0,
+                    cnf.noFetch, cnf.lockFile, cnf.pollSeconds, 0, cnf.retrySeconds).serve()
+            return 0
+
+        with locked(cnf.lockFile) as acquired:
+            if not acquired:
+                logging.info('another fetch holds %s. No fetch attempted.', cnf.lockFile)
+                return 0
+
+            return runCycle(cnf)
+
+    except Exception:
+        logging.error(sys.exc_info()[1])
+        return 1
+
 
 if __name__ == '__main__':
     sys.exit(main())
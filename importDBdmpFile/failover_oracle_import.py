@@ -0,0 +1,555 @@
+#!/usr/bin/env python3
+"""
+Fetch a Data Pump export of the production database and import it into the
+local Oracle XE instance, in place of 1_runDbUpdate.sh.
+
+The dump, a single file or a set of files, is fetched while the old schema
+is dropped, as neither needs the other. impdp then imports the dump-file
+set with PARALLEL workers, and the statistics of the schema are gathered.
+
+Optionally, the optimizer statistics imported with the dump, or from a
+statistics table exported with it, are kept instead, and only the tables
+whose rows changed by more than a threshold since those statistics were
+gathered on production, by impdp's row counts, are regathered.
+
+Each table's ". . imported" line from impdp is parsed, as it is written,
+into a record of the table's rows, size and when it finished. The records
+are summarised in the log and kept in lastImport.json in the archive
+directory.
+
+The fetched files are copied to the archive directory while impdp and the
+statistics gathering run. They only replace the last imported dump once
+the import has succeeded.
+
+If the fetch fails after the old schema was dropped, the last imported
+dump is imported again, so the failover database is not left empty, and
+the run still fails.
+
+As with 1_runDbUpdate.sh, 'completed ok' is the last line a successful run
+logs, which check_db_dump_recent.py looks for.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
+import configparser
+import glob
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+from time import gmtime, monotonic, strftime
+
+from mariadbdmp.metrics import Metrics
+from mariadbdmp.remote import Remote
+
+# The record of the last import, in the archive directory.
+STATE_NAME = 'lastImport.json'
+
+# The suffix of a file being copied to the archive directory, until the
+# import succeeds.
+COPY_SUFFIX = '.dmpcopied'
+
+# The line impdp writes as it finishes loading the rows of each table, or
+# partition of a table.
+IMPORTED_LINE = re.compile(
+    r'^\. \. imported "(?P<schema>[^"]+)"\."(?P<table>[^"]+)"(?::"(?P<partition>[^"]+)")?'
+    r'\s+(?P<size>[\d.]+) (?P<unit>[KMGT]?B)\s+(?P<rows>\d+) rows')
+
+# The line impdp writes as it starts loading the rows of the tables.
+TABLE_DATA_LINE = re.compile(r'^Processing object type \S+/TABLE_DATA$')
+
+# The errors of the database, sqlplus and impdp.
+ERROR_LINE = re.compile(r'\b(ORA|SP2|UDI|UDE)-\d{4,5}')
+
+# The ways of updating the optimizer statistics after an import.
+STATS_MODES = ('gather', 'changed')
+
+# The bytes in each unit of size impdp reports.
+UNIT_BYTES = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+
+class Conf:
+    """Wrapper class for the config parameters."""
+
+    def __init__(self, path):
+        """Read in the parameters, configuration and set up logging."""
+        config = configparser.ConfigParser()
+
+        config.read(path)
+
+        self.remoteHost = config.get('remote', 'host')
+        self.remoteUser = config.get('remote', 'user')
+        self.remotePath = config.get('remote', 'path')
+
+        self.dumpDir = config.get('local', 'dumpDir', fallback='/tmp')
+        self.archiveDir = config.get('local', 'archiveDir')
+        self.format = config.get('local', 'format', fallback='_goc5dump_%Y-%m-%d_%H:%M_%S')
+        self.noImport = config.get('local', 'noImport')
+
+        self.oracleHome = config.get('oracle', 'home')
+        self.oracleSid = config.get('oracle', 'sid', fallback='XE')
+        self.passFile = config.get('oracle', 'passFile')
+        self.schema = config.get('oracle', 'schema', fallback='gocdb5')
+        self.directory = config.get('oracle', 'directory', fallback='dmpdir')
+        self.remapTablespace = config.get('oracle', 'remapTablespace', fallback='GOCDB5:users')
+        self.parallel = config.getint('oracle', 'parallel', fallback=1)
+        self.logFile = config.get('oracle', 'logFile', fallback='impGocDump.log')
+
+        self.stats = config.get('stats', 'mode', fallback='gather')
+        self.statsTable = config.get('stats', 'table', fallback='')
+        self.statsThreshold = config.getfloat('stats', 'threshold', fallback=0.1)
+
+        if self.stats not in STATS_MODES:
+            raise Exception('Unknown stats mode: ' + self.stats + '. Use gather or changed.')
+
+        self.metricsTextfile = config.get('metrics', 'textfile', fallback='')
+        self.metricsHistory = config.get('metrics', 'history', fallback='')
+
+        logfile = config.get('logs', 'file')
+
+        if logfile == '':
+            logging.basicConfig(stream=sys.stdout,
+                                format=config.get('logs', 'format'),
+                                datefmt=config.get('logs', 'dateFormat'),
+                                level=config.get('logs', 'level').upper())
+        else:
+            logging.basicConfig(filename=logfile,
+                                format=config.get('logs', 'format'),
+                                datefmt=config.get('logs', 'dateFormat'),
+                                level=config.get('logs', 'level').upper())
+
+        # Ensure all python log times are expressed in UTC, for simplicity and
+        # consistency with other timestamps in the relevant log files.
+        logging.Formatter.converter = gmtime
+
+        checkPerms(self.passFile)
+
+    def environment(self):
+        """Return the environment to run the Oracle commands in."""
+        return dict(os.environ, ORACLE_HOME=self.oracleHome, ORACLE_SID=self.oracleSid,
+                    PATH=os.environ.get('PATH', '') + ':' + self.oracleHome + '/bin',
+                    LD_LIBRARY_PATH=os.environ.get('LD_LIBRARY_PATH', '') + ':'
+                    + self.oracleHome + '/lib')
+
+    def command(self, name):
+        """Return the path of an Oracle command."""
+        return os.path.join(self.oracleHome, 'bin', name)
+
+
+def checkPerms(path):
+    """Check security of permissions on the password file."""
+    if not os.path.exists(path):
+        raise Exception('Oracle password file: ' + path + ' does not exist. Import terminated.')
+
+    # The password file must not be world-readable
+
+    if os.stat(path).st_mode & (os.R_OK | os.W_OK | os.X_OK) != 0:
+        raise Exception('Open permissions found on database password file. Import terminated.')
+
+
+def getConfig():
+    """Set up the arguments."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-c', '--config', default='./importDBdmpFile/config.ini', )
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.config):
+        return args
+
+    raise Exception('Configuration file ' + args.config + ' does not exist')
+
+
+def readUserid(passFile):
+    """Return the user/password of the userid= line of the impdp parfile."""
+    with open(passFile, encoding='utf-8') as parfile:
+        for line in parfile:
+            if line.startswith('userid='):
+                return line.rstrip('\n').split('=', 1)[1]
+
+    raise Exception('No userid= line in ' + passFile)
+
+
+def quoteString(value):
+    """Return value as an SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def runSqlplus(cnf, name, sql):
+    """Run SQL with sqlplus, returning its output, or raising an Exception with it."""
+    logging.debug('running %s with sqlplus ...', name)
+
+    # The password is passed on stdin, so it is not visible to ps.
+    script = 'WHENEVER SQLERROR EXIT FAILURE\nCONNECT {0}\n{1}\nEXIT\n'.format(
+        readUserid(cnf.passFile), sql)
+
+    result = subprocess.run([cnf.command('sqlplus'), '-S', '/nolog'], input=script,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                            universal_newlines=True, env=cnf.environment(), check=False)
+
+    if result.returncode != 0 or ERROR_LINE.search(result.stdout):
+        raise Exception('{0} failed [{1}]: {2}'.format(name, result.returncode,
+                                                       result.stdout.strip()))
+
+    return result.stdout
+
+
+def pointDirectory(cnf, path):
+    """Point the directory object impdp reads the dump from at path."""
+    runSqlplus(cnf, 'create directory', 'CREATE OR REPLACE DIRECTORY {0} AS {1};'.format(
+        cnf.directory, quoteString(path)))
+
+
+def dropSchema(cnf):
+    """Drop the schema, if it exists, as impdp creates it, and point the directory at dumpDir."""
+    pointDirectory(cnf, cnf.dumpDir)
+
+    # ORA-01918: user does not exist.
+    runSqlplus(cnf, 'drop ' + cnf.schema, '\n'.join([
+        'BEGIN',
+        "  EXECUTE IMMEDIATE 'DROP USER {0} CASCADE';".format(cnf.schema),
+        'EXCEPTION',
+        '  WHEN OTHERS THEN',
+        '    IF SQLCODE != -1918 THEN',
+        '      RAISE;',
+        '    END IF;',
+        'END;',
+        '/']))
+
+    logging.debug('schema %s dropped', cnf.schema)
+
+
+def gatherStats(cnf):
+    """Gather the optimizer statistics of the schema."""
+    start = monotonic()
+
+    runSqlplus(cnf, 'gather stats', "EXEC DBMS_STATS.gather_schema_stats('{0}');".format(
+        cnf.schema))
+
+    logging.debug('statistics gathered in %.1f secs', monotonic() - start)
+
+
+def readStatsRows(cnf):
+    """Return the rows each table of the schema had when its statistics were gathered."""
+    output = runSqlplus(cnf, 'read stats', '\n'.join([
+        'SET HEADING OFF FEEDBACK OFF PAGESIZE 0 LINESIZE 200',
+        "SELECT table_name, NVL(TO_CHAR(num_rows), '-') FROM all_tab_statistics"
+        ' WHERE owner = UPPER({0}) AND partition_name IS NULL;'.format(
+            quoteString(cnf.schema))]))
+
+    statsRows = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and (fields[1].isdigit() or fields[1] == '-'):
+            statsRows[fields[0]] = int(fields[1]) if fields[1] != '-' else None
+
+    return statsRows
+
+
+def staleTables(records, statsRows, threshold, statsTable=''):
+    """Return the tables whose imported rows differ from their statistics' by over threshold."""
+    importedRows = {}
+    for record in records:
+        # A partitioned table has a record for each partition.
+        importedRows[record['table']] = importedRows.get(record['table'], 0) + record['rows']
+
+    return sorted(table for table, rows in importedRows.items()
+                  if table != statsTable.upper()
+                  and (statsRows.get(table) is None
+                       or abs(rows - statsRows[table]) > threshold * max(statsRows[table], 1)))
+
+
+def refreshStats(cnf, records):
+    """Keep the statistics imported with the dump, regathering those of tables that changed."""
+    start = monotonic()
+
+    if cnf.statsTable != '':
+        # The statistics table is imported into the schema with the dump.
+        runSqlplus(cnf, 'import stats', 'EXEC DBMS_STATS.import_schema_stats(ownname => {0},'
+                   ' stattab => {1}, statown => {0});'.format(quoteString(cnf.schema),
+                                                              quoteString(cnf.statsTable)))
+
+    stale = staleTables(records, readStatsRows(cnf), cnf.statsThreshold, cnf.statsTable)
+    if stale:
+        runSqlplus(cnf, 'gather stats', '\n'.join(
+            'EXEC DBMS_STATS.gather_table_stats({0}, {1});'.format(
+                quoteString(cnf.schema), quoteString(table)) for table in stale))
+
+    logging.info('kept the imported statistics of %s tables, regathered %s in %.1f secs%s',
+                 len({record['table'] for record in records}) - len(stale), len(stale),
+                 monotonic() - start,
+                 ': ' + ', '.join(stale) if stale else '')
+
+
+def updateStats(cnf, records):
+    """Gather the statistics of the schema, or refresh those imported, as configured."""
+    if cnf.stats == 'changed':
+        refreshStats(cnf, records)
+    else:
+        gatherStats(cnf)
+
+
+def localFiles(directory, pattern):
+    """Return the names of the files in directory matching pattern, in order."""
+    return sorted(os.path.basename(path) for path in glob.glob(os.path.join(directory, pattern))
+                  if os.path.isfile(path))
+
+
+def fetchDump(cnf, remote):
+    """Fetch the dump-file set into dumpDir, returning the names of its files."""
+    logging.debug('fetching remote file(s) ... ')
+
+    # The remote path may match a dump-file set, which must not include
+    # files left from a larger set.
+    pattern = os.path.basename(cnf.remotePath)
+    for name in localFiles(cnf.dumpDir, pattern):
+        os.remove(os.path.join(cnf.dumpDir, name))
+
+    remote.copy(cnf.remotePath, cnf.dumpDir)
+
+    files = localFiles(cnf.dumpDir, pattern)
+    if not files:
+        raise Exception('No dump file matching ' + cnf.remotePath + ' was fetched.')
+
+    logging.debug('fetched %s', ', '.join(files))
+
+    return files
+
+
+def parseImported(line, seconds):
+    """Return the record of an impdp ". . imported" line seen at seconds, or None."""
+    match = IMPORTED_LINE.match(line.strip())
+    if match is None:
+        return None
+
+    return {'schema': match.group('schema'), 'table': match.group('table'),
+            'partition': match.group('partition'), 'rows': int(match.group('rows')),
+            'bytes': int(float(match.group('size')) * UNIT_BYTES[match.group('unit')]),
+            'seconds': seconds}
+
+
+def importDump(cnf, files):
+    """
+    Import the dump-file set with impdp, returning a record of each table imported.
+
+    The seconds of each record are those since the previous table, or
+    since impdp started loading rows, finished. With more than one worker
+    the tables load side by side, so these are when each finished rather
+    than how long it took.
+    """
+    args = [cnf.command('impdp'), 'parfile=' + cnf.passFile, 'schemas=' + cnf.schema,
+            'directory=' + cnf.directory, 'dumpfile=' + ','.join(files),
+            'remap_tablespace=' + cnf.remapTablespace, 'table_exists_action=replace',
+            'logfile=' + cnf.logFile, 'parallel=' + str(cnf.parallel)]
+
+    logging.debug('running command: %s', ' '.join(args))
+    start = monotonic()
+    last = start
+    records = []
+    errors = []
+    output = []
+
+    with subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          universal_newlines=True, env=cnf.environment()) as impdp:
+        for line in impdp.stdout:
+            now = monotonic()
+            output.append(line.rstrip())
+
+            if TABLE_DATA_LINE.match(line.strip()):
+                last = now
+
+            record = parseImported(line, round(now - last, 3))
+            if record is not None:
+                records.append(record)
+                last = now
+            elif ERROR_LINE.search(line):
+                errors.append(line.strip())
+
+    # impdp exits with 5 if it completed with errors.
+    if impdp.returncode != 0 or errors:
+        raise Exception('impdp failed [{0}]: {1}'.format(
+            impdp.returncode, '\n'.join(errors or output[-20:])))
+
+    seconds = monotonic() - start
+    slowest = sorted(records, key=lambda record: -record['seconds'])[:3]
+    logging.info('impdp imported %s tables, %s rows, in %.1f secs with %s workers;'
+                 ' slowest %s', len(records), sum(record['rows'] for record in records),
+                 seconds, cnf.parallel, ', '.join('{0} {1:.1f} secs'.format(
+                     record['table'], record['seconds']) for record in slowest))
+
+    return records
+
+
+def restoreLastImport(cnf):
+    """Import the last imported dump again, after the schema was dropped for one not fetched."""
+    files = localFiles(cnf.archiveDir, '*.dmp')
+    if not files:
+        raise Exception('no imported dump in ' + cnf.archiveDir + ' to restore it from')
+
+    logging.warning('the schema was dropped but the dump not fetched, so importing %s again',
+                    ', '.join(files))
+    # The Oracle server may not be able to read archiveDir, so the files are
+    # copied to dumpDir, which the directory object already points at.
+    staged = []
+    try:
+        for name in files:
+            logging.debug('copying %s to %s', name, cnf.dumpDir)
+            staged.append(os.path.join(cnf.dumpDir, name))
+            shutil.copyfile(os.path.join(cnf.archiveDir, name), staged[-1])
+        updateStats(cnf, importDump(cnf, files))
+    finally:
+        for path in staged:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def copyToArchive(cnf, files):
+    """Copy the fetched files to the archive directory, returning each copy's final path."""
+    if not os.path.isdir(cnf.archiveDir):
+        raise Exception('Archive directory ' + cnf.archiveDir + ' does not exist.')
+
+    stem = os.path.join(cnf.archiveDir, strftime(cnf.format, gmtime()))
+    if len(files) == 1:
+        finals = [stem + '.dmp']
+    else:
+        finals = ['{0}_{1:02d}.dmp'.format(stem, number) for number in range(1, len(files) + 1)]
+
+    for name, final in zip(files, finals):
+        logging.debug('copying %s to %s', name, final)
+        shutil.copyfile(os.path.join(cnf.dumpDir, name), final[:-len('.dmp')] + COPY_SUFFIX)
+
+    return finals
+
+
+def discardCopies(copying):
+    """Remove the copies made for the archive, once the copying has finished."""
+    try:
+        finals = copying.result()
+    except Exception:
+        logging.error('copying the dump to the archive failed: %s', sys.exc_info()[1])
+        return
+
+    for final in finals:
+        copy = final[:-len('.dmp')] + COPY_SUFFIX
+        if os.path.exists(copy):
+            os.remove(copy)
+
+
+def readState(archive):
+    """Return the record of the last import, or an empty one."""
+    try:
+        with open(os.path.join(archive, STATE_NAME), encoding='utf-8') as stateFile:
+            return json.load(stateFile)
+    except FileNotFoundError:
+        return {}
+
+
+def writeState(archive, state):
+    """Replace the record of the last import."""
+    path = os.path.join(archive, STATE_NAME)
+
+    with open(path + '.part', 'w', encoding='utf-8') as stateFile:
+        json.dump(state, stateFile, indent=1, sort_keys=True)
+
+    os.replace(path + '.part', path)
+
+
+def archiveDump(cnf, finals, records):
+    """Replace the last imported dump with the copies of this one, and record the import."""
+    logging.debug('removing all .dmp files in %s', cnf.archiveDir)
+
+    for oldDump in glob.glob(os.path.join(cnf.archiveDir, '*.dmp')):
+        os.remove(oldDump)
+
+    for final in finals:
+        os.replace(final[:-len('.dmp')] + COPY_SUFFIX, final)
+
+    writeState(cnf.archiveDir, {'files': [os.path.basename(final) for final in finals],
+                                'importedAt': strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()),
+                                'tables': records})
+
+    logging.debug('archive completed')
+
+
+def runImport(cnf, remote, metrics):
+    """Fetch the dump while dropping the schema, import it, gather stats and archive it."""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with metrics.phase('fetch'):
+            fetching = executor.submit(fetchDump, cnf, remote)
+            dropping = executor.submit(dropSchema, cnf)
+            wait([fetching, dropping])
+
+        if fetching.exception() is not None:
+            if dropping.exception() is None:
+                try:
+                    restoreLastImport(cnf)
+                except Exception as exc:
+                    # The schema was dropped, so the failover database is empty.
+                    raise Exception('{0}; restoring the last imported dump also failed, so'
+                                    ' schema {1} is EMPTY: {2}'.format(
+                                        fetching.exception(), cnf.schema, exc)) from exc
+            raise fetching.exception()
+
+        if dropping.exception() is not None:
+            raise dropping.exception()
+
+        files = fetching.result()
+
+        # The dump is copied to the archive while it is imported.
+        copying = executor.submit(copyToArchive, cnf, files)
+        try:
+            with metrics.phase('impdp'):
+                records = importDump(cnf, files)
+
+            with metrics.phase('stats'):
+                updateStats(cnf, records)
+
+        except Exception:
+            discardCopies(copying)
+            raise
+
+        with metrics.phase('archive'):
+            archiveDump(cnf, copying.result(), records)
+
+
+def main():
+    """Execute the program."""
+    metrics = None
+    ok = False
+    try:
+        args = getConfig()
+
+        cnf = Conf(args.config)
+
+        metrics = Metrics('failover_oracle_import', cnf.metricsTextfile, cnf.metricsHistory)
+
+        with metrics.phase('noImport'):
+            noImport = os.path.isfile(cnf.noImport)
+
+        if noImport:
+            logging.error('%s exists. No import attempted. File contents -', cnf.noImport)
+            with open(cnf.noImport, encoding='utf-8') as fileText:
+                logging.error(fileText.read().rstrip())
+            return 1
+
+        runImport(cnf, Remote(cnf.remoteUser, cnf.remoteHost), metrics)
+
+        # Do not log anything after this line: other processes rely on it
+        # being the last line of the log.
+        logging.info('completed ok')
+        ok = True
+        return 0
+
+    except Exception:
+        logging.error(sys.exc_info()[1])
+        return 1
+
+    finally:
+        if metrics is not None:
+            metrics.write(ok)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,18 +6,118 @@ Retrieve a mysqldump file from a given location on a remote host and use mysql
 to import the database locally. The remote file can be compressed as a .zip
 archive, in which case it is inflated. After successful load, the dump file
 is archived.
+
+The options, such as streaming, shadow databases, delta loads and several
+targets, are described in failover_import.ini_TEMPLATE.
 """
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import configparser
+import contextlib
 import glob
+import itertools
+import json
 import logging
 import os
 import shutil
 import subprocess
 import sys
-from time import gmtime, strftime, sleep
+from time import gmtime, strftime, sleep, time
 import zipfile
 
+from mariadbdmp import fastload, paralleldump, prewarm, shadow
+from mariadbdmp.checkpoint import Checkpoint
+from mariadbdmp.client import CommandError, Session, clientOptions, quoteName, quoteString
+from mariadbdmp.compression import compressionOf
+from mariadbdmp.daemon import DirectoryWatch, Service, locked
+from mariadbdmp.digest import blocksDigest, dumpDigest
+from mariadbdmp.dumpindex import (INDEX_SUFFIX, INSERT, indexDump, isSeekable, rangeBlocks,
+                                  rangesBlocks, summary, tableDigests, tables)
+from mariadbdmp.fanout import fanOut
+from mariadbdmp.load import (fileBlocks, loadDelimited, loadFile, loadStream, openDump,
+                             runConcurrently, runSql)
+from mariadbdmp.manifest import MANIFEST_NAME, isChunkedDump, readManifest
+from mariadbdmp.metrics import Metrics
+from mariadbdmp.remote import Remote, sameFingerprint
+from mariadbdmp.schema import SchemaSplitter, dumpSections, withoutDatabaseStatements
+from mariadbdmp.stream import blockLines, openStream
+from mariadbdmp.verify import verifyTables
+
+# The record of the last import, in the archive directory.
+STATE_NAME = 'lastImport.json'
+
+# The record of the units of the dump loaded so far, in the work directory,
+# for the first target; the others' names have the section appended.
+CHECKPOINT_NAME = 'importCheckpoint.json'
+
+# The most lines of a single file dump before its first section, which are
+# loaded before each section.
+HEADER_LINES = 1000
+
+# The SQL to create the triggers of the previous generation of the
+# database, in the archive directory, named as CHECKPOINT_NAME is.
+PREVIOUS_TRIGGERS_NAME = 'previousTriggers.sql'
+
+# The section of client options of the database loaded, if no targets are
+# listed.
+DEFAULT_TARGET = 'client-mariadb'
+
+# The rows and checksum of each table when it was last verified, in the
+# archive directory, named as CHECKPOINT_NAME is.
+VERIFIED_NAME = 'verifiedTables.json'
+
+# The digests of the schema and of the data of each table of the last dump
+# loaded, in the archive directory, named as CHECKPOINT_NAME is.
+LOADED_NAME = 'loadedTables.json'
+
+
+class Target:
+    """A database to load the dump into, with its client options in a section of the config."""
+
+    def __init__(self, config, configPath, section, workers):
+        """Read the database from the section, and set the connections to load with."""
+        if not config.has_section(section):
+            raise Exception('Target section [' + section + '] not found in the config.')
+
+        self.section = section
+        self.configPath = configPath
+        self.workers = workers
+        self.database = config.get(section, 'database', fallback='')
+
+    def fileName(self, name):
+        """Return name, for the default target, or name with the section appended."""
+        if self.section == DEFAULT_TARGET:
+            return name
+
+        stem, suffix = os.path.splitext(name)
+        return stem + '-' + self.section + suffix
+
+    @contextlib.contextmanager
+    def options(self):
+        """Yield the path of the client options to load the target with."""
+        # mysql reads the [client-mariadb] section itself.
+        if self.section == DEFAULT_TARGET:
+            yield self.configPath
+            return
+
+        with clientOptions(self.configPath, self.section) as optionsPath:
+            yield optionsPath
+
+
+def readTargets(config, configPath, workers):
+    """Return the Targets listed as section[:workers], separated by commas."""
+    targets = []
+
+    for item in config.get('local', 'targets', fallback=DEFAULT_TARGET).split(','):
+        section, _, targetWorkers = item.strip().partition(':')
+        targets.append(Target(config, configPath, section,
+                              int(targetWorkers) if targetWorkers else workers))
+
+    if len({target.section for target in targets}) != len(targets):
+        raise Exception('Each [local] targets section must be listed only once.')
+
+    return targets
+
 
 class Conf:
     """Wrapper class for the config parameters."""
@@ -33,12 +133,53 @@ class Conf:
         self.remoteHost = config.get('remote', 'host')
         self.remoteUser = config.get('remote', 'user')
         self.remotePath = config.get('remote', 'path')
+        self.transfer = config.get('remote', 'transfer', fallback='scp')
+        self.multiplex = config.getboolean('remote', 'multiplex', fallback=False)
+        self.preflight = config.getboolean('remote', 'preflight', fallback=False)
+        self.checksum = config.getboolean('remote', 'checksum', fallback=False)
+
+        if self.transfer not in ('scp', 'rsync'):
+            raise Exception('Unknown transfer: ' + self.transfer + '. Use scp or rsync.')
 
         self.workDir = config.get('local', 'workDir')
         self.archiveDir = config.get('local', 'archiveDir')
         self.format = config.get('local', 'format')
         self.noImport = config.get('local', 'noImport')
         self.retryCount = config.getint('local', 'retryCount')
+        self.importWorkers = config.getint('local', 'importWorkers', fallback=4)
+        self.fastLoad = config.getboolean('local', 'fastLoad', fallback=False)
+        self.stream = config.getboolean('local', 'stream', fallback=False)
+        self.streamArchive = config.getboolean('local', 'streamArchive', fallback=True)
+        self.skipUnchanged = config.getboolean('local', 'skipUnchanged', fallback=False)
+        self.shadow = config.getboolean('local', 'shadow', fallback=False)
+        self.index = config.getboolean('local', 'index', fallback=False)
+        self.delta = config.getboolean('local', 'delta', fallback=False)
+        self.verify = config.getboolean('local', 'verify', fallback=False)
+
+        self.prewarmTables = [table.strip() for table in config.get(
+            'prewarm', 'tables', fallback='').split(',') if table.strip()]
+        self.prewarmQueries = config.get('prewarm', 'queries', fallback='')
+
+        self.metricsTextfile = config.get('metrics', 'textfile', fallback='')
+        self.metricsHistory = config.get('metrics', 'history', fallback='')
+
+        self.lockFile = config.get('daemon', 'lockFile',
+                                   fallback=os.path.join(self.workDir, 'failover_import.lock'))
+        self.pollSeconds = config.getint('daemon', 'pollSeconds', fallback=60)
+        self.settleSeconds = config.getint('daemon', 'settleSeconds', fallback=30)
+        self.retrySeconds = config.getint('daemon', 'retrySeconds', fallback=600)
+
+        self.targets = readTargets(config, path, self.importWorkers)
+
+        for target in self.targets:
+            if self.shadow and target.database == '':
+                raise Exception('[' + target.section + '] database must be set'
+                                ' with [local] shadow=yes.')
+
+        # The changed tables are reloaded in place, so not into a shadow
+        # database, and could not be rolled back with it.
+        if self.delta and self.shadow:
+            raise Exception('[local] delta=yes cannot be used with shadow=yes.')
 
         logfile = config.get('logs', 'file')
 
@@ -74,9 +215,14 @@ def checkPerms(path):
 
 
 def getConfig():
-    """Set up the single argument."""
+    """Set up the arguments."""
     parser = argparse.ArgumentParser()
     parser.add_argument('-c', '--config', default='./importMariaDBdmpFile/config.ini', )
+    parser.add_argument('--rollback', action='store_true',
+                        help='swap the previous generation of the database back in'
+                             ' (with [local] shadow=yes), instead of importing')
+    parser.add_argument('--daemon', action='store_true',
+                        help='run as a service, importing each new dump as it lands')
 
     args = parser.parse_args()
 
@@ -95,10 +241,10 @@ def runCommand(args):
 
     except subprocess.CalledProcessError as pErr:
         logging.error('command failed: %s', ' '.join(args))
-        raise Exception(pErr.output.rstrip()) from pErr
+        raise CommandError(pErr.output.decode(errors='replace').rstrip()) from pErr
 
 
-def getDump(remoteUser, remoteHost, remotePath, localDir):
+def getDump(remote, remotePath, localDir, transfer, basis=None):
     """Fetch the file from the remote and save it locally."""
     logging.debug('fetching remote file ... ')
 
@@ -106,28 +252,70 @@ def getDump(remoteUser, remoteHost, remotePath, localDir):
     # sure the permissions are appropriate
     os.umask(0o077)
 
-    if remoteUser == '' and remoteHost == '':
-        # Just a local copy
-        args = ['/usr/bin/cp',
-                remotePath,
-                localDir
-                ]
-    else:
-        # scp will replace the local file contents if it already exists
-        # We do not run with '-q' to allow meaningful authentication
-        # error messages to be logged.
-        args = ['/usr/bin/scp',
-                '-o', 'PasswordAuthentication=no',
-                remoteUser + '@' + remoteHost + ':' + remotePath,
-                localDir
-                ]
+    # The remote path may be a chunked dump directory, so copy recursively.
+    remotePath = remotePath.rstrip('/')
+
+    localPath = localDir + '/' + os.path.basename(remotePath)
+
+    if transfer == 'rsync' and basis is not None:
+        seedDump(basis, localPath)
 
-    runCommand(args)
+    remote.copy(remotePath, localDir, transfer)
 
     logging.debug('remote fetch completed')
 
+    return localPath
+
+
+def fetchDigested(remote, remotePath, localDir, transfer, basis=None):
+    """Fetch the dump and save it locally, returning its path and digest."""
+    remotePath = remotePath.rstrip('/')
+
+    if transfer == 'rsync' or remote.stat(remotePath)[2]:
+        # rsync writes only the differences, and a chunked dump is many
+        # files, so the copy is read again.
+        dump = getDump(remote, remotePath, localDir, transfer, basis)
+        return dump, dumpDigest(dump)
+
+    logging.debug('fetching remote file ... ')
+
+    # there is clear text personal data in the dump so try to make
+    # sure the permissions are appropriate
+    os.umask(0o077)
+
     localPath = localDir + '/' + os.path.basename(remotePath)
 
+    # The blocks are digested as they are written, rather than the copy
+    # read again once it is fetched.
+    with openStream(remote, remotePath, localPath) as blocks:
+        digest = blocksDigest(blocks)
+
+    logging.debug('remote fetch completed')
+
+    return localPath, digest
+
+
+def seedDump(basis, localPath):
+    """Link the last dump loaded to localPath, for rsync to send only the differences."""
+    if os.path.lexists(localPath) or not os.path.exists(basis):
+        return
+
+    logging.debug('linking %s to %s as the rsync basis', basis, localPath)
+
+    # rsync writes a new file and renames it into place, so the archived
+    # copy is not changed.
+    try:
+        if os.path.isdir(basis):
+            runCommand(['/usr/bin/cp', '-al', basis, localPath])
+        else:
+            os.link(basis, localPath)
+    except Exception:
+        # On another file system, so there is no basis.
+        logging.debug('no rsync basis: %s', sys.exc_info()[1])
+
+
+def inflateDump(localPath, localDir):
+    """Inflate a fetched .zip archive, returning the path of the dump."""
     suffix = os.path.splitext(localPath)[1]
 
     if suffix == '.zip':
@@ -146,42 +334,724 @@ def getDump(remoteUser, remoteHost, remotePath, localDir):
     return localPath
 
 
-def importDB(optionsPath, importPath, retryCount):
-    """Use mysql to import the file."""
+def addDeferred(optionsPath, indexes, foreignKeys, workers, checkpoint):
+    """Add the indexes and foreign keys held back until after the data was loaded."""
+    logging.debug('adding indexes ...')
+    runConcurrently(lambda statement: checkpoint.run(
+        statement, lambda: runSql(optionsPath, statement + ';')),
+        indexes, workers)
+
+    # The data has no foreign key checks when dumped by mysqldump either,
+    # and adding foreign keys without checks avoids copying the tables.
+    logging.debug('adding foreign keys ...')
+    runConcurrently(lambda statement: checkpoint.run(
+        statement, lambda: runSql(optionsPath,
+                                  'SET foreign_key_checks = 0;\n' + statement + ';')),
+        foreignKeys, workers)
+
+
+def createPost(optionsPath, splitter):
+    """Create the triggers, routines and events held back from the dump."""
+    if not splitter.post:
+        return
+
+    logging.debug('creating triggers, routines and events ...')
+    runSql(optionsPath, splitter.postSql())
+
+
+def verifyIntegrity(optionsPath, workers):
+    """Verify the integrity not checked while fast loading."""
+    # Unique keys are verified as they are added, after the data.
+    start = time()
+
+    fastload.verifyForeignKeys(optionsPath, workers)
+
+    logging.info('integrity checks took %.1f secs', time() - start)
+
+
+def finishDB(optionsPath, splitter, workers, fastLoad, checkpoint):
+    """Add the indexes and foreign keys held back by splitter, and return it."""
+    addDeferred(optionsPath, splitter.indexes, splitter.foreignKeys, workers, checkpoint)
+
+    if fastLoad:
+        verifyIntegrity(optionsPath, workers)
+
+    return splitter
+
+
+def loadChunk(optionsPath, importPath, manifest, chunk, preamble, postamble, resuming):
+    """Load a chunk of a chunked dump directory, of INSERT statements or tab delimited rows."""
+    if resuming:
+        # Remove any rows of the chunk loaded by an earlier attempt.
+        sql = 'DELETE FROM ' + quoteName(chunk['table'])
+        if chunk['where']:
+            sql += ' WHERE ' + chunk['where']
+        runSql(optionsPath, sql + ';')
+
+    path = os.path.join(importPath, chunk['file'])
+
+    if manifest['format'] == 'tab':
+        loadDelimited(optionsPath, path, chunk['table'], manifest['columns'][chunk['table']],
+                      paralleldump.CHUNK_HEADER + preamble, postamble)
+    else:
+        loadFile(optionsPath, path, preamble, postamble)
+
+
+def importChunkedDB(optionsPath, importPath, workers, fastLoad, checkpoint):
+    """
+    Use mysql to import a chunked dump directory, over several connections.
+
+    Returns the SchemaSplitter holding the triggers, routines and events
+    still to be created.
+    """
+    manifest = readManifest(importPath)
+
+    if manifest['format'] not in paralleldump.FORMAT_SUFFIXES:
+        raise Exception('Unknown chunked dump format: ' + manifest['format'])
+
+    splitter = SchemaSplitter()
+
+    with open(os.path.join(importPath, manifest['schema']), 'rb') as schemaFile:
+        tablesSql = b''.join(splitter.filter(schemaFile)).decode()
+
+    logging.debug('creating tables ...')
+    checkpoint.run('schema', lambda: runSql(optionsPath, tablesSql))
+
+    preamble, postamble = b'', b''
+    if fastLoad:
+        preamble, postamble = fastload.PREAMBLE, fastload.POSTAMBLE
+
+    # Start the largest chunks first, so no connection is left loading a
+    # large chunk long after the others have finished.
+    chunks = sorted(manifest['chunks'], key=lambda chunk: -chunk['bytes'])
+
+    logging.debug('loading %s chunks over %s connections ...', len(chunks), workers)
+    runConcurrently(lambda chunk: checkpoint.run(
+        'chunk ' + chunk['file'],
+        lambda: loadChunk(optionsPath, importPath, manifest, chunk, preamble,
+                          postamble, checkpoint.resuming)),
+        chunks, workers)
+
+    return finishDB(optionsPath, splitter, workers, fastLoad, checkpoint)
+
+
+def loadSplitDB(optionsPath, blocks, fastLoad, checkpoint, countRows=False):
+    """
+    Use mysql to load a single file dump, as an iterable of blocks.
+
+    The secondary indexes, foreign keys, triggers, routines and events are
+    held back from the dump as it is streamed to mysql, in the returned
+    SchemaSplitter. So are any statements choosing the database, so the
+    dump is loaded into the database in the client options. If countRows
+    is True, the SchemaSplitter also counts the rows of each table.
+
+    Each table, or other section of the dump, is loaded over its own
+    connection, after the session settings in the header of the dump, and
+    recorded in the checkpoint, so a later attempt can skip it.
+    """
+    splitter = SchemaSplitter(countRows)
+
+    preamble, postamble = b'', b''
+    if fastLoad:
+        preamble, postamble = fastload.PREAMBLE, fastload.POSTAMBLE
+
+    sections = dumpSections(splitter.filter(withoutDatabaseStatements(blockLines(blocks))))
+    header = []
+    sectioned = False
+
+    for name, lines in sections:
+        if name is None:
+            header = list(itertools.islice(lines, HEADER_LINES + 1))
+            if len(header) <= HEADER_LINES:
+                continue
+
+            # Not the header of a mysqldump dump, so the dump is loaded in one go.
+            name, lines, header = 'dump', itertools.chain(header, lines), []
+
+        sectioned = True
+        checkpoint.run(name, lambda: loadStream(
+            optionsPath, lines, b''.join(header) + preamble, postamble))
+
+    if not sectioned:
+        checkpoint.run('dump', lambda: loadStream(optionsPath, header, preamble, postamble))
+
+    return splitter
+
+
+def loadIndexedDB(optionsPath, importPath, index, workers, fastLoad, checkpoint):
+    """
+    Use mysql to load an uncompressed single file dump, with its index.
+
+    Each table is read straight from the dump, and loaded over one of
+    workers connections, largest first. The other sections, views, routines
+    and events, are loaded after the tables, in order.
+
+    Returns the SchemaSplitter holding the definitions still to be added,
+    as loadSplitDB does.
+    """
+    def sectionLines(start, end, splitter):
+        return splitter.filter(withoutDatabaseStatements(blockLines(
+            rangeBlocks(importPath, start, end))))
+
+    splitter = SchemaSplitter()
+
+    preamble, postamble = b''.join(sectionLines(*index['header'], splitter)), b''
+    if fastLoad:
+        preamble, postamble = preamble + fastload.PREAMBLE, fastload.POSTAMBLE
+
+    splitters = [SchemaSplitter() for section in index['sections']]
+
+    def loadSection(section, sectionSplitter):
+        if checkpoint.isDone(section['name']):
+            # Only the definition is needed, for the indexes held back.
+            for _ in sectionLines(*section.get('ddl', section['range']), sectionSplitter):
+                pass
+            return
+
+        checkpoint.run(section['name'], lambda: loadStream(
+            optionsPath, sectionLines(*section['range'], sectionSplitter),
+            preamble, postamble))
+
+    sections = list(zip(index['sections'], splitters))
+    tableSections = sorted([pair for pair in sections if 'table' in pair[0]],
+                           key=lambda pair: -pair[0]['bytes'])
+
+    logging.debug('loading %s tables over %s connections ...', len(tableSections), workers)
+    runConcurrently(lambda pair: loadSection(*pair), tableSections, workers)
+
+    for section, sectionSplitter in sections:
+        if 'table' not in section:
+            loadSection(section, sectionSplitter)
+
+    for sectionSplitter in splitters:
+        splitter.extend(sectionSplitter)
+
+    return splitter
+
+
+def changedTables(state, index):
+    """
+    Return the tables whose data changed since the last dump loaded.
+
+    Returns None if the whole dump is to be loaded: if anything but the data
+    of the tables changed, or the digests of the last dump loaded are not
+    known to match the database.
+    """
+    if state.get('schemaDigest') != index['schemaDigest'] or state.get('tableDigests') is None:
+        return None
+
+    digests = tableDigests(index)
+    if set(digests) != set(state['tableDigests']):
+        return None
+
+    return sorted(table for table, digest in digests.items()
+                  if digest != state['tableDigests'][table])
+
+
+def triggeredTables(optionsPath, changed):
+    """Return those of the changed tables with triggers, in the database loaded."""
+    session = Session(optionsPath)
+    try:
+        return sorted({row[0] for row in session.query(
+            'SELECT EVENT_OBJECT_TABLE FROM information_schema.TRIGGERS'
+            ' WHERE EVENT_OBJECT_SCHEMA = DATABASE() AND EVENT_OBJECT_TABLE IN ('
+            + ', '.join(quoteString(table) for table in changed) + ')')})
+    finally:
+        session.close()
+
+
+def deltaTables(cnf, index):
+    """
+    Return the tables whose data changed since the last dump loaded into every target.
+
+    Returns None if the whole dump is to be loaded: if any target's changed
+    tables differ from the others', or, as deleting and inserting their
+    rows would fire them, any changed table has triggers.
+    """
+    changed = [changedTables(readState(cnf.archiveDir, target.fileName(LOADED_NAME)), index)
+               for target in cnf.targets]
+
+    if any(tables != changed[0] for tables in changed):
+        logging.info('the targets hold different dumps, so the whole dump is loaded')
+        return None
+
+    if not changed[0]:
+        return changed[0]
+
+    for target in cnf.targets:
+        with target.options() as optionsPath:
+            triggered = triggeredTables(optionsPath, changed[0])
+        if triggered:
+            logging.info('%s has triggers on %s, so the whole dump is loaded',
+                         target.section, ', '.join(triggered))
+            return None
+
+    return changed[0]
+
+
+def expectedTables(importPath, index, changed=None):
+    """
+    Return the rows of each table in the dump, and the digest of its data if known.
+
+    The rows are counted in the index of a single file dump, or in the
+    manifest of a chunked dump. If changed is given, only those tables are
+    returned.
+    """
+    if isChunkedDump(importPath):
+        expected = {}
+        for chunk in readManifest(importPath)['chunks']:
+            table = expected.setdefault(chunk['table'], {'rows': 0, 'digest': None})
+            table['rows'] += chunk['rows']
+    else:
+        expected = {section['table']: {'rows': section['rows'], 'digest': section['digest']}
+                    for section in tables(index)}
+
+    if changed is not None:
+        expected = {table: rows for table, rows in expected.items() if table in changed}
+
+    return expected
+
+
+def loadDeltaDB(optionsPath, importPath, index, changed, checkpoint):
+    """
+    Use mysql to reload the data of the changed tables, in one transaction.
+
+    The rows of each table are deleted, and those in the dump inserted,
+    without foreign key checks. Readers see the old rows until all the new
+    ones are committed, when the foreign keys hold again, as they did in
+    the dump.
+    """
+    logging.info('reloading %s changed tables: %s', len(changed), ', '.join(changed))
+
+    header = b''.join(withoutDatabaseStatements(blockLines(
+        rangeBlocks(importPath, *index['header']))))
+
+    preamble = (header + b'SET foreign_key_checks = 0;\nSTART TRANSACTION;\n'
+                + b''.join(b'DELETE FROM ' + quoteName(table).encode() + b';\n'
+                           for table in changed))
+
+    inserts = (line for line in blockLines(rangesBlocks(importPath, [
+        section['range'] for section in tables(index) if section['table'] in changed]))
+        if line.startswith(INSERT))
+
+    checkpoint.run('delta', lambda: loadStream(optionsPath, inserts, preamble, b'COMMIT;\n'))
+
+    return SchemaSplitter()
+
+
+def importFileDB(optionsPath, importPath, workers, fastLoad, checkpoint, index=None):
+    """Use mysql to import the file, adding its indexes and foreign keys after the data."""
+    if index is not None and workers > 1 and isSeekable(importPath):
+        splitter = loadIndexedDB(optionsPath, importPath, index, workers, fastLoad, checkpoint)
+        return finishDB(optionsPath, splitter, workers, fastLoad, checkpoint)
+
+    with openDump(importPath) as dump:
+        return importBlocksDB(optionsPath, fileBlocks(dump), workers, fastLoad, checkpoint)
+
+
+def importStreamDB(optionsPath, remote, remotePath, teePath, workers, fastLoad, checkpoint,
+                   countRows=False):
+    """Use mysql to import the file as it is streamed from the remote host."""
+    logging.debug('streaming remote file ...')
+
+    with openStream(remote, remotePath, teePath) as blocks:
+        return importBlocksDB(optionsPath, blocks, workers, fastLoad, checkpoint, countRows)
+
+
+def importBlocksDB(optionsPath, blocks, workers, fastLoad, checkpoint, countRows=False):
+    """Use mysql to import a single file dump read in blocks, adding its indexes after the data."""
+    splitter = loadSplitDB(optionsPath, blocks, fastLoad, checkpoint, countRows)
+
+    return finishDB(optionsPath, splitter, workers, fastLoad, checkpoint)
+
+
+def dumpLoader(importPath, workers, fastLoad, index=None):
+    """
+    Return a function to load the fetched file, or chunked dump directory.
+
+    With the index of a single file dump, its tables are loaded concurrently.
+
+    The function is passed the path of the client options to load with, and
+    the Checkpoint to record progress in, and returns the SchemaSplitter
+    holding the triggers, routines and events still to be created.
+    """
     # Tested using dump generated using the command
     # > mysqldump --databases --lock-tables --dump-date \
     #             --add-locks -p gocdb -r /tmp/dbdump.sql
 
-    args = ['/usr/bin/mysql',
-            '--defaults-extra-file=' + optionsPath,
-            '-e SOURCE ' + importPath
-            ]
+    if isChunkedDump(importPath):
+        return lambda optionsPath, checkpoint: importChunkedDB(
+            optionsPath, importPath, workers, fastLoad, checkpoint)
+
+    return lambda optionsPath, checkpoint: importFileDB(
+        optionsPath, importPath, workers, fastLoad, checkpoint, index)
+
+
+def deltaLoader(importPath, index, changed):
+    """Return a function to reload the changed tables of the fetched file, as dumpLoader does."""
+    return lambda optionsPath, checkpoint: loadDeltaDB(
+        optionsPath, importPath, index, changed, checkpoint)
+
+
+def sharedLoader(blocks, workers, fastLoad, load, countRows=False):
+    """
+    Return a function to load a single file dump from blocks shared with other targets.
+
+    The blocks can be read only once, so a retry uses load, reading the
+    dump itself, instead. countRows is as for loadSplitDB.
+    """
+    attempts = []
+
+    def loadShared(optionsPath, checkpoint):
+        if attempts:
+            return load(optionsPath, checkpoint)
+
+        attempts.append(True)
+        try:
+            return importBlocksDB(optionsPath, blocks, workers, fastLoad, checkpoint, countRows)
+        finally:
+            # Stop the blocks being queued for this target.
+            blocks.close()
+
+    return loadShared
+
+
+def importDB(optionsPath, retryCount, fastLoad, load, checkpoint):
+    """Use mysql to import the dump with load, returning what load returns."""
+    return loadDB(lambda: load(optionsPath, checkpoint), retryCount, fastLoad, checkpoint)
+
 
+def loadDB(load, retryCount, fastLoad, checkpoint):
+    """Load the dump, resuming from the unit that failed after a transient error."""
+    start = time()
     count = 0
 
     while count < retryCount:
         count += 1
         try:
             logging.debug('loading database from dump file ...')
-            runCommand(args)
+            result = load()
             break
-        except subprocess.CalledProcessError as exc:
+        except CommandError as exc:
             logging.debug('mysql command import failed.')
+            if not exc.isTransient():
+                raise
             if count < retryCount:
-                logging.error('%s. Retrying.', str(sys.exc_info()[1]))
+                logging.error('%s. Resuming.', str(exc))
                 snooze = min(0.1 * (pow(2, count) - 1), 20)
                 logging.debug('sleeping (%s secs)', f'{snooze:.2f}')
                 sleep(snooze)
                 logging.debug('retry %s of %s', str(count), str(retryCount))
+                checkpoint.resuming = True
             else:
                 logging.debug('exceeded retry count for database load failures')
-                raise exc
+                raise
 
     logging.debug('database load completed')
+    logging.info('database load took %.1f secs (fast load %s)',
+                 time() - start, 'on' if fastLoad else 'off')
 
+    return result
 
-def archiveDump(importPath, archive, timeFormat):
-    """Save the dump file in the archive directory."""
+
+def importLiveDB(cnf, optionsPath, load, checkpoint):
+    """Import the dump straight into the live database, returning the SchemaSplitter."""
+    splitter = importDB(optionsPath, max(1, cnf.retryCount), cnf.fastLoad, load, checkpoint)
+
+    createPost(optionsPath, splitter)
+
+    return splitter
+
+
+def adminSession(optionsPath):
+    """Return a Session not using the live database, which may not exist yet."""
+    return Session(optionsPath, 'information_schema')
+
+
+def savePreviousTriggers(archive, target, triggersSql):
+    """Keep the SQL to create the triggers of the previous generation, for a rollback."""
+    with open(os.path.join(archive, target.fileName(PREVIOUS_TRIGGERS_NAME)), 'w',
+              encoding='utf-8') as sqlFile:
+        sqlFile.write(triggersSql)
+
+
+def streamedTables(splitter):
+    """Return the rows of each table of a streamed dump, as the SchemaSplitter counted them."""
+    return {table: {'rows': splitter.rows.get(table, 0), 'digest': None}
+            for table in splitter.tables}
+
+
+def verifyTarget(cnf, target, optionsPath, expected, delta):
+    """Check the target's database holds the rows of the dump, and record their checksums."""
+    name = target.fileName(VERIFIED_NAME)
+    recorded = readState(cnf.archiveDir, name)
+
+    verified = verifyTables(optionsPath, expected, recorded, target.workers)
+
+    # The tables not reloaded are as they were.
+    if delta:
+        recorded.update(verified)
+        verified = recorded
+    writeState(cnf.archiveDir, verified, name)
+
+
+def importShadowDB(cnf, target, optionsPath, load, checkpoint, expected=None):
+    """Import the dump into the shadow database, then swap it in for the live one."""
+    live = target.database
+    shadowDatabase = live + shadow.SHADOW_SUFFIX
+
+    # Keep what an earlier attempt at loading the same dump loaded.
+    if not checkpoint.resuming:
+        session = adminSession(optionsPath)
+        try:
+            shadow.createDatabase(session, shadowDatabase, live)
+        finally:
+            session.close()
+
+    with clientOptions(target.configPath, target.section,
+                       database=shadowDatabase) as shadowOptionsPath:
+        splitter = importDB(shadowOptionsPath, max(1, cnf.retryCount), cnf.fastLoad, load,
+                            checkpoint)
+
+        # Checked before the swap, so a bad load never replaces the live tables.
+        if callable(expected):
+            expected = expected(splitter)
+        if expected is not None:
+            verifyTarget(cnf, target, shadowOptionsPath, expected, False)
+
+    session = adminSession(optionsPath)
+    try:
+        shadow.validate(session, shadowDatabase, splitter.tables)
+        triggersSql = shadow.swap(session, live, shadowDatabase, live + shadow.PREVIOUS_SUFFIX)
+    finally:
+        session.close()
+
+    savePreviousTriggers(cnf.archiveDir, target, triggersSql)
+
+    createPost(optionsPath, splitter)
+
+
+def importTarget(cnf, target, load, source, delta, expected=None, digests=None):
+    """
+    Load the dump into one target, recording its progress in a checkpoint of its own.
+
+    If expected is given, the tables loaded are checked to hold the rows it
+    holds for them. It may instead be a function returning them from the
+    SchemaSplitter the load returned, for a dump counted as it is loaded.
+    If digests is given, it is recorded as what the target holds once the
+    load commits.
+    """
+    # Progress is recorded against the identity of the dump, so a later run
+    # loading the same dump again resumes where this one stopped.
+    checkpoint = Checkpoint(os.path.join(cnf.workDir, target.fileName(CHECKPOINT_NAME)), {
+        'source': source,
+        'database': (target.database + shadow.SHADOW_SUFFIX) if cnf.shadow
+        else target.database,
+    })
+
+    # Until the load commits, the database may not hold what the digests
+    # of the last dump loaded into it say it does.
+    writeState(cnf.archiveDir, {}, target.fileName(LOADED_NAME))
+
+    with target.options() as optionsPath:
+        if cnf.shadow:
+            importShadowDB(cnf, target, optionsPath, load, checkpoint, expected)
+        else:
+            splitter = importLiveDB(cnf, optionsPath, load, checkpoint)
+            if callable(expected):
+                expected = expected(splitter)
+            if expected is not None:
+                verifyTarget(cnf, target, optionsPath, expected, delta)
+
+    if digests is not None:
+        writeState(cnf.archiveDir, digests, target.fileName(LOADED_NAME))
+
+    checkpoint.clear()
+
+
+def importTargets(cnf, loader, source, delta, shared=None, expected=None, digests=None):
+    """
+    Load the dump into every target concurrently, returning the error each failed with.
+
+    loader is called with a target's connections and returns the function
+    to load it with. If shared is given, it is called to read a single file
+    dump, as blocks, once for all the targets. If expected is given, each
+    target is verified against it, and digests recorded, as importTarget does.
+    """
+    targets = cnf.targets
+
+    with contextlib.ExitStack() as stack:
+        if cnf.fastLoad:
+            # Only flush the redo log once a second during the loads, relaxed
+            # and restored once for them all, as targets may share a server.
+            stack.enter_context(fastload.relaxedDurability(
+                [stack.enter_context(target.options()) for target in targets]))
+
+        errors = loadTargets(cnf, loader, source, delta, shared, expected, digests)
+
+    return {target.section: error for target, error in zip(targets, errors)}
+
+
+def loadTargets(cnf, loader, source, delta, shared, expected, digests):
+    """Load the dump into every target concurrently, returning their errors in order."""
+    targets = cnf.targets
+
+    def run(target, blocks=None):
+        load = loader(target.workers)
+        if blocks is not None:
+            load = sharedLoader(blocks, target.workers, cnf.fastLoad, load,
+                                cnf.stream and cnf.verify)
+        importTarget(cnf, target, load, source, delta, expected, digests)
+
+    if len(targets) == 1:
+        try:
+            run(targets[0])
+            errors = [None]
+        except Exception as exc:
+            errors = [exc]
+    elif shared is not None:
+        errors = fanOut(shared(), [lambda blocks, target=target: run(target, blocks)
+                                   for target in targets])
+    else:
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = [executor.submit(run, target) for target in targets]
+            errors = [future.exception() for future in futures]
+
+    return errors
+
+
+def prewarmTargets(cnf, sections):
+    """Warm the buffer pool of each target loaded, concurrently, logging any error."""
+    def run(target):
+        try:
+            queries = []
+            if cnf.prewarmQueries != '':
+                queries = prewarm.readQueries(cnf.prewarmQueries)
+            with target.options() as optionsPath:
+                prewarm.prewarm(optionsPath, cnf.prewarmTables, queries, target.workers)
+        except Exception as exc:
+            # The database is loaded, just not warm.
+            logging.error('could not warm the buffer pool of %s: %s', target.section, exc)
+
+    targets = [target for target in cnf.targets if target.section in sections]
+    runConcurrently(run, targets, max(1, len(targets)))
+
+
+def rollbackDB(cnf):
+    """Swap the previous generation of the database back in, in every target."""
+    for target in cnf.targets:
+        with target.options() as optionsPath:
+            rollbackTarget(cnf, target, optionsPath)
+        writeState(cnf.archiveDir, {}, target.fileName(LOADED_NAME))
+
+    # The live databases no longer hold the last dump loaded, so the next
+    # one is loaded whatever it holds.
+    state = readState(cnf.archiveDir)
+    state.update(digest=None, source=None)
+    writeState(cnf.archiveDir, state)
+
+
+def rollbackTarget(cnf, target, optionsPath):
+    """Swap the previous generation of one target's database back in."""
+    live = target.database
+
+    previousTriggersPath = os.path.join(cnf.archiveDir, target.fileName(PREVIOUS_TRIGGERS_NAME))
+    previousTriggersSql = ''
+    if os.path.isfile(previousTriggersPath):
+        with open(previousTriggersPath, encoding='utf-8') as sqlFile:
+            previousTriggersSql = sqlFile.read()
+
+    session = adminSession(optionsPath)
+    try:
+        triggersSql = shadow.rollback(session, live, live + shadow.SHADOW_SUFFIX,
+                                      live + shadow.PREVIOUS_SUFFIX)
+    finally:
+        session.close()
+
+    savePreviousTriggers(cnf.archiveDir, target, triggersSql)
+
+    if previousTriggersSql:
+        runSql(optionsPath, previousTriggersSql)
+
+    logging.info('rolled %s back to the previous generation', live)
+
+
+def removeDump(path):
+    """Remove a dump file, or chunked dump directory."""
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+    if os.path.exists(path + INDEX_SUFFIX):
+        os.remove(path + INDEX_SUFFIX)
+
+
+def readState(archive, name=STATE_NAME):
+    """Return the record of the last import, or another record named name, or an empty one."""
+    try:
+        with open(os.path.join(archive, name), encoding='utf-8') as stateFile:
+            return json.load(stateFile)
+    except FileNotFoundError:
+        return {}
+
+
+def writeState(archive, state, name=STATE_NAME):
+    """Replace the record of the last import, or another record named name."""
+    path = os.path.join(archive, name)
+
+    with open(path + '.part', 'w', encoding='utf-8') as stateFile:
+        json.dump(state, stateFile, indent=1, sort_keys=True)
+
+    os.replace(path + '.part', path)
+
+
+def recordImport(archive, record, skipped=False):
+    """Update the record of the last import, and log the cycles loaded and skipped."""
+    state = readState(archive)
+    state.update(record)
+
+    if skipped:
+        state['skipped'] = state.get('skipped', 0) + 1
+    else:
+        state['loaded'] = state.get('loaded', 0) + 1
+        state['loadedAt'] = strftime('%Y-%m-%dT%H:%M:%SZ', gmtime())
+
+    writeState(archive, state)
+
+    logging.info('import cycles: %s loaded, %s skipped',
+                 state.get('loaded', 0), state.get('skipped', 0))
+
+
+def recordTargets(archive, errors):
+    """Record, and log, whether the load into each target succeeded."""
+    state = readState(archive)
+    targets = state.setdefault('targets', {})
+    now = strftime('%Y-%m-%dT%H:%M:%SZ', gmtime())
+
+    for section, error in errors.items():
+        if error is None:
+            logging.info('target %s: loaded', section)
+            targets[section] = {'status': 'ok', 'at': now}
+        else:
+            logging.error('target %s: load failed: %s', section, error)
+            targets[section] = {'status': 'failed', 'at': now, 'error': str(error)}
+
+    writeState(archive, state)
+
+
+def skipDump(dump, archive, record):
+    """Discard a fetched dump identical to the last one loaded."""
+    logging.info('dump unchanged since the last load (sha256 %s). Load skipped.',
+                 record['digest'])
+
+    removeDump(dump)
+
+    recordImport(archive, {'source': record['source']}, skipped=True)
+
+
+def archiveDump(importPath, archive, timeFormat, record):
+    """Save the dump file in the archive directory, and record the import."""
     logging.debug('archiving dump file ...')
 
     if not os.path.isdir(archive):
@@ -189,44 +1059,282 @@ def archiveDump(importPath, archive, timeFormat):
 
     logging.debug('removing all .dmp files in %s', archive)
 
-    for oldDump in glob.iglob(archive + '/*.dmp'):
-        os.remove(oldDump)
+    for oldDump in glob.glob(archive + '/*.dmp') + glob.glob(archive + '/*.dmp.*'):
+        # An index is removed with its dump.
+        if os.path.exists(oldDump):
+            removeDump(oldDump)
 
     archivePath = archive + '/' + strftime(timeFormat, gmtime()) + '.dmp'
 
+    # A dump saved as it was streamed is still compressed.
+    suffix = os.path.splitext(importPath)[1]
+    if suffix == '.zip' or compressionOf(importPath) != '':
+        archivePath += suffix
+
     logging.debug('moving ' + importPath + ' to ' + archivePath)
 
     shutil.move(importPath, archivePath)
 
+    if os.path.exists(importPath + INDEX_SUFFIX):
+        shutil.move(importPath + INDEX_SUFFIX, archivePath + INDEX_SUFFIX)
+
+    recordImport(archive, dict(record, archivePath=archivePath))
+
     logging.debug('archive completed')
 
 
-def main():
-    """Execute the program."""
-    try:
-        args = getConfig()
+def dumpIdentity(record, fetched=None):
+    """
+    Return the identity of the dump a load is checkpointed against.
 
-        cnf = Conf(args.config)
+    That is the digest of its content, if computed, or else the fingerprint
+    of the remote dump taken before it was fetched (with preflight), or of
+    the fetched copy. A stream with neither has an identity of its own, so
+    a later run does not resume its load.
+    """
+    if record['digest'] is not None:
+        return {'sha256': record['digest']}
+
+    if record['source'] is not None:
+        return record['source']
+
+    if fetched is not None:
+        return fetched
+
+    return {'streamedAt': time()}
+
+
+def runImport(cnf, remote, metrics):
+    """Fetch and load the dump, unless it is unchanged since the last one loaded."""
+    state = readState(cnf.archiveDir)
+
+    # The dump is loaded as it is streamed, so its digest is not known
+    # in time to skip the load.
+    record = {'digest': None, 'source': None}
+    delta = False
+    expected = None
+    digests = None
+
+    if cnf.preflight:
+        with metrics.phase('preflight'):
+            record['source'] = remote.fingerprint(cnf.remotePath.rstrip('/'), cnf.checksum,
+                                                  MANIFEST_NAME)
+        logging.debug('remote dump: %s', record['source'])
+
+        if sameFingerprint(state.get('source'), record['source']):
+            logging.info('remote dump unchanged since the last fetch. Fetch and load skipped.')
+            recordImport(cnf.archiveDir, {}, skipped=True)
+            return
+
+    if cnf.stream:
+        # there is clear text personal data in the dump so try to make
+        # sure the permissions are appropriate
+        os.umask(0o077)
+
+        dump = None
+        if cnf.streamArchive:
+            dump = cnf.workDir + '/' + os.path.basename(cnf.remotePath)
+
+        streamed = []
+
+        def sharedStream():
+            with openStream(remote, cnf.remotePath, dump) as blocks:
+                for block in blocks:
+                    yield block
+            streamed.append(True)
+
+        shared = sharedStream
+
+        def loader(workers):
+            # Only the stream shared by all the targets saves the dump.
+            teePath = dump if len(cnf.targets) == 1 else None
+            return lambda optionsPath, checkpoint: importStreamDB(
+                optionsPath, remote, cnf.remotePath, teePath, workers, cnf.fastLoad, checkpoint,
+                cnf.verify)
+
+        # The rows are counted as the dump is streamed.
+        if cnf.verify:
+            expected = streamedTables
+    else:
+        with metrics.phase('fetch'):
+            if cnf.skipUnchanged:
+                dump, record['digest'] = fetchDigested(remote, cnf.remotePath, cnf.workDir,
+                                                       cnf.transfer, state.get('archivePath'))
+            else:
+                dump = getDump(remote, cnf.remotePath, cnf.workDir, cnf.transfer,
+                               state.get('archivePath'))
+
+        # The copy fetched, not the remote dump, which may since have been
+        # replaced.
+        fetched = Remote('', '').fingerprint(dump, manifestName=MANIFEST_NAME)
+
+        if cnf.skipUnchanged:
+            logging.debug('dump digest: sha256 %s', record['digest'])
+
+            if record['digest'] == state.get('digest'):
+                skipDump(dump, cnf.archiveDir, record)
+                return
+
+        with metrics.phase('inflate'):
+            dump = inflateDump(dump, cnf.workDir)
+
+        index = None
+        if (cnf.index or cnf.delta or cnf.verify) and not isChunkedDump(dump):
+            with metrics.phase('index'):
+                index = indexDump(dump)
+            logging.info('dump has %s', summary(index))
+            digests = {'schemaDigest': index['schemaDigest'],
+                       'tableDigests': tableDigests(index)}
+
+        changed = None
+        if cnf.delta and index is not None:
+            changed = deltaTables(cnf, index)
+
+            if changed == []:
+                logging.info('no table changed since the last load. Load skipped.')
+                removeDump(dump)
+                recordImport(cnf.archiveDir, {'source': record['source']}, skipped=True)
+                return
+
+            delta = changed is not None
+
+        if cnf.verify:
+            expected = expectedTables(dump, index, changed if delta else None)
+
+        def loader(workers):
+            if delta:
+                return deltaLoader(dump, index, changed)
+            return dumpLoader(dump, workers, cnf.fastLoad, index)
+
+        def sharedDump():
+            with openDump(dump) as source:
+                for block in fileBlocks(source):
+                    yield block
 
-        if os.path.isfile(cnf.noImport):
+        # A chunked dump, delta, or uncompressed dump with an index, is
+        # read by each target a part at a time.
+        shared = None
+        if not delta and not isChunkedDump(dump) and (index is None or not isSeekable(dump)):
+            shared = sharedDump
+
+    source = dumpIdentity(record, None if cnf.stream else fetched)
+
+    # Streaming, the dump is fetched as it is loaded.
+    with metrics.phase('import'):
+        errors = importTargets(cnf, loader, source, delta, shared, expected, digests)
+    failed = [section for section, error in errors.items() if error is not None]
+
+    if len(errors) == 1 and failed:
+        raise errors[failed[0]]
+
+    if len(errors) > 1:
+        recordTargets(cnf.archiveDir, errors)
+
+    if len(failed) == len(errors):
+        raise Exception('import failed for every target.')
+
+    if failed:
+        # The next dump is loaded into every target, whatever it holds.
+        record.update(digest=None, source=None)
+
+    if cnf.stream and len(errors) > 1 and not streamed and dump is not None:
+        # The shared stream failed, so the dump saved from it is incomplete.
+        logging.warning('the dump stream failed, so %s is not archived', dump)
+        os.remove(dump)
+        dump = None
+
+    with metrics.phase('archive'):
+        if dump is not None:
+            archiveDump(dump, cnf.archiveDir, cnf.format, record)
+        else:
+            recordImport(cnf.archiveDir, record)
+
+    if cnf.prewarmTables or cnf.prewarmQueries != '':
+        with metrics.phase('prewarm'):
+            prewarmTargets(cnf, [section for section, error in errors.items() if error is None])
+
+    if failed:
+        raise Exception('import failed for target(s): ' + ', '.join(failed))
+
+
+def runCycle(cnf, remote):
+    """Import the dump, unless noImport exists, returning the exit status."""
+    metrics = Metrics('failover_import', cnf.metricsTextfile, cnf.metricsHistory)
+    ok = False
+    try:
+        with metrics.phase('noImport'):
+            noImport = os.path.isfile(cnf.noImport)
+
+        if noImport:
             logging.error('%s exists. No import attempted. File contents -', cnf.noImport)
             with open(cnf.noImport, encoding='utf-8') as fileText:
                 logging.error(fileText.read().rstrip())
             return 1
 
-        dump = getDump(cnf.remoteUser, cnf.remoteHost, cnf.remotePath, cnf.workDir)
-
-        importDB(cnf.mysqlOptionsPath, dump, max(1, cnf.retryCount))
-
-        archiveDump(dump, cnf.archiveDir, cnf.format)
+        runImport(cnf, remote, metrics)
 
         logging.info('completed ok')
+        ok = True
         return 0
 
     except Exception:
         logging.error(sys.exc_info()[1])
         return 1
 
+    finally:
+        metrics.write(ok)
+
+
+def serveImports(cnf, remote):
+    """Import each new dump as it lands, until stopped."""
+    # Only a dump that changed since the last one loaded is imported.
+    cnf.preflight = True
+    remotePath = cnf.remotePath.rstrip('/')
+
+    def fingerprint():
+        return remote.fingerprint(remotePath, cnf.checksum, MANIFEST_NAME)
+
+    # A local dump is written, or renamed, into its directory.
+    watch = DirectoryWatch(os.path.dirname(remotePath) if remote.isLocal() else None)
+
+    Service(fingerprint, lambda: runCycle(cnf, remote) == 0, cnf.noImport, cnf.lockFile,
+            cnf.pollSeconds, cnf.settleSeconds, cnf.retrySeconds, watch).serve()
+
+
+def main():
+    """Execute the program."""
+    try:
+        args = getConfig()
+
+        cnf = Conf(args.config)
+
+        if args.rollback:
+            if not cnf.shadow:
+                raise Exception('Rollback needs [local] shadow=yes.')
+            rollbackDB(cnf)
+            return 0
+
+        remote = Remote(cnf.remoteUser, cnf.remoteHost,
+                        os.path.join(cnf.workDir, '.ssh-%C') if cnf.multiplex else None)
+        try:
+            if args.daemon:
+                serveImports(cnf, remote)
+                return 0
+
+            with locked(cnf.lockFile) as acquired:
+                if not acquired:
+                    # The import already running loads the latest dump.
+                    logging.info('another import holds %s. No import attempted.', cnf.lockFile)
+                    return 0
+
+                return runCycle(cnf, remote)
+        finally:
+            remote.close()
+
+    except Exception:
+        logging.error(sys.exc_info()[1])
+        return 1
+
 
 if __name__ == '__main__':
     sys.exit(main())
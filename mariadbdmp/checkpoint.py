@@ -0,0 +1,68 @@
+"""
+Record the units of a load completed so far, so a failed load can resume.
+
+A unit is a table, chunk or other step of loading a dump that is loaded
+in one go. The units completed are kept in a file, with the identity of
+the dump, so a later attempt at loading the same dump, in the same run or
+a later one, skips them, while loading a different dump starts again.
+"""
+import json
+import logging
+import os
+import threading
+
+
+class Checkpoint:
+    """The units of loading a dump completed so far."""
+
+    def __init__(self, path, identity):
+        """Read the units completed from path, if they were for the dump identified."""
+        self.path = path
+        self.identity = identity
+        self.lock = threading.Lock()
+        self.completed = []
+
+        try:
+            with open(path, encoding='utf-8') as checkpointFile:
+                record = json.load(checkpointFile)
+            if record['identity'] == identity:
+                self.completed = record['completed']
+        except FileNotFoundError:
+            pass
+
+        # True if some units may have been loaded, in part or in full.
+        self.resuming = bool(self.completed)
+
+        if self.resuming:
+            logging.info('resuming load, with %s units already loaded', len(self.completed))
+
+    def isDone(self, unit):
+        """Return True if unit has been loaded."""
+        with self.lock:
+            return unit in self.completed
+
+    def done(self, unit):
+        """Record that unit has been loaded."""
+        with self.lock:
+            self.completed.append(unit)
+
+            with open(self.path + '.part', 'w', encoding='utf-8') as checkpointFile:
+                json.dump({'identity': self.identity, 'completed': self.completed},
+                          checkpointFile, indent=1)
+
+            os.replace(self.path + '.part', self.path)
+
+    def run(self, unit, function):
+        """Call function to load unit, unless it has been loaded already."""
+        if self.isDone(unit):
+            logging.debug('skipping %s, already loaded', unit)
+            return
+
+        function()
+
+        self.done(unit)
+
+    def clear(self):
+        """Forget the units loaded, once the whole dump is loaded."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
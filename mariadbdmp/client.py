@@ -0,0 +1,163 @@
+"""
+Run SQL statements using the mysql command line client.
+
+A Session keeps a single mysql client process, and so a single database
+connection, open so that several statements can be run in the same
+transaction, with the results of each read back before the next is sent.
+"""
+import configparser
+import contextlib
+import logging
+import os
+import re
+import subprocess
+import tempfile
+import uuid
+
+MYSQL = '/usr/bin/mysql'
+
+# The options, from a [client-mariadb] section also used for mysqldump, that
+# the mysql client needs to connect to the server. Options starting with
+# 'ssl' are also used.
+CONNECTION_OPTIONS = ('host', 'port', 'socket', 'protocol', 'user', 'password',
+                      'database', 'compress', 'default-character-set')
+
+
+@contextlib.contextmanager
+def clientOptions(configPath, section='client-mariadb', database=None):
+    """
+    Write the connection options in a section of configPath to a temporary file.
+
+    Yields the path of a file, readable only by the current user, that
+    can be passed to the mysql client with --defaults-extra-file. This
+    allows mysql to use a section that also holds options, such as
+    result-file, that only mysqldump understands. If database is given, it
+    replaces the database in the section.
+    """
+    config = configparser.ConfigParser(allow_no_value=True, interpolation=None)
+
+    config.read(configPath)
+
+    if database is not None:
+        config.set(section, 'database', database)
+
+    handle, path = tempfile.mkstemp(suffix='.cnf')
+
+    try:
+        with os.fdopen(handle, 'w') as options:
+            options.write('[client]\n')
+            for key, value in config.items(section):
+                if key in CONNECTION_OPTIONS or key.startswith('ssl'):
+                    if value is None:
+                        options.write(key + '\n')
+                    else:
+                        options.write(key + '=' + value + '\n')
+
+        yield path
+
+    finally:
+        os.remove(path)
+
+
+# The errors reported by the mysql client that may not happen again if the
+# statement is retried: lock wait timeout, deadlock, can't connect to the
+# server, server has gone away and lost connection.
+TRANSIENT_ERRORS = (1205, 1213, 2002, 2003, 2006, 2013)
+
+# The start of an error reported by the mysql client, capturing its number.
+ERROR_NUMBER = re.compile(r'^ERROR (\d+)', re.MULTILINE)
+
+
+class CommandError(Exception):
+    """A command, such as the mysql client, failed, with the error it output."""
+
+    def __init__(self, output, transient=False):
+        """Keep the output, and whether the failure is known to be transient."""
+        super().__init__(output)
+        self.output = output
+        self.transient = transient
+
+    def errorNumber(self):
+        """Return the number of the mysql error reported, or None."""
+        match = ERROR_NUMBER.search(self.output)
+        return int(match.group(1)) if match else None
+
+    def isTransient(self):
+        """Return True if the command may succeed if run again."""
+        return self.transient or self.errorNumber() in TRANSIENT_ERRORS
+
+
+def quoteName(name):
+    """Quote a database, table or column name for use in SQL."""
+    return '`' + name.replace('`', '``') + '`'
+
+
+def quoteString(value):
+    """Quote a string value for use in SQL."""
+    return "'" + value.replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+class Session:
+    """A mysql client process that statements are sent to one at a time."""
+
+    def __init__(self, optionsPath, database=None):
+        """Start the client, connecting to the server."""
+        args = [MYSQL,
+                '--defaults-extra-file=' + optionsPath,
+                '--batch', '--raw', '--skip-column-names', '--unbuffered',
+                '--default-character-set=utf8mb4']
+
+        if database is not None:
+            args.append(database)
+
+        # A line the server cannot return by accident, sent back after
+        # each statement to mark the end of its output.
+        self.marker = ('--end-' + uuid.uuid4().hex).encode()
+
+        self.process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE)
+
+    def stream(self, sql):
+        """Run a statement, yielding each raw line of its output."""
+        self.process.stdin.write(sql.encode() + b';\nSELECT \''
+                                 + self.marker + b'\';\n')
+        self.process.stdin.flush()
+
+        for line in self.process.stdout:
+            line = line.rstrip(b'\n')
+            if line == self.marker:
+                return
+            yield line
+
+        # mysql stops at the first failed statement, closing its output
+        # before the marker is sent back.
+        self.process.wait()
+        raise CommandError(self.process.stderr.read().decode(errors='replace').rstrip())
+
+    def query(self, sql):
+        """Run a statement, returning its output as a list of lists of fields."""
+        return [line.decode().split('\t') for line in self.stream(sql)]
+
+    def execute(self, sql):
+        """Run a statement, ignoring any output."""
+        for _ in self.stream(sql):
+            pass
+
+    def close(self):
+        """Disconnect from the server."""
+        if self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+            self.process.wait()
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+    def kill(self):
+        """Disconnect from the server without waiting for a statement to finish."""
+        if self.process.poll() is None:
+            logging.debug('killing mysql client %s', self.process.pid)
+            self.process.kill()
+        self.close()
@@ -0,0 +1,52 @@
+"""
+Compress and decompress database dumps with external compressors.
+
+The compressors are run as separate processes, reading from stdin and
+writing to stdout, so they can be placed in a pipeline with mysqldump or
+mysql and use more than one thread.
+"""
+
+# Commands to compress a dump, for each supported compression, as
+# (single threaded command, multi-threaded command).
+COMPRESSORS = {
+    'gzip': (['/usr/bin/gzip', '-c'], ['/usr/bin/pigz', '-c', '-p', '{threads}']),
+    'zstd': (['/usr/bin/zstd', '-c', '-q'], ['/usr/bin/zstd', '-c', '-q', '-T{threads}']),
+    'xz': (['/usr/bin/xz', '-c'], ['/usr/bin/xz', '-c', '-T{threads}']),
+}
+
+# Commands to decompress a dump, for each supported compression.
+DECOMPRESSORS = {
+    'gzip': ['/usr/bin/gzip', '-dc'],
+    'zstd': ['/usr/bin/zstd', '-dcq'],
+    'xz': ['/usr/bin/xz', '-dc'],
+}
+
+# The file name suffix for each supported compression.
+SUFFIXES = {
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'xz': '.xz',
+}
+
+
+def compressCommand(compression, level, threads):
+    """Return the command to compress a dump from stdin to stdout."""
+    single, multi = COMPRESSORS[compression]
+
+    args = [arg.format(threads=threads) for arg in (multi if threads > 1 else single)]
+
+    if level != '':
+        if compression == 'zstd' and int(level) > 19:
+            args.append('--ultra')
+        args.append('-' + level)
+
+    return args
+
+
+def compressionOf(path):
+    """Return the compression used for path, going by its suffix, or ''."""
+    for compression, suffix in SUFFIXES.items():
+        if path.endswith(suffix):
+            return compression
+
+    return ''
@@ -0,0 +1,189 @@
+"""
+Run the cycle of a script as a long running service, when its input changes.
+
+The service polls a cheap fingerprint of its input, such as the size and
+modification time of the dump, and runs a cycle once the fingerprint has
+changed and then stayed the same for settleSeconds, so a dump still being
+written is not read. A local directory is also watched with inotify, so a
+change is seen at once rather than at the next poll.
+
+Changes made while a cycle runs are coalesced into a single cycle after
+it. No cycle is started while the pause file exists, or while another run,
+from cron say, holds the lock file. A failed cycle is retried after
+retrySeconds, or as soon as the input changes again.
+"""
+import contextlib
+import ctypes
+import ctypes.util
+import fcntl
+import logging
+import os
+import select
+from time import monotonic, sleep
+
+# The inotify events of a file written, or moved, into a directory.
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+
+
+class DirectoryWatch:
+    """Wakes a wait when a file is written into a directory, using inotify where it can."""
+
+    def __init__(self, directory=None):
+        """Watch directory, or nothing if it is None, or inotify is not available."""
+        self.fd = None
+
+        if directory is None:
+            return
+
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+            if libc.inotify_add_watch(fd, os.fsencode(directory),
+                                      IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+                os.close(fd)
+                raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        except (AttributeError, OSError) as exc:
+            logging.warning('cannot watch %s, polling only: %s', directory, exc)
+            return
+
+        self.fd = fd
+
+    def wait(self, seconds):
+        """Wait seconds, or until a file is written into the directory."""
+        if self.fd is None:
+            sleep(seconds)
+            return
+
+        if select.select([self.fd], [], [], seconds)[0]:
+            # Read all the events waiting, as one change.
+            with contextlib.suppress(BlockingIOError):
+                while os.read(self.fd, 65536):
+                    pass
+
+    def close(self):
+        """Stop watching."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+@contextlib.contextmanager
+def locked(path):
+    """Hold an exclusive lock on the file at path, yielding False if another process holds it."""
+    with open(path, 'a', encoding='utf-8') as lockFile:
+        try:
+            fcntl.flock(lockFile, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+
+        try:
+            yield True
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+class Service:
+    """Runs a cycle each time a fingerprint of the input changes."""
+
+    def __init__(self, fingerprint, runCycle, pauseFile, lockPath, pollSeconds=60,
+                 settleSeconds=30, retrySeconds=600, watch=None):
+        """Run runCycle, which returns True if it succeeded, when fingerprint() changes."""
+        self.fingerprint = fingerprint
+        self.runCycle = runCycle
+        self.pauseFile = pauseFile
+        self.lockPath = lockPath
+        self.pollSeconds = pollSeconds
+        self.settleSeconds = settleSeconds
+        self.retrySeconds = retrySeconds
+        self.watch = watch if watch is not None else DirectoryWatch()
+
+        # The fingerprint of the input the last cycle started with, which
+        # no fingerprint is equal to before the first cycle.
+        self.seen = object()
+        self.failedAt = None
+        self.paused = False
+        self.error = None
+
+    def isPaused(self):
+        """Return True if the pause file exists, logging when the service pauses or resumes."""
+        paused = os.path.isfile(self.pauseFile)
+
+        if paused != self.paused:
+            if paused:
+                logging.info('%s exists. Paused.', self.pauseFile)
+            else:
+                logging.info('%s removed. Resumed.', self.pauseFile)
+            self.paused = paused
+
+        return paused
+
+    def current(self):
+        """Return the fingerprint of the input, or None if it cannot be read."""
+        try:
+            fingerprint = self.fingerprint()
+        except Exception as exc:
+            # Logged once, not at every poll, until it is read again.
+            if str(exc) != self.error:
+                logging.warning('cannot read the input: %s', exc)
+            self.error = str(exc)
+            return None
+
+        self.error = None
+        return fingerprint
+
+    def due(self, fingerprint):
+        """Return True if a cycle should be run for the input with fingerprint."""
+        if fingerprint is None:
+            return False
+
+        if fingerprint != self.seen:
+            return True
+
+        # The last cycle, for the same input, failed.
+        return self.failedAt is not None and monotonic() - self.failedAt >= self.retrySeconds
+
+    def step(self):
+        """Run a cycle if one is due, returning True if one was run."""
+        if self.isPaused():
+            return False
+
+        fingerprint = self.current()
+        if not self.due(fingerprint):
+            return False
+
+        if fingerprint != self.seen and self.settleSeconds > 0:
+            # Let the input finish being written.
+            sleep(self.settleSeconds)
+            if self.current() != fingerprint:
+                return False
+
+        with locked(self.lockPath) as acquired:
+            if not acquired:
+                logging.debug('%s is held by another run. Cycle deferred.', self.lockPath)
+                return False
+
+            # A change while the cycle runs makes another cycle due after it.
+            self.seen = fingerprint
+            ok = self.runCycle()
+
+        self.failedAt = None if ok else monotonic()
+        return True
+
+    def serve(self, cycles=None):
+        """Run cycles as the input changes, for ever, or until cycles have been run."""
+        logging.info('serving, polling every %s secs', self.pollSeconds)
+        run = 0
+
+        try:
+            while cycles is None or run < cycles:
+                if self.step():
+                    run += 1
+                else:
+                    self.watch.wait(self.pollSeconds)
+        finally:
+            self.watch.close()
@@ -0,0 +1,56 @@
+"""
+Compute a digest of the content of a database dump.
+
+The digest covers the SQL in the dump, decompressed, less the lines that
+change every time a dump is made even if the database has not changed, so
+two dumps of the same data have the same digest.
+"""
+import hashlib
+import os
+
+from mariadbdmp.load import fileBlocks
+from mariadbdmp.manifest import isChunkedDump, readManifest
+from mariadbdmp.stream import blockLines, decompressBlocks
+
+# The start of the lines left out of the digest.
+IGNORED_LINES = (b'-- Dump completed on',)
+
+
+def digestLines(lines, digest):
+    """Add the lines of SQL to digest, less those that are ignored."""
+    for line in lines:
+        if not line.startswith(IGNORED_LINES):
+            digest.update(line)
+
+
+def blocksDigest(blocks):
+    """Return the hex digest of the SQL in an iterable of decompressed blocks of a dump."""
+    digest = hashlib.sha256()
+    digestLines(blockLines(blocks), digest)
+    return digest.hexdigest()
+
+
+def digestFile(path, digest):
+    """Add the SQL in a file, optionally compressed, to digest."""
+    with open(path, 'rb') as source:
+        digestLines(blockLines(decompressBlocks(fileBlocks(source), path)), digest)
+
+
+def dumpDigest(path):
+    """Return the hex digest of a dump file, or chunked dump directory."""
+    digest = hashlib.sha256()
+
+    if not isChunkedDump(path):
+        digestFile(path, digest)
+        return digest.hexdigest()
+
+    # The manifest itself records when the dump was made, so only the files
+    # it lists are included, in an order that does not depend on their sizes.
+    manifest = readManifest(path)
+    files = [manifest['schema']] + sorted(chunk['file'] for chunk in manifest['chunks'])
+
+    for name in files:
+        digest.update(name.encode() + b'\n')
+        digestFile(os.path.join(path, name), digest)
+
+    return digest.hexdigest()
@@ -0,0 +1,233 @@
+"""
+Index the tables of a single file dump, in one pass over it.
+
+The index records where the header of session settings, and each section
+of the dump, start and end in its SQL. For each table it records the
+ranges of its definition and its data, and the number of rows and bytes of
+INSERT statements. It is kept in a sidecar file next to the dump, so a
+table can be read straight from the dump without scanning it again, and
+the sizes of the tables tracked for capacity planning.
+
+The index also records a digest of the data of each table, and one of
+everything else in the dump, so the tables whose data changed between two
+dumps can be told apart from those that did not.
+
+The offsets are of the decompressed SQL. An uncompressed dump is read from
+an offset with a seek; a compressed one is decompressed up to it.
+"""
+import hashlib
+import json
+import os
+import re
+
+from mariadbdmp.compression import compressionOf
+from mariadbdmp.digest import IGNORED_LINES
+from mariadbdmp.load import COPY_BUFFER_SIZE, fileBlocks
+from mariadbdmp.schema import SECTION_COMMENT, rowCount
+from mariadbdmp.stream import blockLines, decompressBlocks
+
+# Appended to the path of a dump to make the path of its index.
+INDEX_SUFFIX = '.index.json'
+
+# Changed whenever the index records something new, so older indexes are
+# built again.
+INDEX_VERSION = 2
+
+# The comments starting the definition and the data of a table.
+TABLE_COMMENT = re.compile(rb'^-- Table structure for table `((?:[^`]|``)+)`')
+DATA_COMMENT = re.compile(rb'^-- Dumping data for table ')
+
+INSERT = b'INSERT INTO '
+
+# The next auto increment value of a table, which changes with its data.
+AUTO_INCREMENT = re.compile(rb' AUTO_INCREMENT=\d+')
+
+
+def isSeekable(path):
+    """Return True if the SQL of a dump can be read from an offset with a seek."""
+    return compressionOf(path) == '' and not path.endswith('.zip')
+
+
+def buildIndex(path):
+    """Return the index of a dump file, optionally compressed."""
+    status = os.stat(path)
+
+    sections = []
+    section = None
+    header = None
+    offset = 0
+
+    schemaDigest = hashlib.sha256()
+    dataDigest = None
+
+    with open(path, 'rb') as source:
+        for line in blockLines(decompressBlocks(fileBlocks(source), path)):
+            if line.startswith(INSERT):
+                if dataDigest is not None:
+                    section['rows'] += rowCount(line)
+                    section['bytes'] += len(line)
+                    dataDigest.update(line)
+                else:
+                    schemaDigest.update(line)
+                offset += len(line)
+                continue
+
+            if line.startswith(b')'):
+                schemaDigest.update(AUTO_INCREMENT.sub(b'', line))
+            elif not line.startswith(IGNORED_LINES):
+                schemaDigest.update(line)
+
+            if line.startswith(b'-- '):
+                if SECTION_COMMENT.match(line):
+                    if section is None:
+                        header = [0, offset]
+                    else:
+                        finishSection(section, offset, dataDigest)
+                    dataDigest = None
+
+                    section = {'name': line[3:].rstrip().decode(errors='replace'),
+                               'range': [offset, None]}
+                    sections.append(section)
+
+                    match = TABLE_COMMENT.match(line)
+                    if match:
+                        section.update(table=match.group(1).replace(b'``', b'`').decode(),
+                                       ddl=[offset, None], data=None, rows=0, bytes=0)
+                        dataDigest = hashlib.sha256()
+
+                elif section is not None and 'ddl' in section and DATA_COMMENT.match(line):
+                    section['ddl'][1] = offset
+                    section['data'] = [offset, None]
+
+            offset += len(line)
+
+    if section is None:
+        header = [0, offset]
+    else:
+        finishSection(section, offset, dataDigest)
+
+    return {'version': INDEX_VERSION,
+            'dump': {'size': status.st_size, 'mtime': int(status.st_mtime)},
+            'bytes': offset, 'header': header, 'sections': sections,
+            'schemaDigest': schemaDigest.hexdigest()}
+
+
+def finishSection(section, offset, dataDigest):
+    """Record that section ends at offset, and the digest of its data if it is a table."""
+    section['range'][1] = offset
+
+    if 'ddl' in section:
+        section['digest'] = dataDigest.hexdigest()
+        if section['data'] is None:
+            section['ddl'][1] = offset
+        else:
+            section['data'][1] = offset
+
+
+def tables(index):
+    """Return the sections of an index that are tables."""
+    return [section for section in index['sections'] if 'table' in section]
+
+
+def tableDigests(index):
+    """Return the digest of the data of each table in an index, by table name."""
+    return {section['table']: section['digest'] for section in tables(index)}
+
+
+def writeIndex(path, index):
+    """Write the index of a dump to its sidecar file."""
+    with open(path + INDEX_SUFFIX + '.part', 'w', encoding='utf-8') as indexFile:
+        json.dump(index, indexFile, indent=1)
+
+    os.replace(path + INDEX_SUFFIX + '.part', path + INDEX_SUFFIX)
+
+
+def readIndex(path):
+    """Return the index of a dump from its sidecar file, or None if there is none for it."""
+    try:
+        with open(path + INDEX_SUFFIX, encoding='utf-8') as indexFile:
+            index = json.load(indexFile)
+    except FileNotFoundError:
+        return None
+
+    status = os.stat(path)
+    if index.get('version') != INDEX_VERSION or index['dump'] != {
+            'size': status.st_size, 'mtime': int(status.st_mtime)}:
+        return None
+
+    return index
+
+
+def indexDump(path):
+    """Return the index of a dump, building it, and its sidecar file, if need be."""
+    index = readIndex(path)
+
+    if index is None:
+        index = buildIndex(path)
+        writeIndex(path, index)
+
+    return index
+
+
+def rangesBlocks(path, ranges):
+    """Yield the SQL of a dump, in blocks, in each of a list of [start, end] ranges."""
+    ranges = sorted((start, end) for start, end in ranges if start < end)
+    if not ranges:
+        return
+
+    with open(path, 'rb') as source:
+        if isSeekable(path):
+            for start, end in ranges:
+                source.seek(start)
+                for block in iter(lambda: source.read(min(end - source.tell(),
+                                                          COPY_BUFFER_SIZE)), b''):
+                    yield block
+            return
+
+        blocks = decompressBlocks(fileBlocks(source), path)
+        pending = iter(ranges)
+        start, end = next(pending)
+        position = 0
+
+        try:
+            for block in blocks:
+                blockStart, position = position, position + len(block)
+                while position > start:
+                    yield block[max(start - blockStart, 0):end - blockStart]
+                    if position < end:
+                        break
+                    start, end = next(pending, (None, None))
+                    if start is None:
+                        return
+        finally:
+            if hasattr(blocks, 'close'):
+                blocks.close()
+
+
+def rangeBlocks(path, start, end):
+    """Yield the SQL of a dump, in blocks, from offset start up to end."""
+    return rangesBlocks(path, [(start, end)])
+
+
+def tableBlocks(path, index, table):
+    """Yield the header of a dump, and the definition and data of one table, in blocks."""
+    for section in tables(index):
+        if section['table'] == table:
+            break
+    else:
+        raise Exception('Table ' + table + ' is not in the dump.')
+
+    for start, end in (index['header'], section['range']):
+        for block in rangeBlocks(path, start, end):
+            yield block
+
+
+def summary(index, count=5):
+    """Return a description of the size of a dump, and of its largest tables."""
+    largest = sorted(tables(index), key=lambda section: -section['bytes'])[:count]
+
+    return '{0} tables, {1:.1f} MB of SQL; largest: {2}'.format(
+        len(tables(index)), index['bytes'] / 1024 / 1024,
+        ', '.join('{0} ({1:.1f} MB, {2} rows)'.format(
+            section['table'], section['bytes'] / 1024 / 1024, section['rows'])
+            for section in largest) or 'none')
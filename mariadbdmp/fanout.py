@@ -0,0 +1,109 @@
+"""
+Pass one stream of blocks to several consumers at once.
+
+The stream is read once, and each block queued for every consumer, each
+running in its own thread, so a dump fetched and decompressed once can be
+loaded into several databases concurrently. At most QUEUE_BLOCKS blocks are
+queued for a consumer, so the stream is read no faster than the slowest
+consumer still reading it, and only a few blocks are held in memory.
+
+A consumer that stops reading, or fails, is detached from the stream, and
+the others carry on without it.
+"""
+import queue
+import threading
+
+# The most blocks queued for each consumer.
+QUEUE_BLOCKS = 16
+
+# How long to wait for room in a queue before checking whether its
+# consumer has detached, in seconds.
+PUT_TIMEOUT = 0.1
+
+# Queued after the last block.
+END = object()
+
+
+class Failed:
+    """Queued instead of a block when reading the stream failed."""
+
+    def __init__(self, error):
+        """Hold the exception reading the stream raised."""
+        self.error = error
+
+
+class Feed:
+    """The queue of blocks for one consumer."""
+
+    def __init__(self):
+        """Start with no blocks queued."""
+        self.queue = queue.Queue(QUEUE_BLOCKS)
+        self.detached = threading.Event()
+
+    def blocks(self):
+        """Yield the blocks queued, raising the error if reading the stream failed."""
+        try:
+            while True:
+                block = self.queue.get()
+                if block is END:
+                    return
+                if isinstance(block, Failed):
+                    raise block.error
+                yield block
+        finally:
+            self.detached.set()
+
+    def put(self, block):
+        """Queue a block, unless the consumer has detached."""
+        while not self.detached.is_set():
+            try:
+                self.queue.put(block, timeout=PUT_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+
+def fanOut(blocks, consumers):
+    """
+    Call each consumer, in its own thread, with an iterable of the blocks.
+
+    Returns what each consumer returned, or the exception it raised. If
+    reading the blocks raises an exception, each consumer still reading
+    them gets it instead of the rest of the blocks.
+    """
+    feeds = [Feed() for _ in consumers]
+    results = [None] * len(consumers)
+
+    def consume(number):
+        try:
+            results[number] = consumers[number](feeds[number].blocks())
+        except Exception as exc:
+            results[number] = exc
+        finally:
+            feeds[number].detached.set()
+
+    threads = [threading.Thread(target=consume, args=(number,), daemon=True)
+               for number in range(len(consumers))]
+    for thread in threads:
+        thread.start()
+
+    last = END
+    try:
+        for block in blocks:
+            if all(feed.detached.is_set() for feed in feeds):
+                break
+            for feed in feeds:
+                feed.put(block)
+    except BaseException as exc:
+        last = Failed(exc)
+        if not isinstance(exc, Exception):
+            raise
+    finally:
+        if hasattr(blocks, 'close'):
+            blocks.close()
+        for feed in feeds:
+            feed.put(last)
+        for thread in threads:
+            thread.join()
+
+    return results
@@ -0,0 +1,123 @@
+"""
+Session settings, and checks, for loading a dump as fast as possible.
+
+The failover database is rebuilt from scratch on every import, so per-row
+foreign key and unique checks, binary logging, per-statement commits and
+flushing the redo log at every commit are all wasted effort while loading.
+The integrity the skipped checks would have ensured is verified once the
+load is complete.
+"""
+import contextlib
+import logging
+
+from mariadbdmp.client import Session, quoteName
+from mariadbdmp.load import runConcurrently
+
+# Sent before, and after, each file loaded in fast load mode. Each file is
+# loaded in a single transaction.
+PREAMBLE = (b'SET SESSION foreign_key_checks = 0;\n'
+            b'SET SESSION unique_checks = 0;\n'
+            b'SET SESSION sql_log_bin = 0;\n'
+            b'SET SESSION autocommit = 0;\n')
+POSTAMBLE = b'\nCOMMIT;\n'
+
+
+@contextlib.contextmanager
+def relaxedDurability(optionsPaths):
+    """
+    Only flush the redo log once a second while loading, then restore the setting.
+
+    The databases loaded at once may share a server, so every setting is
+    read before any is changed, and each restored to what it was before
+    the load.
+    """
+    sessions = []
+    try:
+        originals = []
+        for optionsPath in optionsPaths:
+            sessions.append(Session(optionsPath))
+            originals.append(sessions[-1].query(
+                'SELECT @@GLOBAL.innodb_flush_log_at_trx_commit')[0][0])
+
+        if '2' in originals:
+            logging.warning('innodb_flush_log_at_trx_commit is already 2, so will be left at 2.'
+                            ' If a killed fast load left it so, set it back to 1.')
+
+        restore = []
+        try:
+            for session, original in zip(sessions, originals):
+                logging.debug('setting innodb_flush_log_at_trx_commit to 2 (was %s)', original)
+                session.execute('SET GLOBAL innodb_flush_log_at_trx_commit = 2')
+                restore.append((session, original))
+            yield
+        finally:
+            for session, original in reversed(restore):
+                logging.debug('restoring innodb_flush_log_at_trx_commit to %s', original)
+                session.execute('SET GLOBAL innodb_flush_log_at_trx_commit = ' + original)
+    finally:
+        for session in sessions:
+            session.close()
+
+
+def foreignKeys(session):
+    """Return (table, columns, referenced table, referenced columns) for each foreign key."""
+    keys = {}
+    for constraint, table, column, refTable, refColumn in session.query(
+            'SELECT CONSTRAINT_NAME, TABLE_NAME, COLUMN_NAME,'
+            ' REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME'
+            ' FROM information_schema.KEY_COLUMN_USAGE'
+            ' WHERE TABLE_SCHEMA = DATABASE() AND REFERENCED_TABLE_NAME IS NOT NULL'
+            ' ORDER BY CONSTRAINT_NAME, TABLE_NAME, ORDINAL_POSITION'):
+        key = keys.setdefault((constraint, table), (table, [], refTable, []))
+        key[1].append(column)
+        key[3].append(refColumn)
+
+    return list(keys.values())
+
+
+def orphanQuery(table, columns, refTable, refColumns):
+    """Return SQL counting the rows of table with no parent row in refTable."""
+    join = ' AND '.join('c.{0} = p.{1}'.format(quoteName(column), quoteName(refColumn))
+                        for column, refColumn in zip(columns, refColumns))
+    notNull = ' AND '.join('c.{0} IS NOT NULL'.format(quoteName(column))
+                           for column in columns)
+
+    return ('SELECT COUNT(*) FROM {0} c LEFT JOIN {1} p ON {2}'
+            ' WHERE {3} AND p.{4} IS NULL').format(
+                quoteName(table), quoteName(refTable), join, notNull,
+                quoteName(refColumns[0]))
+
+
+def checkForeignKey(optionsPath, key):
+    """Return a description of the rows breaking a foreign key, or None."""
+    session = Session(optionsPath)
+    try:
+        orphans = int(session.query(orphanQuery(*key))[0][0])
+    finally:
+        session.close()
+
+    if orphans == 0:
+        return None
+
+    table, columns, refTable, refColumns = key
+    return '{0} rows of {1} ({2}) have no match in {3} ({4})'.format(
+        orphans, table, ', '.join(columns), refTable, ', '.join(refColumns))
+
+
+def verifyForeignKeys(optionsPath, workers):
+    """Check every foreign key in the database holds, over several connections."""
+    session = Session(optionsPath)
+    try:
+        keys = foreignKeys(session)
+    finally:
+        session.close()
+
+    logging.debug('checking %s foreign keys ...', len(keys))
+
+    problems = []
+    runConcurrently(lambda key: problems.append(checkForeignKey(optionsPath, key)),
+                    keys, workers)
+
+    problems = [problem for problem in problems if problem is not None]
+    if problems:
+        raise Exception('Foreign key check failed: ' + '; '.join(problems))
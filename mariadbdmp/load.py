@@ -0,0 +1,176 @@
+"""
+Load SQL into a MariaDB server with the mysql command line client.
+
+SQL files, optionally compressed, are streamed to the client's stdin, so
+statements can be sent before and after the contents of the file, and the
+contents can be filtered on the way.
+
+Tab delimited files, as dumped in the tab format by mariadbdmp.paralleldump,
+are loaded with LOAD DATA LOCAL INFILE, the client reading the file, or its
+decompressor's output, on its stdin.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextlib
+import logging
+import subprocess
+import threading
+
+from mariadbdmp import client
+from mariadbdmp.client import CommandError, quoteName, quoteString
+from mariadbdmp.compression import DECOMPRESSORS, compressionOf
+from mariadbdmp.paralleldump import BINARY_TYPES
+
+# The size of the buffer used to copy SQL files to the client.
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def openDump(path):
+    """Open an SQL file for reading, decompressing it if needed."""
+    compression = compressionOf(path)
+
+    if compression == '':
+        with open(path, 'rb') as dump:
+            yield dump
+        return
+
+    args = DECOMPRESSORS[compression] + [path]
+    decompressor = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE)
+    try:
+        yield decompressor.stdout
+    finally:
+        decompressor.stdout.close()
+        err = decompressor.stderr.read()
+        decompressor.stderr.close()
+
+    if decompressor.wait() != 0:
+        logging.error('command failed: %s', ' '.join(args))
+        raise CommandError(err.decode(errors='replace').rstrip())
+
+
+def fileBlocks(source):
+    """Yield the contents of a binary file object in large blocks."""
+    return iter(lambda: source.read(COPY_BUFFER_SIZE), b'')
+
+
+def loadStream(optionsPath, blocks, preamble=b'', postamble=b'', database=None):
+    """Send preamble, each of an iterable of bytes blocks, and postamble to mysql."""
+    args = [client.MYSQL, '--defaults-extra-file=' + optionsPath]
+
+    if database is not None:
+        args.append('--database=' + database)
+
+    mysql = subprocess.Popen(args, stdin=subprocess.PIPE,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    try:
+        mysql.stdin.write(preamble)
+        for block in blocks:
+            mysql.stdin.write(block)
+        mysql.stdin.write(postamble)
+        mysql.stdin.close()
+    except BrokenPipeError:
+        # mysql stops reading at the first failed statement. The error is
+        # reported below.
+        pass
+
+    err = mysql.stderr.read()
+    mysql.stderr.close()
+
+    if mysql.wait() != 0:
+        logging.error('command failed: %s', ' '.join(args))
+        raise CommandError(err.decode(errors='replace').rstrip())
+
+
+def loadFile(optionsPath, path, preamble=b'', postamble=b'', database=None):
+    """Load an SQL file, optionally compressed, with mysql."""
+    logging.debug('loading %s', path)
+
+    with openDump(path) as source:
+        loadStream(optionsPath, fileBlocks(source), preamble, postamble, database)
+
+
+def loadDataSql(table, columns, path):
+    """Return a LOAD DATA LOCAL INFILE statement loading a tab delimited file into table."""
+    fields = []
+    conversions = []
+    for number, (name, dataType) in enumerate(columns):
+        if dataType == 'bit' or dataType in BINARY_TYPES:
+            # Dumped in binary or hexadecimal.
+            variable = '@column{0}'.format(number)
+            fields.append(variable)
+            conversions.append('{0} = {1}'.format(
+                quoteName(name),
+                ('CAST(CONV({0}, 2, 10) AS UNSIGNED)' if dataType == 'bit'
+                 else 'UNHEX({0})').format(variable)))
+        else:
+            fields.append(quoteName(name))
+
+    sql = ('LOAD DATA LOCAL INFILE {0} INTO TABLE {1} CHARACTER SET utf8mb4'
+           r" FIELDS TERMINATED BY '\t' ESCAPED BY '\\' LINES TERMINATED BY '\n'"
+           ' ({2})').format(quoteString(path), quoteName(table), ', '.join(fields))
+
+    if conversions:
+        sql += ' SET ' + ', '.join(conversions)
+
+    return sql
+
+
+def loadDelimited(optionsPath, path, table, columns, preamble=b'', postamble=b''):
+    """Load a tab delimited file, optionally compressed, of (name, data type) columns."""
+    logging.debug('loading %s', path)
+
+    sql = preamble + (loadDataSql(table, columns, '/dev/stdin') + ';\n').encode() + postamble
+
+    args = [client.MYSQL, '--defaults-extra-file=' + optionsPath, '--local-infile=1',
+            '--execute=' + sql.decode()]
+
+    with openDump(path) as source:
+        mysql = subprocess.Popen(args, stdin=source, stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.PIPE)
+        err = mysql.stderr.read()
+        mysql.stderr.close()
+
+        if mysql.wait() != 0:
+            logging.error('command failed: %s', ' '.join(args[:3]))
+            raise CommandError(err.decode(errors='replace').rstrip())
+
+
+def runSql(optionsPath, sql, database=None):
+    """Run SQL statements with mysql."""
+    loadStream(optionsPath, [sql.encode()], database=database)
+
+
+def runConcurrently(function, items, workers):
+    """Call function for each item, in up to workers threads at once."""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(function, item) for item in items]
+        try:
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            # Don't start anything else, but let what is running finish.
+            for future in futures:
+                future.cancel()
+            raise
+
+
+def runWithSessions(optionsPath, function, items, workers):
+    """Call function(session, item) for each item, in up to workers threads with a Session each."""
+    lock = threading.Lock()
+    local = threading.local()
+    sessions = []
+
+    def run(item):
+        if not hasattr(local, 'session'):
+            local.session = client.Session(optionsPath)
+            with lock:
+                sessions.append(local.session)
+        function(local.session, item)
+
+    try:
+        runConcurrently(run, items, workers)
+    finally:
+        for session in sessions:
+            session.close()
@@ -0,0 +1,32 @@
+"""
+Read and write the manifest of a chunked database dump.
+
+A chunked dump is a directory holding the schema of the database, as
+written by mysqldump --no-data, a number of chunk files each holding the
+data for all or part of a table, and a manifest describing them.
+"""
+import json
+import os
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def isChunkedDump(path):
+    """Return True if path is a chunked dump directory."""
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def readManifest(directory):
+    """Return the manifest of the chunked dump in directory."""
+    with open(os.path.join(directory, MANIFEST_NAME), encoding='utf-8') as manifestFile:
+        return json.load(manifestFile)
+
+
+def writeManifest(directory, manifest):
+    """Write the manifest of the chunked dump in directory."""
+    path = os.path.join(directory, MANIFEST_NAME)
+
+    with open(path + '.part', 'w', encoding='utf-8') as manifestFile:
+        json.dump(manifest, manifestFile, indent=1, sort_keys=True)
+
+    os.replace(path + '.part', path)
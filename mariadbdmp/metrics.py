@@ -0,0 +1,159 @@
+"""
+Measure how long each phase of a run takes, and what it uses.
+
+Each phase records its wall time, the CPU time of this process and of the
+child processes (mysqldump, mysql, scp, decompressors) that finished during
+it, the largest resident set of any child finished so far, and the bytes
+this process and those children read and wrote, from /proc/self/io.
+
+The measurements of a run are written atomically to a node_exporter
+textfile collector file, and/or appended as a line of JSON to a history
+file, so the phases can be compared as the database grows.
+"""
+import contextlib
+import json
+import logging
+import os
+import resource
+from time import monotonic, time
+
+# The prefix of the name of every metric in the textfile.
+PREFIX = 'gocdb_failover_'
+
+# The metrics of each phase: the key of the measurement, the metric name
+# and its help text.
+PHASE_METRICS = (
+    ('seconds', 'phase_seconds', 'Wall time of the phase.'),
+    ('cpuSeconds', 'phase_cpu_seconds', 'CPU time of the script in the phase.'),
+    ('childCpuSeconds', 'phase_child_cpu_seconds',
+     'CPU time of the child processes finished in the phase.'),
+    ('childMaxRssBytes', 'phase_child_max_rss_bytes',
+     'Largest resident set of any child process finished by the end of the phase.'),
+    ('readBytes', 'phase_read_bytes', 'Bytes read by the script and its children.'),
+    ('writtenBytes', 'phase_written_bytes', 'Bytes written by the script and its children.'),
+    ('storageReadBytes', 'phase_storage_read_bytes',
+     'Bytes read from storage by the script and its children.'),
+    ('storageWrittenBytes', 'phase_storage_written_bytes',
+     'Bytes written to storage by the script and its children.'),
+)
+
+# The fields of /proc/self/io, which includes the children waited for, and
+# the measurements made from them.
+IO_FIELDS = {'rchar': 'readBytes', 'wchar': 'writtenBytes',
+             'read_bytes': 'storageReadBytes', 'write_bytes': 'storageWrittenBytes'}
+
+
+def readIo():
+    """Return the I/O counters of this process, or {} where there are none."""
+    counters = {}
+
+    try:
+        with open('/proc/self/io', encoding='ascii') as io:
+            for line in io:
+                name, _, value = line.partition(':')
+                if name in IO_FIELDS:
+                    counters[IO_FIELDS[name]] = int(value)
+    except OSError:
+        pass
+
+    return counters
+
+
+def usage():
+    """Return the resources used so far by this process and its children."""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    return dict(readIo(), seconds=monotonic(),
+                cpuSeconds=own.ru_utime + own.ru_stime,
+                childCpuSeconds=children.ru_utime + children.ru_stime,
+                # Linux reports kilobytes.
+                childMaxRssBytes=children.ru_maxrss * 1024)
+
+
+def quoteLabel(value):
+    """Return a Prometheus label value, quoted."""
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+
+class Metrics:
+    """The measurements of the phases of one run of a script."""
+
+    def __init__(self, script, textfile='', history=''):
+        """Start a run, to be written to textfile and history if they are not ''."""
+        self.script = script
+        self.textfile = textfile
+        self.history = history
+        self.started = time()
+        self.phases = {}
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Measure the code run in the with block as the phase name."""
+        before = usage()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            after = usage()
+            measured = {key: value - before[key] for key, value in after.items()
+                        if key in before}
+            measured['childMaxRssBytes'] = after['childMaxRssBytes']
+
+            # A phase run more than once adds up.
+            previous = self.phases.get(name)
+            if previous is not None:
+                for key, value in previous.items():
+                    if key in measured and key != 'childMaxRssBytes':
+                        measured[key] += value
+                ok = ok and previous['ok']
+
+            measured['ok'] = ok
+            self.phases[name] = measured
+
+            logging.debug('%s took %.1f secs (%.1f secs child CPU)', name,
+                          measured['seconds'], measured['childCpuSeconds'])
+
+    def textLines(self, ok):
+        """Return the lines of the textfile for the run."""
+        script = 'script=' + quoteLabel(self.script)
+        lines = []
+
+        for key, metric, helpText in PHASE_METRICS:
+            lines += ['# HELP ' + PREFIX + metric + ' ' + helpText,
+                      '# TYPE ' + PREFIX + metric + ' gauge']
+            for name, measured in self.phases.items():
+                if key in measured:
+                    lines.append('{0}{1}{{{2},phase={3}}} {4}'.format(
+                        PREFIX, metric, script, quoteLabel(name), repr(measured[key])))
+
+        lines += ['# HELP ' + PREFIX + 'run_success Whether the last run completed ok.',
+                  '# TYPE ' + PREFIX + 'run_success gauge',
+                  '{0}run_success{{{1}}} {2}'.format(PREFIX, script, int(ok)),
+                  '# HELP ' + PREFIX + 'run_timestamp_seconds When the last run started.',
+                  '# TYPE ' + PREFIX + 'run_timestamp_seconds gauge',
+                  '{0}run_timestamp_seconds{{{1}}} {2}'.format(PREFIX, script, self.started)]
+
+        return lines
+
+    def record(self, ok):
+        """Return the run, as written to the history file."""
+        return {'script': self.script, 'started': self.started, 'ok': ok,
+                'phases': self.phases}
+
+    def write(self, ok):
+        """Write the measurements of the run, which completed ok or not."""
+        try:
+            if self.textfile != '':
+                with open(self.textfile + '.part', 'w', encoding='utf-8') as textfile:
+                    textfile.write('\n'.join(self.textLines(ok)) + '\n')
+                os.replace(self.textfile + '.part', self.textfile)
+
+            if self.history != '':
+                with open(self.history, 'a', encoding='utf-8') as history:
+                    history.write(json.dumps(self.record(ok), sort_keys=True) + '\n')
+
+        except OSError as exc:
+            # The run itself is unaffected.
+            logging.error('could not write the run metrics: %s', exc)
@@ -0,0 +1,461 @@
+"""
+Dump a database as a directory of chunk files, over several connections.
+
+All the connections read from one consistent snapshot of the database. While
+a global read lock is held, each connection starts a transaction WITH
+CONSISTENT SNAPSHOT, then the lock is released. The lock is held only for as
+long as it takes to start the transactions and dump the schema, not for the
+whole dump.
+
+Each table is dumped to its own chunk file. Large tables with a single integer
+primary key are split into ranges of that key, each dumped to a separate
+chunk file, so they can be dumped (and later loaded) by several connections
+at once. The schema is dumped by mysqldump --no-data while the lock is held,
+so it matches the snapshot the data is dumped from.
+
+The chunk files hold INSERT statements (the sql format), or tab delimited
+rows (the tab format), as written by SELECT ... INTO OUTFILE, to be loaded
+with LOAD DATA. In the tab format tabs, line breaks, backslashes and NULs in
+values are escaped with a backslash, NULL is written as \\N, and binary and
+bit values are written in hexadecimal and binary, to be converted back as
+they are loaded.
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from time import gmtime, strftime, time
+
+from mariadbdmp.client import Session, quoteName, quoteString
+from mariadbdmp.manifest import writeManifest
+
+MYSQLDUMP = '/usr/bin/mysqldump'
+
+# The name of the schema file in the dump directory.
+SCHEMA_NAME = 'schema.sql'
+
+# Column types dumped as hexadecimal literals, as their values need not be
+# valid in the connection character set.
+BINARY_TYPES = ('binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob',
+                'longblob', 'geometry', 'point', 'linestring', 'polygon',
+                'multipoint', 'multilinestring', 'multipolygon',
+                'geometrycollection')
+
+# Primary key types that large tables can be split into ranges of.
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+
+# Column types whose values never hold a character that needs escaping in
+# the tab format.
+PLAIN_TYPES = INTEGER_TYPES + ('decimal', 'float', 'double', 'date', 'datetime',
+                               'timestamp', 'time', 'year')
+
+# The name suffix of the chunk files in each format.
+FORMAT_SUFFIXES = {
+    'sql': '.sql',
+    'tab': '.txt',
+}
+
+# Rows are grouped into INSERT statements of up to this many bytes, as with
+# mysqldump --extended-insert and the default net_buffer_length.
+INSERT_BYTES = 1024 * 1024
+
+# The start of every chunk file. Timestamps are dumped in UTC, and explicit
+# zero values in AUTO_INCREMENT columns are kept, as by mysqldump.
+CHUNK_HEADER = (b"/*!40101 SET NAMES utf8mb4 */;\n"
+                b"/*!40103 SET TIME_ZONE='+00:00' */;\n"
+                b"/*!40101 SET SQL_MODE='NO_AUTO_VALUE_ON_ZERO' */;\n")
+
+
+def columnExpression(name, dataType):
+    """Return SQL giving the value of a column as an SQL literal."""
+    column = quoteName(name)
+
+    if dataType == 'bit':
+        return "IF({0} IS NULL, 'NULL', CONCAT('b''', BIN({0}), ''''))".format(column)
+
+    if dataType in BINARY_TYPES:
+        return "IF({0} IS NULL, 'NULL', CONCAT('X''', HEX({0}), ''''))".format(column)
+
+    # QUOTE() escapes quotes, backslashes, NUL and Ctrl-Z. Also escape line
+    # breaks so each row is dumped on a single line.
+    return r"REPLACE(REPLACE(QUOTE({0}), '\n', '\\n'), '\r', '\\r')".format(column)
+
+
+def rowExpression(columns):
+    """Return SQL giving a row of a table as a parenthesised list of literals."""
+    return "CONCAT('(', CONCAT_WS(',', {0}), ')')".format(
+        ', '.join(columnExpression(name, dataType) for name, dataType in columns))
+
+
+def tabColumnExpression(name, dataType):
+    """Return SQL giving the value of a column as a tab delimited field."""
+    column = quoteName(name)
+
+    if dataType == 'bit':
+        column = 'BIN({0})'.format(column)
+    elif dataType in BINARY_TYPES:
+        column = 'HEX({0})'.format(column)
+    elif dataType not in PLAIN_TYPES:
+        column = (r"REPLACE(REPLACE(REPLACE(REPLACE(REPLACE({0}, '\\', '\\\\'),"
+                  r" '\t', '\\t'), '\n', '\\n'), '\r', '\\r'), CHAR(0), '\\0')").format(column)
+
+    return r"IFNULL({0}, '\\N')".format(column)
+
+
+def tabRowExpression(columns):
+    """Return SQL giving a row of a table as a line of tab delimited fields."""
+    return r"CONCAT_WS('\t', {0})".format(
+        ', '.join(tabColumnExpression(name, dataType) for name, dataType in columns))
+
+
+class ChunkFile:
+    """A chunk file, optionally written through a compressor."""
+
+    def __init__(self, path, compressArgs):
+        """Create the file."""
+        self.args = compressArgs
+
+        # there is clear text personal data in the dump so make sure
+        # the permissions are appropriate
+        handle = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.output = os.fdopen(handle, 'wb')
+
+        if compressArgs is None:
+            self.compressor = None
+            self.input = self.output
+        else:
+            self.compressor = subprocess.Popen(compressArgs, stdin=subprocess.PIPE,
+                                               stdout=self.output,
+                                               stderr=subprocess.PIPE)
+            self.input = self.compressor.stdin
+
+    def write(self, data):
+        """Write data to the file."""
+        self.input.write(data)
+
+    def close(self):
+        """Finish writing the file."""
+        if self.compressor is not None:
+            self.input.close()
+            err = self.compressor.stderr.read()
+            if self.compressor.wait() != 0:
+                logging.error('command failed: %s', ' '.join(self.args))
+                raise Exception(err.decode(errors='replace').rstrip())
+        self.output.close()
+
+
+def dumpSchema(optionsPath, databaseName, path):
+    """Dump the schema, without data, with mysqldump."""
+    args = [MYSQLDUMP,
+            '--defaults-extra-file=' + optionsPath,
+            '--no-data',
+            # Not LOCK TABLES, which would wait for the global read lock.
+            '--single-transaction',
+            '--result-file=' + path,
+            databaseName]
+
+    logging.debug('running command: %s', ' '.join(args))
+
+    try:
+        subprocess.check_output(args, stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as pErr:
+        logging.error('command failed: %s', ' '.join(args))
+        raise Exception(pErr.output.decode(errors='replace').rstrip()) from pErr
+
+
+def startSnapshots(coordinator, workers, whileLocked=None):
+    """
+    Start a transaction on every session, all reading the same snapshot.
+
+    whileLocked, if given, is called before the global read lock is released,
+    when nothing can have been written since the snapshot was taken.
+    """
+    for session in [coordinator] + workers:
+        session.execute("SET SESSION time_zone = '+00:00'")
+        session.execute('SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+    # While the lock is held nothing can be written, so every transaction
+    # started sees the same data.
+    start = time()
+    coordinator.execute('FLUSH TABLES WITH READ LOCK')
+    try:
+        for session in [coordinator] + workers:
+            session.execute('START TRANSACTION WITH CONSISTENT SNAPSHOT')
+        if whileLocked is not None:
+            whileLocked()
+    finally:
+        coordinator.execute('UNLOCK TABLES')
+
+    lockSeconds = time() - start
+
+    logging.debug('global read lock held for %.3f secs', lockSeconds)
+
+    return lockSeconds
+
+
+def planChunks(session, databaseName, chunkRows, suffix, dumpFormat='sql'):
+    """
+    Return the columns of each table and the chunks to dump them in.
+
+    Must be run in the dump's snapshot, so the primary key ranges of the
+    large tables cover all the rows in the snapshot.
+    """
+    schema = quoteString(databaseName)
+
+    columns = {}
+    for table, name, dataType, extra in session.query(
+            'SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, EXTRA'
+            ' FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = ' + schema
+            + ' ORDER BY TABLE_NAME, ORDINAL_POSITION'):
+        # Generated columns are recreated from the schema, not dumped.
+        if any(word in extra.upper() for word in ('VIRTUAL', 'PERSISTENT', 'STORED')):
+            continue
+        columns.setdefault(table, []).append((name, dataType.lower()))
+
+    primaryKeys = {}
+    for table, name in session.query(
+            'SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE'
+            ' WHERE TABLE_SCHEMA = ' + schema + " AND CONSTRAINT_NAME = 'PRIMARY'"
+            ' ORDER BY TABLE_NAME, ORDINAL_POSITION'):
+        primaryKeys.setdefault(table, []).append(name)
+
+    chunks = []
+    for table, estimatedRows, dataLength in session.query(
+            'SELECT TABLE_NAME, IFNULL(TABLE_ROWS, 0), IFNULL(DATA_LENGTH, 0)'
+            ' FROM information_schema.TABLES WHERE TABLE_SCHEMA = ' + schema
+            + " AND TABLE_TYPE = 'BASE TABLE' ORDER BY TABLE_NAME"):
+        key = primaryKeys.get(table, [])
+        order = ', '.join(quoteName(name) for name in key)
+        wheres = [None]
+
+        keyTypes = [dataType for name, dataType in columns[table] if key == [name]]
+        if int(estimatedRows) > chunkRows and keyTypes and keyTypes[0] in INTEGER_TYPES:
+            wheres = keyRanges(session, table, key[0],
+                               -(-int(estimatedRows) // chunkRows))
+
+        for part, where in enumerate(wheres):
+            name = table if len(wheres) == 1 else '%s.%03d' % (table, part)
+            chunks.append({
+                'table': table,
+                'file': name + FORMAT_SUFFIXES[dumpFormat] + suffix,
+                'where': where,
+                'order': order,
+                'estimatedBytes': int(dataLength) // len(wheres),
+            })
+
+    # Start the largest chunks first, so no connection is left dumping a
+    # large chunk long after the others have finished.
+    chunks.sort(key=lambda chunk: -chunk['estimatedBytes'])
+
+    return columns, chunks
+
+
+def keyRanges(session, table, key, parts):
+    """Return WHERE clauses splitting a table into ranges of its primary key."""
+    low, high = session.query('SELECT MIN({0}), MAX({0}) FROM {1}'.format(
+        quoteName(key), quoteName(table)))[0]
+
+    if low == 'NULL':
+        return [None]
+
+    low, high = int(low), int(high)
+    step = max(1, -(-(high - low + 1) // parts))
+    bounds = list(range(low + step, high + 1, step))
+
+    if not bounds:
+        return [None]
+
+    column = quoteName(key)
+    wheres = ['{0} < {1}'.format(column, bounds[0])]
+    for lower, upper in zip(bounds, bounds[1:]):
+        wheres.append('{0} >= {1} AND {0} < {2}'.format(column, lower, upper))
+    wheres.append('{0} >= {1}'.format(column, bounds[-1]))
+
+    return wheres
+
+
+def dumpChunk(session, chunk, columns, directory, compressArgs, dumpFormat='sql'):
+    """Dump a chunk of a table to its chunk file, as INSERT statements or tab delimited rows."""
+    logging.debug('dumping %s', chunk['file'])
+
+    expression = tabRowExpression(columns) if dumpFormat == 'tab' else rowExpression(columns)
+
+    sql = 'SELECT {0} FROM {1}'.format(expression, quoteName(chunk['table']))
+    if chunk['where'] is not None:
+        sql += ' WHERE ' + chunk['where']
+    if chunk['order'] != '':
+        sql += ' ORDER BY ' + chunk['order']
+
+    insert = 'INSERT INTO {0} ({1}) VALUES '.format(
+        quoteName(chunk['table']),
+        ','.join(quoteName(name) for name, dataType in columns)).encode()
+
+    chunkFile = ChunkFile(os.path.join(directory, chunk['file']), compressArgs)
+
+    try:
+        if dumpFormat == 'tab':
+            rows, dumpedBytes = writeTabRows(chunkFile, session.stream(sql), chunk['table'])
+        else:
+            rows, dumpedBytes = writeInserts(chunkFile, insert, session.stream(sql),
+                                             chunk['table'])
+    finally:
+        chunkFile.close()
+
+    chunk['rows'] = rows
+    chunk['bytes'] = dumpedBytes
+
+    logging.debug('dumped %s rows to %s', rows, chunk['file'])
+
+
+def checkRow(row, table):
+    """Raise an Exception if a row was too large to dump."""
+    # CONCAT() returns NULL if the row exceeds max_allowed_packet.
+    if row == b'NULL':
+        raise Exception('A row of ' + table + ' is larger than max_allowed_packet.')
+
+
+def writeInserts(chunkFile, insert, rowValues, table):
+    """Write rows to a chunk file as INSERT statements, returning the rows and bytes written."""
+    rows = 0
+    dumpedBytes = 0
+
+    chunkFile.write(CHUNK_HEADER)
+
+    values = []
+    valuesBytes = 0
+    for row in rowValues:
+        checkRow(row, table)
+        values.append(row)
+        valuesBytes += len(row) + 1
+        rows += 1
+
+        if valuesBytes >= INSERT_BYTES:
+            dumpedBytes += writeInsert(chunkFile, insert, values)
+            values = []
+            valuesBytes = 0
+
+    if values:
+        dumpedBytes += writeInsert(chunkFile, insert, values)
+
+    return rows, dumpedBytes
+
+
+def writeTabRows(chunkFile, lines, table):
+    """Write rows to a chunk file as tab delimited lines, returning the rows and bytes written."""
+    rows = 0
+    dumpedBytes = 0
+
+    for line in lines:
+        checkRow(line, table)
+        chunkFile.write(line + b'\n')
+        rows += 1
+        dumpedBytes += len(line) + 1
+
+    return rows, dumpedBytes
+
+
+def writeInsert(chunkFile, insert, values):
+    """Write a single INSERT statement for several rows, returning its size."""
+    statement = insert + b','.join(values) + b';\n'
+    chunkFile.write(statement)
+    return len(statement)
+
+
+def dumpWorker(session, chunks, columns, directory, compressArgs, dumpFormat, errors):
+    """Dump chunks, on one connection, until there are none left."""
+    while not errors:
+        try:
+            chunk = chunks.get_nowait()
+        except queue.Empty:
+            return
+
+        try:
+            dumpChunk(session, chunk, columns[chunk['table']], directory, compressArgs,
+                      dumpFormat)
+        except Exception as exc:
+            errors.append(exc)
+            return
+
+
+def parallelDump(dumpOptionsPath, clientOptionsPath, databaseName, directory,
+                 workers, chunkRows, compression='', compressArgs=None, suffix='',
+                 dumpFormat='sql'):
+    """
+    Dump databaseName into a new directory, over workers connections.
+
+    dumpOptionsPath is the options file for mysqldump, used for the schema,
+    and clientOptionsPath the options file for the mysql client connections
+    used for the data, which need the RELOAD privilege to take the global
+    read lock. Chunk files are compressed with compressArgs, if given, and
+    hold the data in dumpFormat, 'sql' or 'tab'.
+    """
+    logging.debug('running parallel dump with %s connections ...', workers)
+
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+
+    os.mkdir(directory, 0o700)
+
+    sessions = []
+    try:
+        # Connect first, so the lock is not held while connecting.
+        for _ in range(workers + 1):
+            sessions.append(Session(clientOptionsPath, databaseName))
+
+        coordinator = sessions[0]
+        # The schema is dumped under the lock, so no DDL can change it
+        # between the snapshot and the schema dump.
+        lockSeconds = startSnapshots(
+            coordinator, sessions[1:],
+            lambda: dumpSchema(dumpOptionsPath, databaseName,
+                               os.path.join(directory, SCHEMA_NAME)))
+
+        columns, chunks = planChunks(coordinator, databaseName, chunkRows, suffix,
+                                     dumpFormat)
+        coordinator.execute('COMMIT')
+
+        pending = queue.Queue()
+        for chunk in chunks:
+            pending.put(chunk)
+
+        errors = []
+        threads = [threading.Thread(target=dumpWorker,
+                                    args=(session, pending, columns, directory,
+                                          compressArgs, dumpFormat, errors))
+                   for session in sessions[1:]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        for session in sessions:
+            session.execute('COMMIT')
+            session.close()
+
+    except BaseException:
+        for session in sessions:
+            session.kill()
+        raise
+
+    for chunk in chunks:
+        del chunk['estimatedBytes']
+
+    writeManifest(directory, {
+        'format': dumpFormat,
+        'database': databaseName,
+        'created': strftime('%Y-%m-%dT%H:%M:%S+0000', gmtime()),
+        'compression': compression,
+        'lockSeconds': round(lockSeconds, 3),
+        'schema': SCHEMA_NAME,
+        'tables': sorted(set(chunk['table'] for chunk in chunks)),
+        # The (name, data type) of the columns dumped, in the order dumped.
+        'columns': columns,
+        'chunks': sorted(chunks, key=lambda chunk: chunk['file']),
+    })
+
+    logging.debug('parallel dump completed')
@@ -0,0 +1,93 @@
+"""
+Warm the InnoDB buffer pool of a freshly loaded database.
+
+After a load the buffer pool holds the pages last written, not those the
+portal and API read, so the first requests after a failover would all read
+from disk. Reading every index of the busiest tables, and running a set of
+representative read queries, concurrently, brings those pages in first.
+
+A saved list of the pages in production's buffer pool cannot be replayed,
+as the pages are numbered by tablespace, and every table loaded is a new
+tablespace.
+
+The queries are then run again, and the hit rate of that pass, which is
+what the first requests would see, is logged with how full the pool is.
+"""
+import logging
+import re
+from time import time
+
+from mariadbdmp.client import Session, quoteName, quoteString
+from mariadbdmp.load import runWithSessions
+
+# The end of a statement in a file of queries.
+STATEMENT_END = re.compile(r';[ \t]*$', re.MULTILINE)
+
+
+def readQueries(path):
+    """Return the statements in an SQL file, each ended by a ; at the end of a line."""
+    with open(path, encoding='utf-8') as sqlFile:
+        lines = [line for line in sqlFile if not line.lstrip().startswith('--')]
+
+    return [statement.strip() for statement in STATEMENT_END.split(''.join(lines))
+            if statement.strip()]
+
+
+def indexScans(session, tables):
+    """Return statements reading every index of each table, its data included."""
+    statements = []
+    if not tables:
+        return statements
+
+    for table, index in session.query(
+            'SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS'
+            ' WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME IN ({0})'
+            ' ORDER BY TABLE_NAME, INDEX_NAME'.format(
+                ', '.join(quoteString(table) for table in tables))):
+        # The primary key is the clustered index, holding the rows.
+        statements.append('SELECT COUNT(*) FROM {0} FORCE INDEX ({1})'.format(
+            quoteName(table), 'PRIMARY' if index == 'PRIMARY' else quoteName(index)))
+
+    return statements
+
+
+def bufferPoolStatus(session):
+    """Return the InnoDB buffer pool status counters, by name."""
+    return {name: int(value) for name, value in session.query(
+        "SHOW GLOBAL STATUS LIKE 'Innodb_buffer_pool_%'") if value.isdigit()}
+
+
+def prewarm(optionsPath, tables, queries, workers):
+    """Read the indexes of the tables and run the queries over up to workers connections."""
+    start = time()
+
+    session = Session(optionsPath)
+    try:
+        statements = indexScans(session, tables) + queries
+
+        logging.debug('warming the buffer pool with %s statements over %s connections ...',
+                      len(statements), workers)
+        runWithSessions(optionsPath, lambda worker, sql: worker.execute(sql), statements,
+                        workers)
+        warmed = time() - start
+
+        # The hit rate of the statements run again, as the first requests
+        # would see it.
+        before = bufferPoolStatus(session)
+        runWithSessions(optionsPath, lambda worker, sql: worker.execute(sql),
+                        queries or statements, workers)
+        after = bufferPoolStatus(session)
+    finally:
+        session.close()
+
+    requests = after['Innodb_buffer_pool_read_requests'] - before[
+        'Innodb_buffer_pool_read_requests']
+    reads = after['Innodb_buffer_pool_reads'] - before['Innodb_buffer_pool_reads']
+    hitRate = 1 - reads / requests if requests else 1.0
+
+    logging.info('buffer pool warmed in %.1f secs, with %s statements; hit rate %.1f%%,'
+                 ' %s of %s pages holding data', warmed, len(statements), hitRate * 100,
+                 after.get('Innodb_buffer_pool_pages_data'),
+                 after.get('Innodb_buffer_pool_pages_total'))
+
+    return hitRate
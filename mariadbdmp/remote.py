@@ -0,0 +1,169 @@
+"""
+Inspect and copy a dump on the host it is fetched from.
+
+The commands and copies made over ssh during one run can share a single
+multiplexed master connection, so only the first of them pays for setting
+up a connection over a slow link. With no user or host, the dump is a
+local file and the same operations are made locally.
+"""
+import glob
+import hashlib
+import logging
+import os
+import shlex
+import subprocess
+
+from mariadbdmp.client import CommandError
+
+SSH = '/usr/bin/ssh'
+SCP = '/usr/bin/scp'
+RSYNC = '/usr/bin/rsync'
+CP = '/usr/bin/cp'
+
+# Seconds the master connection stays open after its last use.
+CONTROL_PERSIST = 60
+
+# The name of the directory rsync keeps interrupted copies in, to resume.
+PARTIAL_DIR = '.rsync-partial'
+
+
+def runCommand(args):
+    """Run a command, returning its output, or raising an Exception with it."""
+    logging.debug('running command: %s', ' '.join(args))
+
+    try:
+        return subprocess.check_output(args, stderr=subprocess.STDOUT).decode()
+
+    except subprocess.CalledProcessError as pErr:
+        logging.error('command failed: %s', ' '.join(args))
+        raise CommandError(pErr.output.decode(errors='replace').rstrip()) from pErr
+
+
+def sameFingerprint(previous, current):
+    """Return True if two fingerprints, from Remote.fingerprint, are of the same dump."""
+    if not previous or previous['path'] != current['path']:
+        return False
+
+    # A checksum is good evidence of the same content even if the file
+    # has been written again.
+    if 'sha256' in previous and 'sha256' in current:
+        return previous['sha256'] == current['sha256']
+
+    return previous['size'] == current['size'] and previous['mtime'] == current['mtime']
+
+
+class Remote:
+    """The host a dump is fetched from, over ssh."""
+
+    def __init__(self, user, host, controlPath=None):
+        """Connect, when first used, as user to host, multiplexed over controlPath if given."""
+        self.user = user
+        self.host = host
+        self.controlPath = controlPath
+
+    def isLocal(self):
+        """Return True if the dump is a local file."""
+        return self.user == '' and self.host == ''
+
+    def target(self):
+        """Return the user@host to connect to."""
+        return self.user + '@' + self.host
+
+    def sshOptions(self):
+        """Return the options for ssh, and the commands that run it."""
+        options = ['-o', 'PasswordAuthentication=no']
+
+        if self.controlPath is not None:
+            options += ['-o', 'ControlMaster=auto',
+                        '-o', 'ControlPath=' + self.controlPath,
+                        '-o', 'ControlPersist=' + str(CONTROL_PERSIST)]
+
+        return options
+
+    def sshCommand(self, command):
+        """Return the arguments to run a shell command on the host."""
+        return [SSH] + self.sshOptions() + [self.target(), command]
+
+    def run(self, command):
+        """Run a shell command on the host, returning its output."""
+        return runCommand(self.sshCommand(command))
+
+    def stat(self, path):
+        """Return the size, modification time and whether path is a directory."""
+        if self.isLocal():
+            status = os.stat(path)
+            return status.st_size, int(status.st_mtime), os.path.isdir(path)
+
+        output = self.run("stat -L -c '%s %Y %F' -- " + shlex.quote(path))
+        size, mtime, kind = output.strip().split(' ', 2)
+
+        return int(size), int(mtime), kind == 'directory'
+
+    def checksum(self, path):
+        """Return the hex SHA-256 digest of a file."""
+        if self.isLocal():
+            digest = hashlib.sha256()
+            with open(path, 'rb') as source:
+                for block in iter(lambda: source.read(1024 * 1024), b''):
+                    digest.update(block)
+            return digest.hexdigest()
+
+        return self.run('sha256sum -- ' + shlex.quote(path)).split()[0]
+
+    def fingerprint(self, path, checksum=False, manifestName=None):
+        """
+        Return a record of the size and modification time of a dump.
+
+        For a chunked dump directory the record is of its manifest, which is
+        written last. If checksum is True the record includes the SHA-256
+        digest of the file as well.
+        """
+        size, mtime, isDirectory = self.stat(path)
+
+        if isDirectory and manifestName is not None:
+            path = path + '/' + manifestName
+            size, mtime, isDirectory = self.stat(path)
+
+        record = {'path': path, 'size': size, 'mtime': mtime}
+
+        if checksum and not isDirectory:
+            record['sha256'] = self.checksum(path)
+
+        return record
+
+    def copy(self, path, localDir, transfer='scp'):
+        """Copy a file or directory into localDir, with scp (or cp) or rsync."""
+        if transfer == 'rsync':
+            # rsync only sends what differs from any file already in localDir,
+            # and resumes an interrupted copy from the part kept in PARTIAL_DIR.
+            args = [RSYNC, '-r', '--times', '--partial-dir=' + PARTIAL_DIR]
+            if self.isLocal():
+                args.append(path)
+            else:
+                args += ['-e', ' '.join(shlex.quote(arg)
+                                        for arg in [SSH] + self.sshOptions()),
+                         self.target() + ':' + path]
+            args.append(localDir + '/')
+
+        elif self.isLocal():
+            # Just a local copy, of every file a wildcard matches, as the
+            # remote shell would expand it for scp.
+            args = [CP, '-r'] + (sorted(glob.glob(path)) or [path]) + [localDir]
+
+        else:
+            # scp will replace the local file contents if it already exists
+            # We do not run with '-q' to allow meaningful authentication
+            # error messages to be logged.
+            args = [SCP, '-r'] + self.sshOptions() + [self.target() + ':' + path, localDir]
+
+        runCommand(args)
+
+    def close(self):
+        """Close the master connection, if there is one."""
+        if self.isLocal() or self.controlPath is None:
+            return
+
+        # The master is only running if something connected through it.
+        subprocess.call([SSH, '-o', 'ControlPath=' + self.controlPath, '-O', 'exit',
+                         self.target()],
+                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
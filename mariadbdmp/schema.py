@@ -0,0 +1,182 @@
+"""
+Split a schema dumped by mysqldump into phases for bulk loading.
+
+Loading data is faster into tables without secondary indexes or foreign keys,
+with the indexes built afterwards in one sorted pass per table. Triggers must
+not exist while the data is loaded, or they would fire for every row. So the
+schema is split into:
+  - the tables, with only their primary keys, and views, to load first,
+  - an ALTER TABLE statement per table adding its secondary indexes,
+  - an ALTER TABLE statement per table adding its foreign keys,
+  - the triggers, routines and events, to load last.
+
+The split can be made as a dump, with or without data, is streamed to the
+server, so a single file dump need not be rewritten on disk.
+"""
+import itertools
+import re
+
+# The start of the lines, inside a CREATE TABLE statement, that are deferred
+# until after the data is loaded.
+INDEX_LINE = re.compile(rb'^(UNIQUE |FULLTEXT |SPATIAL )?KEY ')
+FOREIGN_KEY_LINE = re.compile(rb'^CONSTRAINT .* FOREIGN KEY ')
+
+# The first line of a CREATE TABLE statement, capturing the table name.
+CREATE_TABLE = re.compile(rb'^CREATE TABLE (`(?:[^`]|``)+`) \($')
+
+# The comments mysqldump writes at the start of each table, view and the
+# routines and events, each starting a section of the dump that can be
+# loaded on its own, after the header of session settings.
+SECTION_COMMENT = re.compile(rb'^-- (Table structure for table|Temporary table structure for view'
+                             rb'|Final view structure for view|Dumping routines for database'
+                             rb'|Dumping events for database) ')
+
+# The statements mysqldump --databases writes to choose the database.
+DATABASE_STATEMENT = re.compile(rb'^(CREATE DATABASE |USE `)')
+
+# The start of an INSERT statement, capturing the table name.
+INSERT_INTO = re.compile(rb'^INSERT INTO (`(?:[^`]|``)+`) ')
+
+# A string in an INSERT statement, in which any ),( is data.
+QUOTED_STRING = re.compile(rb"'[^'\\]*(?:\\.[^'\\]*)*'", re.DOTALL)
+
+
+def rowCount(statement):
+    """Return the number of rows an INSERT statement, as written by mysqldump, inserts."""
+    if b"'" in statement:
+        statement = QUOTED_STRING.sub(b"''", statement)
+
+    return statement.count(b'),(') + 1
+
+
+class SchemaSplitter:
+    """Holds back the definitions to add after the data from a dump."""
+
+    def __init__(self, countRows=False):
+        """Start with nothing held back, counting the rows inserted if countRows is True."""
+        # ALTER TABLE statements, without the terminating semicolon.
+        self.indexes = []
+        self.foreignKeys = []
+        # Lines of SQL.
+        self.post = []
+        # The names of the tables created.
+        self.tables = []
+        # The rows inserted into each table, by name, if counted.
+        self.countRows = countRows
+        self.rows = {}
+
+    def postSql(self):
+        """Return the SQL to create the triggers, routines and events."""
+        return b''.join(self.post).decode()
+
+    def extend(self, other):
+        """Add what another SchemaSplitter, given a later part of the dump, held back."""
+        self.indexes += other.indexes
+        self.foreignKeys += other.foreignKeys
+        self.post += other.post
+        self.tables += other.tables
+        for table, rows in other.rows.items():
+            self.rows[table] = self.rows.get(table, 0) + rows
+
+    def filter(self, lines):
+        """Yield the lines of a dump, less those held back."""
+        lines = iter(lines)
+        for line in lines:
+            match = CREATE_TABLE.match(line)
+            if match:
+                self.tables.append(match.group(1)[1:-1].replace(b'``', b'`').decode())
+                yield line
+                for line in self._filterTable(match.group(1).decode(), lines):
+                    yield line
+
+            elif line.startswith(b'DELIMITER ;;'):
+                # Triggers and routines, up to the end of their block.
+                self.post.append(line)
+                for line in lines:
+                    self.post.append(line)
+                    if line.strip() == b'DELIMITER ;':
+                        break
+
+            elif line.startswith(b'/*!50003 ') or line.startswith(b'/*!50106 '):
+                # The settings around triggers and routines, and events.
+                self.post.append(line)
+
+            elif line.startswith(b'/*!40101 SET NAMES '):
+                # Needed by both the tables and the post data SQL.
+                self.post.append(line)
+                yield line
+
+            elif self.countRows and line.startswith(b'INSERT INTO '):
+                match = INSERT_INTO.match(line)
+                if match:
+                    table = match.group(1)[1:-1].replace(b'``', b'`').decode()
+                    self.rows[table] = self.rows.get(table, 0) + rowCount(line)
+                yield line
+
+            else:
+                yield line
+
+    def _filterTable(self, table, lines):
+        """Yield the rest of a CREATE TABLE statement, less deferred definitions."""
+        columns = []
+        indexes = []
+        foreignKeys = []
+
+        for line in lines:
+            if line.startswith(b')'):
+                break
+            definition = line.strip().rstrip(b',').decode()
+            if INDEX_LINE.match(line.strip()):
+                indexes.append('ADD ' + definition)
+            elif FOREIGN_KEY_LINE.match(line.strip()):
+                foreignKeys.append('ADD ' + definition)
+            else:
+                columns.append(line.rstrip(b'\n').rstrip(b','))
+
+        yield b',\n'.join(columns) + b'\n'
+        yield line
+
+        if indexes:
+            self.indexes.append('ALTER TABLE {0} {1}'.format(table, ', '.join(indexes)))
+        if foreignKeys:
+            self.foreignKeys.append('ALTER TABLE {0} {1}'.format(table, ', '.join(foreignKeys)))
+
+
+def withoutDatabaseStatements(lines):
+    """Yield the lines of a dump, less those choosing the database to load into."""
+    for line in lines:
+        if not DATABASE_STATEMENT.match(line):
+            yield line
+
+
+def dumpSections(lines):
+    """
+    Split the lines of a dump into sections that can be loaded on their own.
+
+    Yields (name, lines) for each section, named after the comment it starts
+    with, or None for the header before the first section. As with
+    itertools.groupby, the lines of a section must be used before the next.
+    """
+    current = [None]
+
+    def section(line):
+        if SECTION_COMMENT.match(line):
+            current[0] = line[3:].rstrip().decode(errors='replace')
+        return current[0]
+
+    return itertools.groupby(lines, section)
+
+
+def splitSchema(schemaSql):
+    """
+    Split the text of a schema dump into phases for loading.
+
+    Returns a tuple of (tables SQL, list of index statements, list of
+    foreign key statements, post data SQL).
+    """
+    splitter = SchemaSplitter()
+
+    tablesSql = b''.join(splitter.filter(
+        line.encode() for line in schemaSql.splitlines(True))).decode()
+
+    return (tablesSql, splitter.indexes, splitter.foreignKeys, splitter.postSql())
@@ -0,0 +1,201 @@
+"""
+Load a dump into a shadow database, and swap it in for the live one.
+
+The live database is left untouched while the dump is loaded into the
+shadow database. Once it is loaded and validated, every table of the live
+database is moved to the previous generation database, and every table of
+the shadow database into the live one, by a single RENAME TABLE statement,
+which the server runs atomically. Readers of the live database see either
+all of the old tables or all of the new ones, never a partial load.
+
+The previous generation is kept until the next import, so a rollback is
+just another swap.
+
+A table with triggers cannot be moved to another database, so the triggers
+of the live tables are dropped just before the swap, and those of the new
+tables created just after it. Views are not moved either, but recreated in
+the live database from the shadow database's definitions.
+"""
+import logging
+from time import time
+
+from mariadbdmp.client import quoteName, quoteString
+
+# Appended to the live database name to make the shadow and previous
+# generation database names.
+SHADOW_SUFFIX = '_shadow'
+PREVIOUS_SUFFIX = '_previous'
+
+
+def baseTables(session, database):
+    """Return the names of the tables, but not the views, in a database."""
+    return [row[0] for row in session.query(
+        "SELECT TABLE_NAME FROM information_schema.TABLES"
+        " WHERE TABLE_SCHEMA = {0} AND TABLE_TYPE = 'BASE TABLE'"
+        " ORDER BY TABLE_NAME".format(quoteString(database)))]
+
+
+def createDatabase(session, database, like):
+    """Create an empty database, dropping any existing one, with the character set of like."""
+    charset = session.query(
+        'SELECT DEFAULT_CHARACTER_SET_NAME, DEFAULT_COLLATION_NAME'
+        ' FROM information_schema.SCHEMATA WHERE SCHEMA_NAME = ' + quoteString(like))
+
+    logging.debug('creating empty database %s', database)
+
+    session.execute('DROP DATABASE IF EXISTS ' + quoteName(database))
+
+    sql = 'CREATE DATABASE ' + quoteName(database)
+    if charset:
+        sql += ' CHARACTER SET {0} COLLATE {1}'.format(*charset[0])
+    session.execute(sql)
+
+
+def quoteAccount(definer):
+    """Quote a user@host account name, as stored in information_schema, for use in SQL."""
+    user, _, host = definer.rpartition('@')
+    return quoteString(user) + '@' + quoteString(host)
+
+
+def triggers(session, database):
+    """Return (name, SQL to create it) for each trigger in a database."""
+    result = []
+    for name, table, timing, event, statement, definer, sqlMode in session.query(
+            'SELECT TRIGGER_NAME, EVENT_OBJECT_TABLE, ACTION_TIMING, EVENT_MANIPULATION,'
+            ' HEX(ACTION_STATEMENT), DEFINER, SQL_MODE FROM information_schema.TRIGGERS'
+            ' WHERE TRIGGER_SCHEMA = {0}'
+            ' ORDER BY EVENT_OBJECT_TABLE, ACTION_ORDER'.format(quoteString(database))):
+        result.append((name, (
+            'SET SESSION sql_mode = {0};\n'
+            'DELIMITER ;;\n'
+            'CREATE DEFINER={1} TRIGGER {2} {3} {4} ON {5} FOR EACH ROW {6};;\n'
+            'DELIMITER ;\n').format(
+                quoteString(sqlMode), quoteAccount(definer), quoteName(name), timing,
+                event, quoteName(table), bytes.fromhex(statement).decode())))
+
+    return result
+
+
+def dropTriggers(session, database):
+    """Drop the triggers in a database, returning the SQL to create them again."""
+    sql = ''
+    for name, createSql in triggers(session, database):
+        session.execute('DROP TRIGGER {0}.{1}'.format(quoteName(database), quoteName(name)))
+        sql += createSql
+
+    return sql
+
+
+def views(session, database):
+    """Return (name, definition, security type, definer) for each view, most dependent last."""
+    pending = [(name, bytes.fromhex(definition).decode(), security, definer)
+               for name, definition, security, definer in session.query(
+                   'SELECT TABLE_NAME, HEX(VIEW_DEFINITION), SECURITY_TYPE, DEFINER'
+                   ' FROM information_schema.VIEWS WHERE TABLE_SCHEMA = {0}'
+                   ' ORDER BY TABLE_NAME'.format(quoteString(database)))]
+
+    ordered = []
+    while pending:
+        names = [quoteName(database) + '.' + quoteName(view[0]) for view in pending]
+        ready = [view for view in pending
+                 if not any(name in view[1] for name in names
+                            if not name.endswith('.' + quoteName(view[0])))]
+        # Views referring to each other in a cycle cannot be created anyway.
+        ready = ready or pending
+        ordered += ready
+        pending = [view for view in pending if view not in ready]
+
+    return ordered
+
+
+def copyViews(session, source, target):
+    """Replace the views in target with those in source, referring to target's tables."""
+    for (name,) in session.query(
+            'SELECT TABLE_NAME FROM information_schema.VIEWS'
+            ' WHERE TABLE_SCHEMA = ' + quoteString(target)):
+        session.execute('DROP VIEW {0}.{1}'.format(quoteName(target), quoteName(name)))
+
+    for name, definition, security, definer in views(session, source):
+        definition = definition.replace(quoteName(source) + '.', quoteName(target) + '.')
+        session.execute('CREATE DEFINER={0} SQL SECURITY {1} VIEW {2}.{3} AS {4}'.format(
+            quoteAccount(definer), security, quoteName(target), quoteName(name), definition))
+
+
+def validate(session, shadow, expectedTables):
+    """Check the shadow database has every table the dump created."""
+    tables = set(baseTables(session, shadow))
+
+    if not tables:
+        raise Exception('Shadow database ' + shadow + ' has no tables. Swap abandoned.')
+
+    missing = sorted(set(expectedTables) - tables)
+    if missing:
+        raise Exception('Shadow database ' + shadow + ' is missing tables: '
+                        + ', '.join(missing) + '. Swap abandoned.')
+
+
+def renameSql(moves):
+    """Return a RENAME TABLE statement making each (database, table, new database) move."""
+    return 'RENAME TABLE ' + ', '.join(
+        '{0}.{1} TO {2}.{1}'.format(quoteName(database), quoteName(table), quoteName(target))
+        for database, table, target in moves)
+
+
+def rename(session, moves):
+    """Make all the moves in one RENAME TABLE statement, logging how long it took."""
+    start = time()
+
+    session.execute(renameSql(moves))
+
+    logging.info('swapped %s tables in %.3f secs', len(moves), time() - start)
+
+
+def swap(session, live, shadow, previous):
+    """
+    Swap the tables of the shadow database in for those of the live one.
+
+    The live tables are moved to the previous database, which is emptied
+    first. Returns the SQL to create the triggers the live tables had.
+    """
+    # On the first import, there is no live database yet.
+    session.execute('CREATE DATABASE IF NOT EXISTS ' + quoteName(live))
+
+    createDatabase(session, previous, live)
+
+    moves = ([(live, table, previous) for table in baseTables(session, live)]
+             + [(shadow, table, live) for table in baseTables(session, shadow)])
+
+    triggersSql = dropTriggers(session, live)
+
+    rename(session, moves)
+
+    copyViews(session, shadow, live)
+
+    return triggersSql
+
+
+def rollback(session, live, shadow, previous):
+    """
+    Swap the previous generation tables back in for the live ones.
+
+    The live tables become the previous generation, so a second rollback
+    undoes the first. The shadow database is used for the exchange, and
+    left empty. Returns the SQL to create the triggers the live tables had.
+    """
+    previousTables = baseTables(session, previous)
+    if not previousTables:
+        raise Exception('Previous generation database ' + previous
+                        + ' has no tables. Rollback abandoned.')
+
+    createDatabase(session, shadow, live)
+
+    liveTables = baseTables(session, live)
+    moves = ([(live, table, shadow) for table in liveTables]
+             + [(previous, table, live) for table in previousTables]
+             + [(shadow, table, previous) for table in liveTables])
+
+    triggersSql = dropTriggers(session, live)
+
+    rename(session, moves)
+
+    return triggersSql
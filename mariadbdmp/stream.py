@@ -0,0 +1,323 @@
+"""
+Stream a dump from where it is kept, decompressing it on the way.
+
+A single file dump is read from the remote host with ssh, or from a local
+file, in blocks, and decompressed as it arrives, so it can be loaded
+without staging a copy on disk. zip, gzip and xz dumps are decompressed
+in-process; zstd dumps with the external command.
+"""
+import contextlib
+import logging
+import lzma
+import shlex
+import struct
+import subprocess
+import threading
+import zlib
+
+from mariadbdmp.client import CommandError
+from mariadbdmp.compression import DECOMPRESSORS, compressionOf
+from mariadbdmp.load import COPY_BUFFER_SIZE, fileBlocks
+
+# The fixed size part of a zip local file header.
+ZIP_LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+ZIP_LOCAL_SIGNATURE = b'PK\x03\x04'
+ZIP_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+ZIP_CENTRAL_SIGNATURE = b'PK\x01\x02'
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# General purpose flags of a zip member.
+ZIP_ENCRYPTED = 0x01
+ZIP_DATA_DESCRIPTOR = 0x08
+
+
+class BlockReader:
+    """Read exact amounts from an iterable of bytes blocks."""
+
+    def __init__(self, blocks):
+        """Start reading at the first block."""
+        self.blocks = iter(blocks)
+        self.buffer = b''
+
+    def read(self, size):
+        """Return the next size bytes, or fewer at the end of the blocks."""
+        while len(self.buffer) < size:
+            block = next(self.blocks, b'')
+            if block == b'':
+                break
+            self.buffer += block
+
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+    def readBlock(self):
+        """Return the next bytes, of any size, or b'' at the end of the blocks."""
+        if self.buffer:
+            data, self.buffer = self.buffer, b''
+            return data
+
+        return next(self.blocks, b'')
+
+    def unread(self, data):
+        """Return data to be read again."""
+        self.buffer = data + self.buffer
+
+
+@contextlib.contextmanager
+def openSource(remote, remotePath):
+    """Open a file on a mariadbdmp.remote.Remote host, or a local file, for reading."""
+    if remote.isLocal():
+        with open(remotePath, 'rb') as source:
+            yield source
+        return
+
+    args = remote.sshCommand('cat -- ' + shlex.quote(remotePath))
+
+    logging.debug('running command: %s', ' '.join(args))
+
+    ssh = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def finish():
+        ssh.stdout.close()
+        err = ssh.stderr.read()
+        ssh.stderr.close()
+        returnCode = ssh.wait()
+        # ssh exits with 255 if the connection failed.
+        return CommandError(err.decode(errors='replace').rstrip(), transient=returnCode == 255)
+
+    try:
+        yield ssh.stdout
+    except CommandError:
+        finish()
+        raise
+    except Exception as exc:
+        # A dump cut short may be because the connection failed.
+        error = finish()
+        if error.transient:
+            logging.error('command failed: %s', ' '.join(args))
+            raise error from exc
+        raise
+    except BaseException:
+        finish()
+        raise
+
+    error = finish()
+    if ssh.returncode != 0:
+        logging.error('command failed: %s', ' '.join(args))
+        raise error
+
+
+def teeBlocks(blocks, output):
+    """Yield each block, after writing it to a binary file object."""
+    for block in blocks:
+        output.write(block)
+        yield block
+
+
+def blockLines(blocks):
+    """Yield the lines, with their line endings, in an iterable of blocks."""
+    rest = b''
+    for block in blocks:
+        lines = (rest + block).split(b'\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line + b'\n'
+
+    if rest:
+        yield rest
+
+
+def streamBlocks(blocks, newDecompressor, name):
+    """Decompress blocks of one or more concatenated compressed streams."""
+    decompressor = None
+    for block in blocks:
+        while block:
+            if decompressor is None:
+                decompressor = newDecompressor()
+
+            # Limit each block decompressed, so a highly compressed dump does
+            # not decompress all at once.
+            data = decompressor.decompress(block, COPY_BUFFER_SIZE)
+            block = getattr(decompressor, 'unconsumed_tail', b'')
+            if data:
+                yield data
+
+            # The xz decompressor keeps the input it has not used itself.
+            while not block and not decompressor.eof \
+                    and not getattr(decompressor, 'needs_input', True):
+                data = decompressor.decompress(b'', COPY_BUFFER_SIZE)
+                if data:
+                    yield data
+
+            if decompressor.eof:
+                block = decompressor.unused_data
+                decompressor = None
+
+    while decompressor is not None and not decompressor.eof:
+        data = decompressor.decompress(b'', COPY_BUFFER_SIZE)
+        if not data:
+            raise Exception('Error: ' + name + ' dump is truncated.')
+        yield data
+
+
+def commandBlocks(blocks, args):
+    """Pass blocks through a command, reading stdin and writing stdout."""
+    logging.debug('running command: %s', ' '.join(args))
+
+    command = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE)
+    feedErrors = []
+
+    def feed():
+        try:
+            for block in blocks:
+                command.stdin.write(block)
+        except BrokenPipeError:
+            # The command reports why it stopped reading.
+            pass
+        except Exception as exc:
+            feedErrors.append(exc)
+            command.kill()
+        finally:
+            try:
+                command.stdin.close()
+            except BrokenPipeError:
+                pass
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    try:
+        for block in fileBlocks(command.stdout):
+            yield block
+    except GeneratorExit:
+        # The reader has stopped, so stop the command and its feeder.
+        command.kill()
+        raise
+    finally:
+        command.stdout.close()
+        feeder.join()
+        err = command.stderr.read()
+        command.stderr.close()
+        returnCode = command.wait()
+
+    if feedErrors:
+        raise feedErrors[0]
+
+    if returnCode != 0:
+        logging.error('command failed: %s', ' '.join(args))
+        raise CommandError(err.decode(errors='replace').rstrip())
+
+
+def zipBlocks(blocks):
+    """Yield the contents of the only member of a zip archive."""
+    reader = BlockReader(blocks)
+
+    header = reader.read(ZIP_LOCAL_HEADER.size)
+    if len(header) < ZIP_LOCAL_HEADER.size or not header.startswith(ZIP_LOCAL_SIGNATURE):
+        raise Exception('Error: not a .zip archive.')
+
+    (_, _, flags, method, _, _, crc, compressedSize, _,
+     nameLength, extraLength) = ZIP_LOCAL_HEADER.unpack(header)
+
+    reader.read(nameLength + extraLength)
+
+    if flags & ZIP_ENCRYPTED:
+        raise Exception('Error: .zip archive is encrypted.')
+
+    checksum = 0
+
+    if method == ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        while not decompressor.eof:
+            block = decompressor.unconsumed_tail or reader.readBlock()
+            data = decompressor.decompress(block, COPY_BUFFER_SIZE)
+            if block == b'' and data == b'':
+                raise Exception('Error: .zip archive is truncated.')
+            checksum = zlib.crc32(data, checksum)
+            if data:
+                yield data
+        reader.unread(decompressor.unused_data)
+
+    elif method == ZIP_STORED and not flags & ZIP_DATA_DESCRIPTOR \
+            and compressedSize != 0xFFFFFFFF:
+        remaining = compressedSize
+        while remaining > 0:
+            data = reader.read(min(remaining, 1024 * 1024))
+            if data == b'':
+                raise Exception('Error: .zip archive is truncated.')
+            remaining -= len(data)
+            checksum = zlib.crc32(data, checksum)
+            yield data
+
+    else:
+        raise Exception('Error: unsupported .zip compression method ' + str(method) + '.')
+
+    if flags & ZIP_DATA_DESCRIPTOR:
+        # The CRC and sizes follow the data, as sizes of 4 bytes, or 8 bytes
+        # in a zip64 archive.
+        descriptor = reader.read(4)
+        if descriptor == ZIP_DESCRIPTOR_SIGNATURE:
+            descriptor = reader.read(4)
+        crc = struct.unpack('<I', descriptor)[0]
+        reader.read(8)
+        signature = reader.read(4)
+        if signature not in (ZIP_LOCAL_SIGNATURE, ZIP_CENTRAL_SIGNATURE):
+            # The rest of the zip64 sizes.
+            reader.read(4)
+            signature = reader.read(4)
+        reader.unread(signature)
+
+    if checksum != crc:
+        raise Exception('Error: .zip archive CRC check failed.')
+
+    if reader.read(4) == ZIP_LOCAL_SIGNATURE:
+        raise Exception('Error: .zip archive must contain only 1 file.')
+
+    # Read the central directory, so the source is read to the end.
+    while reader.readBlock():
+        pass
+
+
+def decompressBlocks(blocks, path):
+    """Decompress blocks of a dump, going by the suffix of its path."""
+    if path.endswith('.zip'):
+        return zipBlocks(blocks)
+
+    compression = compressionOf(path)
+
+    if compression == 'gzip':
+        return streamBlocks(blocks, lambda: zlib.decompressobj(16 + zlib.MAX_WBITS), 'gzip')
+
+    if compression == 'xz':
+        return streamBlocks(blocks, lzma.LZMADecompressor, 'xz')
+
+    if compression == 'zstd':
+        return commandBlocks(blocks, DECOMPRESSORS['zstd'])
+
+    return blocks
+
+
+@contextlib.contextmanager
+def openStream(remote, remotePath, teePath=None):
+    """
+    Open a dump for streaming, as an iterable of decompressed blocks.
+
+    If teePath is given, the dump as read, before it is decompressed, is
+    also written there.
+    """
+    with contextlib.ExitStack() as stack:
+        source = stack.enter_context(openSource(remote, remotePath))
+
+        blocks = fileBlocks(source)
+        if teePath is not None:
+            blocks = teeBlocks(blocks, stack.enter_context(open(teePath, 'wb')))
+
+        blocks = decompressBlocks(blocks, remotePath)
+        if hasattr(blocks, 'close'):
+            # Stop decompressing before the source is closed.
+            stack.callback(blocks.close)
+
+        yield blocks
@@ -0,0 +1,139 @@
+"""
+Check a loaded database holds the rows of the dump it was loaded from.
+
+The rows of each table loaded are counted, and compared with the rows the
+dump held, as counted in its index or the manifest of a chunked dump. A
+checksum of the rows is computed in the same pass, and compared with the
+one recorded the last time the table was loaded from the same data.
+
+A table with more than CHUNK_ROWS rows and an integer primary key is
+counted a range of keys at a time, and the ranges of every table counted
+concurrently, over a few connections, so no connection scans a large
+table on its own. The checksum of a table is the XOR of a digest of each
+row, so the checksums of its ranges combine into the checksum of the table
+however it was split.
+"""
+import logging
+import threading
+from time import time
+
+from mariadbdmp.client import Session, quoteName
+from mariadbdmp.load import runWithSessions
+from mariadbdmp.paralleldump import INTEGER_TYPES, keyRanges
+
+# Tables with more estimated rows than this are counted a range of primary
+# keys of about this many rows at a time.
+CHUNK_ROWS = 100000
+
+
+def checksumExpression(columns):
+    """Return SQL aggregating a 64 bit digest of each row with XOR."""
+    names = [quoteName(name) for name in columns]
+    # CONCAT_WS skips NULLs, so which columns are NULL is included too.
+    nulls = 'CONCAT(' + ', '.join('ISNULL({0})'.format(name) for name in names) + ')'
+
+    return ("BIT_XOR(CAST(CONV(LEFT(MD5(CONCAT_WS('#', {0}, {1})), 16), 16, 10)"
+            ' AS UNSIGNED))').format(', '.join(names), nulls)
+
+
+def planRanges(session, tables):
+    """Return (table, SQL) for each range of the tables to count and checksum."""
+    columns = {}
+    for table, name, dataType in session.query(
+            'SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE FROM information_schema.COLUMNS'
+            ' WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME, ORDINAL_POSITION'):
+        columns.setdefault(table, []).append((name, dataType.lower()))
+
+    primaryKeys = {}
+    for table, name in session.query(
+            'SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.KEY_COLUMN_USAGE'
+            " WHERE TABLE_SCHEMA = DATABASE() AND CONSTRAINT_NAME = 'PRIMARY'"
+            ' ORDER BY TABLE_NAME, ORDINAL_POSITION'):
+        primaryKeys.setdefault(table, []).append(name)
+
+    estimates = dict(session.query(
+        'SELECT TABLE_NAME, IFNULL(TABLE_ROWS, 0) FROM information_schema.TABLES'
+        " WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'"))
+
+    missing = sorted(table for table in tables if table not in estimates)
+    if missing:
+        raise Exception('Verification failed: table(s) missing from the database: '
+                        + ', '.join(missing))
+
+    # Start the largest tables first, so no connection is left counting a
+    # large table long after the others have finished.
+    ranges = []
+    for table in sorted(tables, key=lambda table: -int(estimates[table])):
+        key = primaryKeys.get(table, [])
+        keyTypes = [dataType for name, dataType in columns[table] if key == [name]]
+
+        wheres = [None]
+        if int(estimates[table]) > CHUNK_ROWS and keyTypes and keyTypes[0] in INTEGER_TYPES:
+            wheres = keyRanges(session, table, key[0], -(-int(estimates[table]) // CHUNK_ROWS))
+
+        select = 'SELECT COUNT(*), {0} FROM {1}'.format(
+            checksumExpression([name for name, _ in columns[table]]), quoteName(table))
+        ranges += [(table, select if where is None else select + ' WHERE ' + where)
+                   for where in wheres]
+
+    return ranges
+
+
+def measureTables(optionsPath, tables, workers):
+    """Return the rows and checksum of each table, counted over up to workers connections."""
+    session = Session(optionsPath)
+    try:
+        ranges = planRanges(session, tables)
+    finally:
+        session.close()
+
+    measured = {table: {'rows': 0, 'checksum': 0} for table in tables}
+    lock = threading.Lock()
+
+    def measureRange(rangeSession, tableRange):
+        table, sql = tableRange
+        rows, checksum = rangeSession.query(sql)[0]
+        with lock:
+            measured[table]['rows'] += int(rows)
+            measured[table]['checksum'] ^= int(checksum)
+
+    logging.debug('counting %s tables in %s ranges over %s connections ...',
+                  len(tables), len(ranges), workers)
+    runWithSessions(optionsPath, measureRange, ranges, workers)
+
+    return measured
+
+
+def verifyTables(optionsPath, expected, recorded, workers):
+    """
+    Check each table of expected holds the rows the dump did, raising an Exception if not.
+
+    expected holds the rows of each table in the dump, and the digest of
+    its data, or None if not known. recorded holds the digest and checksum
+    of each table when it was last verified. Returns the digest, rows and
+    checksum of each table verified, to be recorded.
+    """
+    start = time()
+    measured = measureTables(optionsPath, sorted(expected), workers)
+
+    problems = []
+    for table, dumped in sorted(expected.items()):
+        rows = measured[table]['rows']
+        if rows != dumped['rows']:
+            problems.append('{0} has {1} rows, the dump {2}'.format(table, rows, dumped['rows']))
+
+        last = recorded.get(table)
+        if (dumped['digest'] is not None and last is not None
+                and last['digest'] == dumped['digest']
+                and last['checksum'] != measured[table]['checksum']):
+            problems.append('{0} differs from the last load of the same data'.format(table))
+
+    if problems:
+        raise Exception('Verification failed: ' + '; '.join(problems))
+
+    logging.info('verified %s tables, %s rows, in %.1f secs', len(expected),
+                 sum(table['rows'] for table in measured.values()), time() - start)
+
+    return {table: {'digest': dumped['digest'], 'rows': measured[table]['rows'],
+                    'checksum': measured[table]['checksum']}
+            for table, dumped in expected.items()}
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Install the mariadbdmp package, shared by the failover scripts.
+
+The scripts are still run from this directory, by their paths; they import
+mariadbdmp as an installed package.
+"""
+from setuptools import setup
+
+setup(
+    name='mariadbdmp',
+    version='1.0.0',
+    description='Dump, fetch and load the GOCDB database for the failover instance',
+    packages=['mariadbdmp'],
+    python_requires='>=3.6',
+)
@@ -5,8 +5,13 @@ This file tests the script that checks the GOCDB failover process is
 happening.
 """
 
+import contextlib
 from datetime import datetime, timedelta
+import gzip
+import io
+import lzma
 import os
+import shutil
 import tempfile
 import unittest
 
@@ -247,6 +252,16 @@ class TestCheckDBDumpRecent(unittest.TestCase):
             ),
         )
 
+    def test_success_far_from_end(self):
+        """Test the check script finds a success many blocks from the end."""
+        log_line_list = [
+            "2023-01-01T11:40:01+0000",
+            "2023-01-01T11:41:01+0000 INFO: completed ok",
+        ]
+        log_line_list += ["2023-01-01T11:45:01+0000 ERROR: An Error"] * 5000
+
+        self._run_test(log_line_list, check_db_dump_recent.RETURN_CODE_OK)
+
     def _list_to_temp_file(self, input_list):
         """Take the given list and write it to self.temp_file_path."""
         with open(self.temp_file_path, "w") as temp_file:
@@ -254,6 +269,558 @@ class TestCheckDBDumpRecent(unittest.TestCase):
                 temp_file.write(line + "\n")
 
 
+class TestCheckDBDumpRecentState(TestCheckDBDumpRecent):
+    """
+    This class tests the check.check_db_dump_recent module with a state file.
+
+    As well as running all the tests inherited from TestCheckDBDumpRecent
+    with a state file, it tests the state file is used, or ignored, as
+    appropriate on later runs.
+    """
+
+    def setUp(self):
+        super().setUp()
+
+        # Create a temporary directory for the state file, which does not
+        # exist until the first run.
+        self.temp_dir = tempfile.mkdtemp()
+        self.state_file_path = os.path.join(self.temp_dir, "state.json")
+
+        self.test_checker = check_db_dump_recent.CheckDBDumpRecent(
+            grace_period=timedelta(
+                minutes=30
+            ),
+            state_file_path=self.state_file_path,
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        if os.path.exists(self.state_file_path):
+            os.remove(self.state_file_path)
+        os.rmdir(self.temp_dir)
+
+    def _run_test_again(self, log_line_list, expected_return_code):
+        """
+        Run the checker twice, with a modified log file the second time.
+
+        The first run sees a recent success. Before the second run, that
+        success is overwritten in place, with a line of the same length,
+        and log_line_list is appended to the log file. The success is far
+        enough from the end of the file that overwriting it does not look
+        like the log file being replaced.
+        """
+        self._run_test(
+            [
+                "2023-01-01T11:40:01+0000",
+                "2023-01-01T11:41:01+0000 INFO: completed ok",
+                "2023-01-01T11:45:01+0000",
+                "2023-01-01T11:45:02+0000",
+                "2023-01-01T11:45:03+0000",
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+        with open(self.temp_file_path, "r+") as temp_file:
+            temp_file.seek(50)
+            temp_file.write("INFO: overwritten!")
+            temp_file.seek(0, os.SEEK_END)
+            for line in log_line_list:
+                temp_file.write(line + "\n")
+
+        return_code = self.test_checker.run(self.temp_file_path)
+
+        self.assertEqual(
+            return_code,
+            expected_return_code,
+            "Expected code %s, but got %s." % (
+                expected_return_code,
+                return_code,
+            ),
+        )
+
+    def test_state_reused(self):
+        """Test only lines appended since the previous run are read."""
+        # The success from the first run is remembered, even though it is
+        # no longer in the log file, proving the start of the file was not
+        # read again.
+        self._run_test_again(
+            ["2023-01-01T11:46:01+0000 ERROR: An Error"],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+    def test_state_new_success(self):
+        """Test a success appended since the previous run is found."""
+        self._run_test_again(
+            ["2023-01-01T11:46:01+0000 INFO: completed ok"],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+        with open(self.state_file_path, "r") as state_file:
+            self.assertIn("2023-01-01T11:46:01+0000", state_file.read())
+
+    def test_state_partial_line(self):
+        """Test a line being written during a run is read by the next run."""
+        self._list_to_temp_file(["2023-01-01T09:41:01+0000 INFO: completed ok"])
+        with open(self.temp_file_path, "a") as temp_file:
+            temp_file.write("2023-01-01T11:41:01+0000 INFO: comp")
+
+        self.assertEqual(
+            self.test_checker.run(self.temp_file_path),
+            check_db_dump_recent.RETURN_CODE_CRITICAL,
+        )
+
+        with open(self.temp_file_path, "a") as temp_file:
+            temp_file.write("leted ok\n")
+
+        self.assertEqual(
+            self.test_checker.run(self.temp_file_path),
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+    def test_state_truncated(self):
+        """Test the whole log file is read after it has been truncated."""
+        self._run_test(
+            [
+                "2023-01-01T11:40:01+0000",
+                "2023-01-01T11:41:01+0000 INFO: completed ok",
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+        self._run_test(
+            ["2023-01-01T11:50:01+0000 ERROR: An Error"],
+            check_db_dump_recent.RETURN_CODE_CRITICAL,
+        )
+
+    def test_state_rewritten(self):
+        """Test the whole log file is read after it has been rewritten."""
+        self._run_test(
+            [
+                "2023-01-01T11:40:01+0000",
+                "2023-01-01T11:41:01+0000 INFO: completed ok",
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+        # Same size as before, but no longer with a success.
+        self._run_test(
+            [
+                "2023-01-01T11:40:01+0000",
+                "2023-01-01T11:41:01+0000 ERROR: not completed",
+            ],
+            check_db_dump_recent.RETURN_CODE_CRITICAL,
+        )
+
+    def test_state_not_saved(self):
+        """Test a state file that cannot be written only adds a warning."""
+        self.test_checker.state_file_path = os.path.join(
+            self.temp_dir,
+            "missing",
+            "state.json",
+        )
+        self._list_to_temp_file(
+            [
+                "2023-01-01T11:40:01+0000",
+                "2023-01-01T11:41:01+0000 INFO: completed ok",
+            ]
+        )
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            return_code = self.test_checker.run(self.temp_file_path)
+
+        self.assertEqual(return_code, check_db_dump_recent.RETURN_CODE_OK)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("The failover process last succeeded"))
+        self.assertTrue(lines[1].startswith("Warning: could not save the state"))
+
+    def test_state_corrupt(self):
+        """Test an unreadable state file causes the whole log to be read."""
+        with open(self.state_file_path, "w") as state_file:
+            state_file.write("not json")
+
+        self._run_test(
+            [
+                "2023-01-01T11:40:01+0000",
+                "2023-01-01T11:41:01+0000 INFO: completed ok",
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+
+class TestRotatedLogs(unittest.TestCase):
+    """
+    This class tests the check.check_db_dump_recent module with rotated logs.
+
+    Each test writes a live log file, updateLog.txt, and rotated copies of it
+    to a temporary directory, with the modification times of the rotated
+    copies in the given order, newest first.
+    """
+
+    def setUp(self):
+        self.test_checker = check_db_dump_recent.CheckDBDumpRecent(
+            grace_period=timedelta(
+                minutes=30
+            )
+        )
+
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file_path = os.path.join(self.temp_dir, "updateLog.txt")
+
+        check_db_dump_recent.datetime = MonkeyDateTime
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _run_test(self, rotated_logs, expected_return_code):
+        """
+        A helper function to run the checker, checking the return code.
+
+        rotated_logs is a list of (suffix, log_line_list) pairs, newest first,
+        the first of which is the live log file, with an empty suffix.
+        """
+        mtime = 1672574400
+        for suffix, log_line_list in rotated_logs:
+            path = self.log_file_path + suffix
+            content = "".join(line + "\n" for line in log_line_list).encode()
+
+            if suffix.endswith(".gz"):
+                opener = gzip.open
+            elif suffix.endswith(".xz"):
+                opener = lzma.open
+            else:
+                opener = open
+
+            with opener(path, "wb") as log_file:
+                log_file.write(content)
+
+            os.utime(path, (mtime, mtime))
+            mtime -= 3600
+
+        return_code = self.test_checker.run(self.log_file_path)
+
+        self.assertEqual(
+            return_code,
+            expected_return_code,
+            "Expected code %s, but got %s." % (
+                expected_return_code,
+                return_code,
+            ),
+        )
+
+    def test_success_in_compressed_log(self):
+        """Test a success is found in a compressed rotated log."""
+        self._run_test(
+            [
+                ("", ["2023-01-01T11:50:01+0000"]),
+                (".1.gz", [
+                    "2023-01-01T11:40:01+0000",
+                    "2023-01-01T11:41:01+0000 INFO: completed ok",
+                ]),
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+    def test_success_in_older_log(self):
+        """Test rotated logs without a success are skipped."""
+        self._run_test(
+            [
+                ("", []),
+                (".1", [
+                    "2023-01-01T11:45:01+0000",
+                    "2023-01-01T11:46:01+0000 ERROR: An Error",
+                ]),
+                (".2.xz", [
+                    "2023-01-01T11:40:01+0000",
+                    "2023-01-01T11:41:01+0000 INFO: completed ok",
+                    "2023-01-01T11:42:01+0000",
+                    "2023-01-01T11:43:01+0000 ERROR: An Error",
+                ]),
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+    def test_newest_rotated_log_first(self):
+        """Test the most recently written rotated log is searched first."""
+        # Going by name alone, .1 would be searched first, finding an old
+        # success, but .2.gz was written to more recently.
+        self._run_test(
+            [
+                ("", []),
+                (".2.gz", ["2023-01-01T11:41:01+0000 INFO: completed ok"]),
+                (".1", ["2023-01-01T09:41:01+0000 INFO: completed ok"]),
+            ],
+            check_db_dump_recent.RETURN_CODE_OK,
+        )
+
+    def test_live_log_first(self):
+        """Test rotated logs are not searched if the live log has a success."""
+        self._run_test(
+            [
+                ("", ["2023-01-01T09:41:01+0000 INFO: completed ok"]),
+                (".1.gz", ["2023-01-01T11:41:01+0000 INFO: completed ok"]),
+            ],
+            check_db_dump_recent.RETURN_CODE_CRITICAL,
+        )
+
+    def test_unrelated_files_ignored(self):
+        """Test files that are not rotated copies of the log are ignored."""
+        self._run_test(
+            [
+                ("", []),
+                (".state", ["2023-01-01T11:41:01+0000 INFO: completed ok"]),
+                (".1.old", ["2023-01-01T11:41:01+0000 INFO: completed ok"]),
+            ],
+            check_db_dump_recent.RETURN_CODE_CRITICAL,
+        )
+
+    def test_never_successful(self):
+        """Test the check script given no success in any log."""
+        self._run_test(
+            [
+                ("", ["2023-01-01T11:50:01+0000"]),
+                (".1", ["2023-01-01T11:41:01+0000 ERROR: An Error"]),
+                ("-20230101.gz", ["2023-01-01T10:41:01+0000 ERROR: An Error"]),
+            ],
+            check_db_dump_recent.RETURN_CODE_CRITICAL,
+        )
+
+    def test_unreadable_rotated_log(self):
+        """Test an unreadable rotated log is warned about and skipped."""
+        with open(self.log_file_path, "w") as log_file:
+            log_file.write("2023-01-01T11:50:01+0000\n")
+        with open(self.log_file_path + ".1.gz", "wb") as log_file:
+            log_file.write(b"not gzip")
+        with open(self.log_file_path + ".2", "w") as log_file:
+            log_file.write("2023-01-01T11:41:01+0000 INFO: completed ok\n")
+        os.utime(self.log_file_path + ".2", (1672574400 - 3600, 1672574400 - 3600))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            return_code = self.test_checker.run(self.log_file_path)
+
+        self.assertEqual(return_code, check_db_dump_recent.RETURN_CODE_OK)
+        lines = output.getvalue().splitlines()
+        self.assertTrue(lines[0].startswith("The failover process last succeeded"))
+        self.assertTrue(lines[1].startswith("Warning: could not read %s.1.gz" % (
+            self.log_file_path,
+        )))
+
+    def test_rotated_log_removed(self):
+        """Test a rotated log removed after it was listed is left out."""
+        open(self.log_file_path + ".1", "w").close()
+        os.symlink(
+            os.path.join(self.temp_dir, "removed"),
+            self.log_file_path + ".2",
+        )
+
+        self.assertEqual(
+            check_db_dump_recent.rotated_log_paths(self.log_file_path),
+            [self.log_file_path + ".1"],
+        )
+
+
+class TestPerfdata(unittest.TestCase):
+    """This class tests the performance data output by the check script."""
+
+    LOG_LINES = [
+        "2023-01-01T08:40:01+0000",
+        "2023-01-01T08:41:01+0000 INFO: completed ok",
+        "2023-01-01T09:40:01+0000",
+        "2023-01-01T09:41:01+0000 ERROR: An Error",
+        "2023-01-01T10:40:01+0000",
+        "An Error",
+        "2023-01-01T11:40:01+0000",
+        "2023-01-01T11:40:30+0000 ERROR: Lost connection. Resuming.",
+        "2023-01-01T11:52:01+0000 INFO: completed ok",
+        "2023-01-01T11:55:01+0000",
+    ]
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file_path = os.path.join(self.temp_dir, "updateLog.txt")
+        self.state_file_path = os.path.join(self.temp_dir, "state.json")
+
+        check_db_dump_recent.datetime = MonkeyDateTime
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _run(self, log_line_list, **kwargs):
+        """Append the lines to the log, run the checker and return its code and output."""
+        with open(self.log_file_path, "a") as log_file:
+            for line in log_line_list:
+                log_file.write(line + "\n")
+
+        checker = check_db_dump_recent.CheckDBDumpRecent(
+            grace_period=timedelta(minutes=30),
+            **kwargs
+        )
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            return_code = checker.run(self.log_file_path)
+
+        return return_code, output.getvalue().strip()
+
+    def test_perfdata(self):
+        """Test the runs in the window are counted, the unfinished one left out."""
+        return_code, output = self._run(
+            self.LOG_LINES,
+            window=timedelta(hours=3),
+        )
+
+        self.assertEqual(return_code, check_db_dump_recent.RETURN_CODE_OK)
+        self.assertEqual(
+            output.split(" | ")[1],
+            "since_success=479s;;1800;0 last_run_duration=720s;;;0 "
+            "successes=1;;;0 failures=2;;;0",
+        )
+
+    def test_duration_warning(self):
+        """Test a warning is returned when the last run took too long."""
+        return_code, output = self._run(self.LOG_LINES, duration_warning=600)
+
+        self.assertEqual(return_code, check_db_dump_recent.RETURN_CODE_WARNING)
+        self.assertIn("last_run_duration=720s;600;;0", output)
+
+    def test_state_run_split(self):
+        """Test a run read partly by one check, and partly by the next, is counted once."""
+        self._run(self.LOG_LINES[:8], state_file_path=self.state_file_path)
+        self._run(self.LOG_LINES[8:], state_file_path=self.state_file_path)
+        return_code, output = self._run([], state_file_path=self.state_file_path)
+
+        self.assertEqual(return_code, check_db_dump_recent.RETURN_CODE_OK)
+        self.assertIn("last_run_duration=720s;;;0 successes=2;;;0 failures=2;;;0", output)
+
+    def test_dump_size(self):
+        """Test the size of the newest archived dump is reported."""
+        for name, size in (("_goc5dump_old.dmp", 10), ("_goc5dump_new.dmp.gz", 20),
+                           ("_goc5dump_new.dmp.gz.index.json", 30)):
+            with open(os.path.join(self.temp_dir, name), "wb") as dump:
+                dump.write(b"x" * size)
+        os.utime(os.path.join(self.temp_dir, "_goc5dump_old.dmp"), (0, 0))
+
+        return_code, output = self._run(self.LOG_LINES, archive_dir=self.temp_dir)
+
+        self.assertEqual(return_code, check_db_dump_recent.RETURN_CODE_OK)
+        self.assertTrue(output.endswith(" dump_size=20B;;;0"))
+
+
+class CountingFile():
+    """A log file opened in binary mode, counting the blocks read from it."""
+
+    def __init__(self, path):
+        self.log_file = open(path, "rb")
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return self.log_file.read(size)
+
+    def __getattr__(self, name):
+        return getattr(self.log_file, name)
+
+
+class TestBlocksRead(unittest.TestCase):
+    """This class tests how much of the logs the check script reads."""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file_path = os.path.join(self.temp_dir, "updateLog.txt")
+
+        # Twenty blocks of a log with no run start lines, then a success.
+        line = "2023-01-01T11:40:01+0000 DEBUG: %s\n" % ("x" * 90)
+        lines = 20 * check_db_dump_recent.BLOCK_SIZE // len(line)
+        with open(self.log_file_path, "w") as log_file:
+            log_file.write(line * lines)
+            log_file.write("2023-01-01T11:52:01+0000 INFO: completed ok\n")
+
+        # A rotated log that must not be needed.
+        with open(self.log_file_path + ".1", "w") as log_file:
+            log_file.write(line * lines)
+
+        check_db_dump_recent.datetime = MonkeyDateTime
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def _blocks_read(self, **kwargs):
+        """Return the last success found, and the blocks read from the log file."""
+        checker = check_db_dump_recent.CheckDBDumpRecent(
+            grace_period=timedelta(minutes=30),
+            **kwargs
+        )
+        log_file = CountingFile(self.log_file_path)
+        try:
+            last_success = checker._find_last_success(log_file, self.log_file_path)
+        finally:
+            log_file.close()
+
+        return last_success, log_file.reads
+
+    def test_success_in_last_block(self):
+        """Test only the last block is read to find a success in it."""
+        last_success, reads = self._blocks_read(history_blocks=0)
+
+        self.assertEqual(last_success, datetime(2023, 1, 1, 11, 52, 1))
+        self.assertEqual(reads, 1)
+
+    def test_history_bounded(self):
+        """Test no more than history_blocks more blocks are read for the runs."""
+        last_success, reads = self._blocks_read(history_blocks=4)
+
+        self.assertEqual(last_success, datetime(2023, 1, 1, 11, 52, 1))
+        self.assertEqual(reads, 1 + 4)
+
+
+class TestReverseLines(unittest.TestCase):
+    """This class tests the check.check_db_dump_recent.reverse_lines function."""
+
+    def _reverse_lines(self, content, block_size):
+        """A helper function to list the lines of content, last line first."""
+        return list(
+            check_db_dump_recent.reverse_lines(
+                io.BytesIO(content),
+                block_size=block_size,
+            )
+        )
+
+    def test_lines_spanning_blocks(self):
+        """Test lines are reassembled when they cross a block boundary."""
+        content = b"first line\nsecond line\nthird line\n"
+
+        # Try every block size, so every line is split at every position.
+        for block_size in range(1, len(content) + 2):
+            self.assertEqual(
+                self._reverse_lines(content, block_size),
+                ["", "third line", "second line", "first line"],
+                "Failed with a block size of %s." % block_size,
+            )
+
+    def test_no_trailing_newline(self):
+        """Test the last line is returned when it is not terminated."""
+        self.assertEqual(
+            self._reverse_lines(b"first line\r\nsecond line", 4),
+            ["second line", "first line"],
+        )
+
+    def test_empty_file(self):
+        """Test an empty file yields a single, empty, line."""
+        self.assertEqual(self._reverse_lines(b"", 4), [""])
+
+    def test_max_blocks(self):
+        """Test the earliest, incomplete, line is not returned once max_blocks are read."""
+        self.assertEqual(
+            list(check_db_dump_recent.reverse_lines(
+                io.BytesIO(b"first line\nsecond line\n"),
+                block_size=8,
+                max_blocks=2,
+            )),
+            ["", "second line"],
+        )
+
+
 class MonkeyDateTime(datetime):
     """
     A class to monkey patch the datetime class.
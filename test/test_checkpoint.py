@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that records the progress of a load.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from mariadbdmp.checkpoint import Checkpoint
+
+IDENTITY = {'source': {'path': '/tmp/dbdump.sql', 'size': 100, 'mtime': 1}}
+
+
+class TestCheckpoint(unittest.TestCase):
+    """This class tests the mariadbdmp.checkpoint.Checkpoint class."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'checkpoint.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_resume(self):
+        """Test a later attempt at the same dump skips the units already loaded."""
+        loaded = []
+
+        def failing():
+            raise Exception('Error: lost connection')
+
+        checkpoint = Checkpoint(self.path, IDENTITY)
+        self.assertFalse(checkpoint.resuming)
+        checkpoint.run('TIERS', lambda: loaded.append('TIERS'))
+        with self.assertRaises(Exception):
+            checkpoint.run('SITES', failing)
+
+        checkpoint = Checkpoint(self.path, IDENTITY)
+        self.assertTrue(checkpoint.resuming)
+        checkpoint.run('TIERS', lambda: loaded.append('TIERS'))
+        checkpoint.run('SITES', lambda: loaded.append('SITES'))
+
+        self.assertEqual(loaded, ['TIERS', 'SITES'])
+
+        checkpoint.clear()
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_different_dump(self):
+        """Test loading a different dump starts again."""
+        Checkpoint(self.path, IDENTITY).done('TIERS')
+
+        checkpoint = Checkpoint(self.path, {'source': {'path': '/tmp/dbdump.sql',
+                                                      'size': 200, 'mtime': 2}})
+
+        self.assertFalse(checkpoint.resuming)
+        self.assertFalse(checkpoint.isDone('TIERS'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that runs SQL statements using the mysql client.
+"""
+
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from mariadbdmp import client
+
+# A stand in for the mysql client, which answers statements of the form
+# SELECT 'value' with value, and stops with an error on any statement
+# containing FAIL, as mysql does in batch mode.
+FAKE_MYSQL = '''#!{python}
+import sys
+for line in sys.stdin:
+    statement = line.rstrip(";\\n")
+    if "FAIL" in statement:
+        sys.stderr.write("ERROR 1064 (42000): " + statement + "\\n")
+        sys.exit(1)
+    if statement.startswith("SELECT '"):
+        print(statement[8:-1])
+    elif statement.startswith("ROWS "):
+        for number in range(int(statement[5:])):
+            print("row\\t%s" % number)
+    sys.stdout.flush()
+'''
+
+
+class TestSession(unittest.TestCase):
+    """This class tests the mariadbdmp.client.Session class."""
+
+    def setUp(self):
+        handle, self.fake_mysql = tempfile.mkstemp()
+        with os.fdopen(handle, 'w') as fake:
+            fake.write(FAKE_MYSQL.format(python=sys.executable))
+        os.chmod(self.fake_mysql, stat.S_IRWXU)
+
+        self.real_mysql = client.MYSQL
+        client.MYSQL = self.fake_mysql
+
+        self.session = client.Session('/dev/null')
+
+    def tearDown(self):
+        self.session.close()
+        client.MYSQL = self.real_mysql
+        os.remove(self.fake_mysql)
+
+    def test_query(self):
+        """Test the output of each statement is returned separately."""
+        self.assertEqual(self.session.query('ROWS 2'),
+                         [['row', '0'], ['row', '1']])
+        self.assertEqual(self.session.query('ROWS 0'), [])
+        self.assertEqual(self.session.query("SELECT 'x'"), [['x']])
+
+    def test_stream(self):
+        """Test the raw output lines of a statement are yielded."""
+        self.assertEqual(len(list(self.session.stream('ROWS 1000'))), 1000)
+
+    def test_error(self):
+        """Test a failed statement raises an exception with mysql's error."""
+        with self.assertRaisesRegex(Exception, 'ERROR 1064'):
+            self.session.execute('FAIL')
+
+
+class TestClientOptions(unittest.TestCase):
+    """This class tests the mariadbdmp.client.clientOptions function."""
+
+    def test_connection_options_only(self):
+        """Test only the options needed to connect are written."""
+        handle, config_path = tempfile.mkstemp()
+        with os.fdopen(handle, 'w') as config:
+            config.write('[client-mariadb]\n'
+                         'host=somehost\n'
+                         'password=a%password\n'
+                         'result-file=/tmp/dump.sql\n'
+                         'single-transaction\n'
+                         'ssl\n'
+                         'ssl-verify-server-cert\n')
+
+        try:
+            with client.clientOptions(config_path) as options_path:
+                self.assertEqual(os.stat(options_path).st_mode & 0o077, 0)
+                with open(options_path) as options:
+                    self.assertEqual(options.read(),
+                                     '[client]\n'
+                                     'host=somehost\n'
+                                     'password=a%password\n'
+                                     'ssl\n'
+                                     'ssl-verify-server-cert\n')
+
+            self.assertFalse(os.path.exists(options_path))
+        finally:
+            os.remove(config_path)
+
+
+class TestCommandError(unittest.TestCase):
+    """This class tests the mariadbdmp.client.CommandError class."""
+
+    def test_transient(self):
+        """Test lost connections and deadlocks are transient, and syntax errors are not."""
+        self.assertTrue(client.CommandError(
+            'ERROR 2013 (HY000) at line 12: Lost connection to server').isTransient())
+        self.assertTrue(client.CommandError(
+            'ERROR 1213 (40001): Deadlock found').isTransient())
+        self.assertTrue(client.CommandError('Connection closed', transient=True).isTransient())
+        self.assertFalse(client.CommandError(
+            'ERROR 1064 (42000): You have an error in your SQL syntax').isTransient())
+        self.assertEqual(client.CommandError('no such file').errorNumber(), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that runs a script's cycle as a service.
+"""
+
+import os
+import shutil
+import tempfile
+from time import monotonic
+import unittest
+
+from mariadbdmp import daemon
+
+
+class TestService(unittest.TestCase):
+    """This class tests the mariadbdmp.daemon.Service class."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.pauseFile = os.path.join(self.directory, 'noImport')
+        self.lockPath = os.path.join(self.directory, 'import.lock')
+        self.version = 1
+        self.cycles = []
+        self.ok = True
+        self.service = daemon.Service(lambda: self.version, self.runCycle, self.pauseFile,
+                                      self.lockPath, pollSeconds=0, settleSeconds=0,
+                                      retrySeconds=600)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def runCycle(self):
+        """Record the input imported, which changes twice while it is."""
+        self.cycles.append(self.version)
+        if self.version == 1:
+            self.version = 3
+        return self.ok
+
+    def test_coalesced(self):
+        """Test the changes made during a cycle are imported by one more cycle."""
+        self.assertTrue(self.service.step())
+        self.assertTrue(self.service.step())
+        self.assertFalse(self.service.step())
+
+        self.assertEqual(self.cycles, [1, 3])
+
+    def test_serve(self):
+        """Test serving runs cycles as the input changes."""
+        self.service.serve(cycles=2)
+
+        self.assertEqual(self.cycles, [1, 3])
+
+    def test_paused(self):
+        """Test no cycle runs while the pause file exists."""
+        open(self.pauseFile, 'w', encoding='utf-8').close()
+
+        with self.assertLogs(level='INFO') as logs:
+            self.assertFalse(self.service.step())
+            self.assertFalse(self.service.step())
+            os.remove(self.pauseFile)
+            self.assertTrue(self.service.step())
+
+        self.assertEqual([line.split(' ', 1)[1] for line in logs.output],
+                         ['exists. Paused.', 'removed. Resumed.'])
+
+    def test_locked(self):
+        """Test no cycle runs while another run holds the lock."""
+        with daemon.locked(self.lockPath) as acquired:
+            self.assertTrue(acquired)
+            self.assertFalse(self.service.step())
+
+        self.assertTrue(self.service.step())
+        self.assertEqual(self.cycles, [1])
+
+    def test_retry(self):
+        """Test a failed cycle is retried after retrySeconds, or when the input changes."""
+        self.version = 2
+        self.ok = False
+
+        self.assertTrue(self.service.step())
+        self.assertFalse(self.service.step())
+
+        self.service.retrySeconds = 0
+        self.assertTrue(self.service.step())
+
+        self.service.retrySeconds = 600
+        self.version = 4
+        self.assertTrue(self.service.step())
+        self.assertEqual(self.cycles, [2, 2, 4])
+
+    def test_settle(self):
+        """Test an input still changing is not imported, nor an unreadable one."""
+        versions = iter(range(10))
+        self.service.fingerprint = lambda: next(versions)
+        self.service.settleSeconds = 0.01
+
+        self.assertFalse(self.service.step())
+
+        def unreadable():
+            raise OSError('no such file')
+
+        self.service.fingerprint = unreadable
+        with self.assertLogs(level='WARNING') as logs:
+            self.assertFalse(self.service.step())
+            self.assertFalse(self.service.step())
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(self.cycles, [])
+
+    def test_watch(self):
+        """Test a wait ends when a file is written into the watched directory."""
+        watch = daemon.DirectoryWatch(self.directory)
+        self.addCleanup(watch.close)
+
+        with open(os.path.join(self.directory, 'dump.sql'), 'w', encoding='utf-8') as dump:
+            dump.write('-- dump')
+
+        start = monotonic()
+        watch.wait(10)
+        self.assertLess(monotonic() - start, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that computes the digest of a dump.
+"""
+
+import gzip
+import os
+import tempfile
+import unittest
+
+from mariadbdmp import digest
+from mariadbdmp.manifest import writeManifest
+
+DUMP = b"""-- MariaDB dump 10.19
+INSERT INTO `TIERS` VALUES (1,'Tier 1');
+-- Dump completed on %s
+"""
+
+
+class TestDumpDigest(unittest.TestCase):
+    """This class tests the mariadbdmp.digest.dumpDigest function."""
+
+    def setUp(self):
+        """Create a directory for the dumps."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        """Remove the dumps."""
+        self.directory.cleanup()
+
+    def writeDump(self, name, data):
+        """Write a dump file, returning its path."""
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as dumpFile:
+            dumpFile.write(data)
+        return path
+
+    def test_timestamp_ignored(self):
+        """Test dumps differing only in when they were made have the same digest."""
+        self.assertEqual(
+            digest.dumpDigest(self.writeDump('a.sql', DUMP % b'2024-01-01  1:00:00')),
+            digest.dumpDigest(self.writeDump('b.sql', DUMP % b'2024-01-02  1:00:00')))
+
+    def test_content_changed(self):
+        """Test dumps of different data have different digests."""
+        self.assertNotEqual(
+            digest.dumpDigest(self.writeDump('a.sql', DUMP % b'')),
+            digest.dumpDigest(self.writeDump('b.sql', DUMP.replace(b'Tier 1', b'Tier 2'))))
+
+    def test_compressed(self):
+        """Test the digest is of the SQL, not the compressed file."""
+        self.assertEqual(
+            digest.dumpDigest(self.writeDump('a.sql', DUMP % b'')),
+            digest.dumpDigest(self.writeDump('a.sql.gz', gzip.compress(DUMP % b''))))
+
+    def test_blocks(self):
+        """Test the digest of the blocks streamed is that of the file they are written to."""
+        data = DUMP % b'2024-01-01'
+        self.assertEqual(
+            digest.blocksDigest([data[:10], data[10:50], data[50:]]),
+            digest.dumpDigest(self.writeDump('a.sql', data)))
+
+    def test_chunked(self):
+        """Test the digest of a chunked dump ignores when it was made."""
+        self.writeDump('schema.sql', DUMP % b'2024-01-01')
+        self.writeDump('TIERS.0.sql', DUMP % b'')
+        manifest = {'schema': 'schema.sql', 'created': '2024-01-01',
+                    'chunks': [{'file': 'TIERS.0.sql'}]}
+
+        writeManifest(self.directory.name, manifest)
+        first = digest.dumpDigest(self.directory.name)
+
+        manifest['created'] = '2024-01-02'
+        writeManifest(self.directory.name, manifest)
+        self.assertEqual(digest.dumpDigest(self.directory.name), first)
+
+
+if __name__ == "__main__":
+    unittest.main()
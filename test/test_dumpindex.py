@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that indexes the tables of a dump.
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from mariadbdmp import dumpindex
+
+HEADER = (b'-- MySQL dump 10.19\n'
+          b'/*!40101 SET NAMES utf8mb4 */;\n'
+          b'--\n')
+
+TIERS = (b'-- Table structure for table `TIERS`\n'
+         b'CREATE TABLE `TIERS` (\n'
+         b'  `ID` int NOT NULL\n'
+         b');\n'
+         b'--\n')
+
+TIERS_DATA = (b'-- Dumping data for table `TIERS`\n'
+              b"INSERT INTO `TIERS` VALUES (1,'a'),(2,'),(\\''),(3,NULL);\n"
+              b"INSERT INTO `TIERS` VALUES (4,'d');\n")
+
+VIEW = (b'-- Final view structure for view `TIER_VIEW`\n'
+        b'CREATE VIEW `TIER_VIEW` AS SELECT 1;\n')
+
+DUMP = HEADER + TIERS + TIERS_DATA + VIEW
+
+
+class TestDumpIndex(unittest.TestCase):
+    """This class tests the mariadbdmp.dumpindex module."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'dump.sql')
+        with open(self.path, 'wb') as dump:
+            dump.write(DUMP)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_build(self):
+        """Test the ranges, rows and size of each table."""
+        index = dumpindex.buildIndex(self.path)
+
+        tiers = len(HEADER) + len(TIERS)
+        view = tiers + len(TIERS_DATA)
+
+        self.assertEqual(index['bytes'], len(DUMP))
+        self.assertEqual(index['header'], [0, len(HEADER)])
+        self.assertEqual(index['sections'][0].pop('digest'),
+                         hashlib.sha256(TIERS_DATA.split(b'\n', 1)[1]).hexdigest())
+        self.assertEqual(index['sections'][0], {
+            'name': 'Table structure for table `TIERS`', 'table': 'TIERS',
+            'range': [len(HEADER), view], 'ddl': [len(HEADER), tiers],
+            'data': [tiers, view], 'rows': 4, 'bytes': len(TIERS_DATA.split(b'\n', 1)[1])})
+        self.assertEqual(index['sections'][1], {
+            'name': 'Final view structure for view `TIER_VIEW`', 'range': [view, len(DUMP)]})
+
+    def test_compressed(self):
+        """Test a compressed dump has the same index, and tables read from it."""
+        with open(self.path + '.gz', 'wb') as output:
+            output.write(gzip.compress(DUMP))
+
+        index = dumpindex.buildIndex(self.path + '.gz')
+
+        self.assertEqual(index['sections'], dumpindex.buildIndex(self.path)['sections'])
+        self.assertEqual(b''.join(dumpindex.tableBlocks(self.path + '.gz', index, 'TIERS')),
+                         HEADER + TIERS + TIERS_DATA)
+
+    def test_digests(self):
+        """Test only the digest of a table whose data changed changes."""
+        index = dumpindex.buildIndex(self.path)
+
+        with open(self.path, 'wb') as dump:
+            dump.write(DUMP.replace(b'(4,', b'(5,').replace(
+                b'  `ID` int NOT NULL\n);', b'  `ID` int NOT NULL\n) AUTO_INCREMENT=6;'))
+        changed = dumpindex.buildIndex(self.path)
+
+        self.assertEqual(changed['schemaDigest'], index['schemaDigest'])
+        self.assertNotEqual(dumpindex.tableDigests(changed), dumpindex.tableDigests(index))
+
+        with open(self.path, 'wb') as dump:
+            dump.write(DUMP.replace(b'SELECT 1', b'SELECT 2'))
+
+        self.assertNotEqual(dumpindex.buildIndex(self.path)['schemaDigest'],
+                            index['schemaDigest'])
+
+    def test_ranges(self):
+        """Test several ranges are read in one pass over a compressed dump."""
+        with open(self.path + '.gz', 'wb') as output:
+            output.write(gzip.compress(DUMP))
+
+        ranges = [(len(HEADER), len(HEADER) + 10), (0, 5), (20, 20)]
+
+        for path in (self.path, self.path + '.gz'):
+            self.assertEqual(b''.join(dumpindex.rangesBlocks(path, ranges)),
+                             DUMP[0:5] + DUMP[len(HEADER):len(HEADER) + 10])
+
+    def test_table_blocks(self):
+        """Test a table is read from its place in the dump."""
+        index = dumpindex.indexDump(self.path)
+
+        self.assertEqual(b''.join(dumpindex.tableBlocks(self.path, index, 'TIERS')),
+                         HEADER + TIERS + TIERS_DATA)
+        with self.assertRaisesRegex(Exception, 'not in the dump'):
+            list(dumpindex.tableBlocks(self.path, index, 'SITES'))
+
+    def test_sidecar(self):
+        """Test the sidecar index is used only while the dump is unchanged."""
+        index = dumpindex.indexDump(self.path)
+
+        self.assertEqual(dumpindex.readIndex(self.path), index)
+
+        with open(self.path, 'ab') as dump:
+            dump.write(b'-- Dump completed on 2024-01-01\n')
+
+        self.assertIsNone(dumpindex.readIndex(self.path))
+        self.assertEqual(dumpindex.indexDump(self.path)['bytes'], len(DUMP) + 32)
+
+
+if __name__ == "__main__":
+    unittest.main()
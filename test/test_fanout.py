@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that passes one stream of blocks to several consumers.
+"""
+
+import unittest
+
+from mariadbdmp import fanout
+
+BLOCKS = [b'%d\n' % number for number in range(100)]
+
+
+class TestFanOut(unittest.TestCase):
+    """This class tests the mariadbdmp.fanout.fanOut function."""
+
+    def test_every_block(self):
+        """Test every consumer gets every block, in order."""
+        results = fanout.fanOut(iter(BLOCKS), [b''.join, b''.join, len])
+
+        self.assertEqual(results[:2], [b''.join(BLOCKS)] * 2)
+        self.assertIsInstance(results[2], TypeError)
+
+    def test_failed_consumer(self):
+        """Test the others carry on after a consumer stops reading and fails."""
+        def fail(blocks):
+            next(iter(blocks))
+            raise Exception('ERROR 2013')
+
+        results = fanout.fanOut(iter(BLOCKS), [fail, b''.join])
+
+        self.assertEqual(str(results[0]), 'ERROR 2013')
+        self.assertEqual(results[1], b''.join(BLOCKS))
+
+    def test_failed_stream(self):
+        """Test each consumer gets the error reading the blocks raised."""
+        def blocks():
+            yield BLOCKS[0]
+            raise Exception('Connection closed')
+
+        read = []
+
+        def consume(blocks):
+            for block in blocks:
+                read.append(block)
+
+        results = fanout.fanOut(blocks(), [consume, consume])
+
+        self.assertEqual([str(result) for result in results], ['Connection closed'] * 2)
+        self.assertEqual(read, [BLOCKS[0]] * 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
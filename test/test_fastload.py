@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module used to load a dump in fast load mode.
+"""
+
+import unittest
+
+from mariadbdmp import fastload
+
+
+class TestOrphanQuery(unittest.TestCase):
+    """This class tests the mariadbdmp.fastload.orphanQuery function."""
+
+    def test_composite_key(self):
+        """Test every column of a foreign key is joined on."""
+        self.assertEqual(
+            fastload.orphanQuery('SERVICES_SCOPES', ['SERVICE_ID', 'SCOPE_ID'],
+                                 'LINKS', ['A', 'B']),
+            'SELECT COUNT(*) FROM `SERVICES_SCOPES` c LEFT JOIN `LINKS` p'
+            ' ON c.`SERVICE_ID` = p.`A` AND c.`SCOPE_ID` = p.`B`'
+            ' WHERE c.`SERVICE_ID` IS NOT NULL AND c.`SCOPE_ID` IS NOT NULL'
+            ' AND p.`A` IS NULL',
+        )
+
+
+class FakeSession:
+    """A stand in for mariadbdmp.client.Session, to a server shared by every session."""
+
+    # The global variables of the server.
+    server = {}
+
+    def __init__(self, optionsPath):
+        pass
+
+    def query(self, sql):
+        return [[self.server['innodb_flush_log_at_trx_commit']]]
+
+    def execute(self, sql):
+        self.server['innodb_flush_log_at_trx_commit'] = sql.rsplit(' ', 1)[1]
+
+    def close(self):
+        pass
+
+
+class TestRelaxedDurability(unittest.TestCase):
+    """This class tests the mariadbdmp.fastload.relaxedDurability function."""
+
+    def setUp(self):
+        FakeSession.server = {'innodb_flush_log_at_trx_commit': '1'}
+        self.real = fastload.Session
+        fastload.Session = FakeSession
+
+    def tearDown(self):
+        fastload.Session = self.real
+
+    def test_shared_server(self):
+        """Test two loads into the same server restore the setting they found."""
+        with fastload.relaxedDurability(['a', 'b']):
+            self.assertEqual(FakeSession.server['innodb_flush_log_at_trx_commit'], '2')
+
+        self.assertEqual(FakeSession.server['innodb_flush_log_at_trx_commit'], '1')
+
+    def test_already_relaxed(self):
+        """Test a setting already relaxed, as a killed load leaves it, is warned of."""
+        FakeSession.server['innodb_flush_log_at_trx_commit'] = '2'
+
+        with self.assertLogs(level='WARNING') as logs:
+            with fastload.relaxedDurability(['a']):
+                pass
+
+        self.assertIn('already 2', logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
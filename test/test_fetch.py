@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+"""
+This file tests the script that dumps a MariaDB database and saves it locally.
+"""
+
+import gzip
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from fetchMariaDBdmpFile import failover_fetch
+from mariadbdmp.compression import compressCommand
+from mariadbdmp.dumpindex import INDEX_SUFFIX
+
+# A stand in for mysqldump, which writes a dump of the database named last
+# in its arguments, or fails, as mysqldump does, for the database FAIL.
+FAKE_MYSQLDUMP = '''#!{python}
+import sys
+if sys.argv[-1] == "FAIL":
+    sys.stderr.write("mysqldump: Got error: 1049: Unknown database 'FAIL'\\n")
+    sys.exit(2)
+sys.stdout.write("-- MariaDB dump\\nINSERT INTO `SITES` VALUES (1,'RAL');\\n")
+'''
+
+
+class TestCompressedDump(unittest.TestCase):
+    """This class tests the failover_fetch.runCompressedDump function."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.output = os.path.join(self.dir, 'dump.part.sql.gz')
+
+        fakeMysqldump = os.path.join(self.dir, 'mysqldump')
+        with open(fakeMysqldump, 'w', encoding='utf-8') as fake:
+            fake.write(FAKE_MYSQLDUMP.format(python=sys.executable))
+        os.chmod(fakeMysqldump, stat.S_IRWXU)
+
+        self.realMysqldump = failover_fetch.MYSQLDUMP
+        failover_fetch.MYSQLDUMP = fakeMysqldump
+
+    def tearDown(self):
+        failover_fetch.MYSQLDUMP = self.realMysqldump
+        shutil.rmtree(self.dir)
+
+    def test_compressed(self):
+        """Test the dump is written compressed, readable only by its owner."""
+        failover_fetch.runCompressedDump('/dev/null', 'gocdb', compressCommand('gzip', '', 1),
+                                         self.output)
+
+        with gzip.open(self.output) as dump:
+            self.assertEqual(dump.read(),
+                             b"-- MariaDB dump\nINSERT INTO `SITES` VALUES (1,'RAL');\n")
+        self.assertEqual(stat.S_IMODE(os.stat(self.output).st_mode), 0o600)
+
+    def test_dump_failed(self):
+        """Test a failed dump raises its error, and leaves no output."""
+        with self.assertRaisesRegex(Exception, 'Unknown database'):
+            failover_fetch.runCompressedDump('/dev/null', 'FAIL', compressCommand('gzip', '', 1),
+                                             self.output)
+
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_compressor_failed(self):
+        """Test a failed compressor raises an error, and leaves no output."""
+        compressArgs = [sys.executable, '-c',
+                        'import sys; sys.stdin.read(); sys.stderr.write("no space"); sys.exit(1)']
+
+        with self.assertRaisesRegex(Exception, 'no space'):
+            failover_fetch.runCompressedDump('/dev/null', 'gocdb', compressArgs, self.output)
+
+        self.assertFalse(os.path.exists(self.output))
+
+
+class TestArchiveDump(unittest.TestCase):
+    """This class tests the failover_fetch.archiveDump function."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dumpFile = os.path.join(self.dir, 'dump.sql')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, name, content):
+        """Write a file in the test directory."""
+        with open(os.path.join(self.dir, name), 'w', encoding='utf-8') as output:
+            output.write(content)
+
+    def read(self, name):
+        """Return the content of a file in the test directory."""
+        with open(os.path.join(self.dir, name), encoding='utf-8') as source:
+            return source.read()
+
+    def test_archive(self):
+        """Test the dump and its index replace the last, which are kept as the previous."""
+        self.write('dump.sql', 'last')
+        self.write('dump.sql' + INDEX_SUFFIX, 'last index')
+        self.write('dump.sql_old', 'previous')
+        self.write('result.sql', 'new')
+        self.write('result.sql' + INDEX_SUFFIX, 'new index')
+
+        failover_fetch.archiveDump(os.path.join(self.dir, 'result.sql'), self.dumpFile)
+
+        self.assertEqual(self.read('dump.sql'), 'new')
+        self.assertEqual(self.read('dump.sql' + INDEX_SUFFIX), 'new index')
+        self.assertEqual(self.read('dump.sql_old'), 'last')
+        self.assertEqual(self.read('dump.sql_old' + INDEX_SUFFIX), 'last index')
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'result.sql')))
+
+    def test_stale_index(self):
+        """Test an index of the previous dump is removed with it, when the last had none."""
+        self.write('dump.sql', 'last')
+        self.write('dump.sql_old', 'previous')
+        self.write('dump.sql_old' + INDEX_SUFFIX, 'previous index')
+        self.write('result.sql', 'new')
+
+        failover_fetch.archiveDump(os.path.join(self.dir, 'result.sql'), self.dumpFile)
+
+        self.assertEqual(self.read('dump.sql_old'), 'last')
+        self.assertFalse(os.path.exists(self.dumpFile + '_old' + INDEX_SUFFIX))
+
+    def test_chunked(self):
+        """Test a chunked dump directory replaces a previous single file dump."""
+        self.write('dump.sql_old', 'previous')
+        self.write('dump.sql', 'last')
+        os.makedirs(os.path.join(self.dir, 'dump.sql.part'))
+        self.write('dump.sql.part/manifest.json', '{}')
+
+        failover_fetch.archiveDump(self.dumpFile + '.part', self.dumpFile)
+
+        self.assertEqual(self.read('dump.sql/manifest.json'), '{}')
+        self.assertEqual(self.read('dump.sql_old'), 'last')
+
+    def test_chunked_previous(self):
+        """Test a previous chunked dump directory is replaced by the last dump."""
+        os.makedirs(os.path.join(self.dir, 'dump.sql_old'))
+        self.write('dump.sql_old/manifest.json', 'previous')
+        os.makedirs(os.path.join(self.dir, 'dump.sql'))
+        self.write('dump.sql/manifest.json', 'last')
+        os.makedirs(os.path.join(self.dir, 'dump.sql.part'))
+        self.write('dump.sql.part/manifest.json', 'new')
+
+        failover_fetch.archiveDump(self.dumpFile + '.part', self.dumpFile)
+
+        self.assertEqual(self.read('dump.sql/manifest.json'), 'new')
+        self.assertEqual(self.read('dump.sql_old/manifest.json'), 'last')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,444 @@
+#!/usr/bin/python3
+
+"""
+This file tests the script that fetches and loads a MariaDB dump.
+"""
+
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from importMariaDBdmpFile import failover_import
+from mariadbdmp.checkpoint import Checkpoint
+from mariadbdmp.client import CommandError
+from mariadbdmp.dumpindex import buildIndex, tableDigests
+from mariadbdmp.metrics import Metrics
+from mariadbdmp.remote import Remote
+from test.test_shadow import FakeSession
+
+# A single file dump, abridged, as written by mysqldump.
+DUMP = b"""-- MariaDB dump 10.19  Distrib 10.5.22-MariaDB, for Linux (x86_64)
+/*!40101 SET NAMES utf8mb4 */;
+/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
+
+--
+-- Table structure for table `SITES`
+--
+
+DROP TABLE IF EXISTS `SITES`;
+CREATE TABLE `SITES` (
+  `ID` int(11) NOT NULL AUTO_INCREMENT,
+  `NAME` varchar(255) NOT NULL,
+  PRIMARY KEY (`ID`),
+  KEY `IDX_NAME` (`NAME`)
+) ENGINE=InnoDB AUTO_INCREMENT=4 DEFAULT CHARSET=utf8mb4;
+
+--
+-- Dumping data for table `SITES`
+--
+
+INSERT INTO `SITES` VALUES (1,'RAL'),(2,'CERN'),(3,'a),(b');
+
+--
+-- Table structure for table `TIERS`
+--
+
+DROP TABLE IF EXISTS `TIERS`;
+CREATE TABLE `TIERS` (
+  `ID` int(11) NOT NULL AUTO_INCREMENT,
+  PRIMARY KEY (`ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+-- Dump completed on 2024-01-01  1:00:00
+"""
+
+CONFIG = '''[remote]
+host=
+user=
+path={0}/remote/dump.sql
+[local]
+noImport={0}/noImport
+workDir={0}/work
+archiveDir={0}/archive
+format=_goc5dump_%%Y
+retryCount=2
+{1}
+[client-mariadb]
+user=gocdb
+database=gocdb
+[logs]
+file={0}/updateLog.txt
+level=DEBUG
+format=%%(levelname)s: %%(message)s
+dateFormat=
+'''
+
+
+class ImportTestCase(unittest.TestCase):
+    """A dump to import, and the import's mysql calls recorded rather than run."""
+
+    # Extra [local] options of the config.
+    OPTIONS = ''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in ('remote', 'work', 'archive'):
+            os.makedirs(os.path.join(self.dir, name))
+
+        with open(os.path.join(self.dir, 'remote/dump.sql'), 'wb') as dump:
+            dump.write(DUMP)
+
+        configPath = os.path.join(self.dir, 'config.ini')
+        with open(configPath, 'w', encoding='utf-8') as config:
+            config.write(CONFIG.format(self.dir, self.OPTIONS))
+        os.chmod(configPath, stat.S_IRUSR | stat.S_IWUSR)
+
+        self.handlers = logging.root.handlers[:]
+        self.cnf = failover_import.Conf(configPath)
+
+        # Each section loaded, and the SQL before it, each statement run,
+        # each verification, and the tables with triggers.
+        self.loaded = []
+        self.preambles = []
+        self.statements = []
+        self.verified = []
+        self.triggered = []
+
+        self.saved = {name: getattr(failover_import, name)
+                      for name in ('loadStream', 'runSql', 'verifyTables', 'triggeredTables')}
+        failover_import.loadStream = self.loadStream
+        failover_import.runSql = lambda optionsPath, sql: self.statements.append(sql)
+        failover_import.verifyTables = self.verifyTables
+        failover_import.triggeredTables = lambda optionsPath, changed: [
+            table for table in changed if table in self.triggered]
+
+    def tearDown(self):
+        for name, value in self.saved.items():
+            setattr(failover_import, name, value)
+
+        for handler in logging.root.handlers[:]:
+            if handler not in self.handlers:
+                logging.root.removeHandler(handler)
+                handler.close()
+        shutil.rmtree(self.dir)
+
+    def loadStream(self, optionsPath, lines, preamble, postamble):
+        """Record the lines of a section, as mysql would load them."""
+        self.loaded.append(b''.join(lines))
+        self.preambles.append(preamble)
+
+    def verifyTables(self, optionsPath, expected, recorded, workers):
+        """Record the tables verified, as holding the rows expected."""
+        self.verified.append(expected)
+        return {table: {'digest': dumped['digest'], 'rows': dumped['rows'], 'checksum': 0}
+                for table, dumped in expected.items()}
+
+    def runImport(self):
+        """Run an import, from the local remote directory."""
+        failover_import.runImport(self.cnf, Remote('', ''), Metrics('test'))
+
+    def writeDump(self, dump):
+        """Replace the remote dump."""
+        with open(os.path.join(self.dir, 'remote/dump.sql'), 'wb') as remote:
+            remote.write(dump)
+
+    def loadedTables(self):
+        """Return the digests recorded as loaded into the target."""
+        return failover_import.readState(os.path.join(self.dir, 'archive'),
+                                         failover_import.LOADED_NAME)
+
+
+class TestStreamVerify(ImportTestCase):
+    """This class tests verifying a streamed load."""
+
+    OPTIONS = 'stream=yes\nverify=yes'
+
+    def test_stream_verify(self):
+        """Test the rows of a streamed dump are counted as it is loaded, and verified."""
+        self.runImport()
+
+        self.assertEqual(self.verified, [{
+            'SITES': {'rows': 3, 'digest': None},
+            'TIERS': {'rows': 0, 'digest': None},
+        }])
+        self.assertIn('ALTER TABLE `SITES` ADD KEY `IDX_NAME` (`NAME`);', self.statements)
+
+
+class TestDelta(ImportTestCase):
+    """This class tests reloading only the tables whose data changed."""
+
+    OPTIONS = 'delta=yes'
+
+    def test_first_load(self):
+        """Test the whole dump is loaded when nothing is recorded as loaded, and then recorded."""
+        self.runImport()
+
+        self.assertEqual(len(self.loaded), 2)
+        self.assertEqual(sorted(self.loadedTables()['tableDigests']), ['SITES', 'TIERS'])
+
+    def test_changed_table(self):
+        """Test only a table whose data changed is reloaded, in one transaction."""
+        self.runImport()
+        self.loaded = []
+        self.preambles = []
+
+        self.writeDump(DUMP.replace(b"(2,'CERN')", b"(2,'PIC')"))
+        self.runImport()
+
+        self.assertEqual(self.loaded,
+                         [b"INSERT INTO `SITES` VALUES (1,'RAL'),(2,'PIC'),(3,'a),(b');\n"])
+        self.assertIn(b'START TRANSACTION;\nDELETE FROM `SITES`;\n', self.preambles[0])
+        self.assertNotIn(b'TIERS', self.preambles[0])
+
+    def test_unchanged(self):
+        """Test the load is skipped when no table's data changed."""
+        self.runImport()
+        self.loaded = []
+
+        self.writeDump(DUMP.replace(b'2024-01-01', b'2024-01-02'))
+        self.runImport()
+
+        self.assertEqual(self.loaded, [])
+
+    def test_triggers(self):
+        """Test the whole dump is loaded when a changed table has triggers."""
+        self.runImport()
+        self.loaded = []
+        self.triggered = ['SITES']
+
+        self.writeDump(DUMP.replace(b"(2,'CERN')", b"(2,'PIC')"))
+        self.runImport()
+
+        self.assertEqual(len(self.loaded), 2)
+        self.assertFalse(any(b'DELETE FROM' in preamble for preamble in self.preambles))
+
+    def test_failed_load(self):
+        """Test nothing is recorded as loaded into a target whose load failed."""
+        self.runImport()
+
+        def fail(optionsPath, lines, preamble, postamble):
+            raise Exception('load failed')
+        failover_import.loadStream = fail
+
+        self.writeDump(DUMP.replace(b"(2,'CERN')", b"(2,'PIC')"))
+        with self.assertRaises(Exception):
+            self.runImport()
+
+        self.assertEqual(self.loadedTables(), {})
+
+    def test_shadow(self):
+        """Test delta cannot be used with a shadow database."""
+        configPath = os.path.join(self.dir, 'config.ini')
+        with open(configPath, 'w', encoding='utf-8') as config:
+            config.write(CONFIG.format(self.dir, 'delta=yes\nshadow=yes'))
+
+        with self.assertRaisesRegex(Exception, 'delta=yes cannot be used with shadow=yes'):
+            failover_import.Conf(configPath)
+
+
+class TargetSession(FakeSession):
+    """A FakeSession of a target, as adminSession returns."""
+
+    def close(self):
+        pass
+
+
+class TestShadow(ImportTestCase):
+    """This class tests loading a shadow database, swapping it in, and rolling it back."""
+
+    OPTIONS = 'shadow=yes'
+
+    def setUp(self):
+        super().setUp()
+        self.session = TargetSession({'gocdb': ['SITES'], 'gocdb_shadow': ['SITES', 'TIERS']})
+
+        self.saved['adminSession'] = failover_import.adminSession
+        failover_import.adminSession = lambda optionsPath: self.session
+
+    def test_swap(self):
+        """Test the dump is loaded into an empty shadow database, which is swapped in."""
+        self.runImport()
+
+        self.assertEqual(len(self.loaded), 2)
+        self.assertEqual(self.session.statements[:2], [
+            'DROP DATABASE IF EXISTS `gocdb_shadow`',
+            'CREATE DATABASE `gocdb_shadow` CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci',
+        ])
+        self.assertTrue(self.session.statements[-1].startswith('RENAME TABLE '))
+        self.assertTrue(os.path.exists(
+            os.path.join(self.dir, 'archive', failover_import.PREVIOUS_TRIGGERS_NAME)))
+
+    def test_missing_table(self):
+        """Test a shadow database missing a table of the dump is not swapped in."""
+        self.session.tables['gocdb_shadow'] = ['SITES']
+
+        with self.assertRaisesRegex(Exception, 'missing tables: TIERS'):
+            self.runImport()
+
+        self.assertFalse(any(statement.startswith('RENAME TABLE ')
+                             for statement in self.session.statements))
+
+    def test_rollback(self):
+        """Test the previous generation, and its triggers, are swapped back in, and forgotten."""
+        archive = os.path.join(self.dir, 'archive')
+        failover_import.writeState(archive, {'digest': 'a', 'source': {'size': 1}})
+        failover_import.writeState(archive, {'schemaDigest': 'b', 'tableDigests': {}},
+                                   failover_import.LOADED_NAME)
+        with open(os.path.join(archive, failover_import.PREVIOUS_TRIGGERS_NAME), 'w',
+                  encoding='utf-8') as sqlFile:
+            sqlFile.write('CREATE TRIGGER `T_SITES` ...;;\n')
+        self.session.tables = {'gocdb': ['SITES'], 'gocdb_previous': ['SITES']}
+
+        failover_import.rollbackDB(self.cnf)
+
+        self.assertEqual(self.session.statements[-1],
+                         'RENAME TABLE `gocdb`.`SITES` TO `gocdb_shadow`.`SITES`,'
+                         ' `gocdb_previous`.`SITES` TO `gocdb`.`SITES`,'
+                         ' `gocdb_shadow`.`SITES` TO `gocdb_previous`.`SITES`')
+        self.assertEqual(self.statements, ['CREATE TRIGGER `T_SITES` ...;;\n'])
+        self.assertEqual(failover_import.readState(archive), {'digest': None, 'source': None})
+        self.assertEqual(self.loadedTables(), {})
+
+
+class TestIndexed(ImportTestCase):
+    """This class tests loading a dump a table at a time, with its index."""
+
+    OPTIONS = 'index=yes'
+
+    def test_indexed(self):
+        """Test each table is loaded on its own, and its indexes added after its data."""
+        self.runImport()
+
+        self.assertEqual(len(self.loaded), 2)
+        self.assertIn(b"INSERT INTO `SITES` VALUES (1,'RAL')", self.loaded[0])
+        self.assertNotIn(b'KEY `IDX_NAME`', self.loaded[0])
+        self.assertIn('ALTER TABLE `SITES` ADD KEY `IDX_NAME` (`NAME`);', self.statements)
+
+    def test_resume(self):
+        """Test a table loaded already is not loaded again, but its indexes are still added."""
+        dump = os.path.join(self.dir, 'remote/dump.sql')
+        index = buildIndex(dump)
+        checkpoint = Checkpoint(os.path.join(self.dir, 'work/checkpoint.json'), {})
+        checkpoint.done(index['sections'][0]['name'])
+
+        splitter = failover_import.loadIndexedDB('', dump, index, 2, False, checkpoint)
+
+        self.assertEqual(len(self.loaded), 1)
+        self.assertIn(b'CREATE TABLE `TIERS`', self.loaded[0])
+        self.assertEqual(splitter.indexes, ['ALTER TABLE `SITES` ADD KEY `IDX_NAME` (`NAME`)'])
+
+
+class TestChangedTables(unittest.TestCase):
+    """This class tests the failover_import.changedTables function."""
+
+    def setUp(self):
+        handle, self.dump = tempfile.mkstemp()
+        with os.fdopen(handle, 'wb') as dump:
+            dump.write(DUMP)
+        self.index = buildIndex(self.dump)
+        self.state = {'schemaDigest': self.index['schemaDigest'],
+                      'tableDigests': tableDigests(self.index)}
+
+    def tearDown(self):
+        os.remove(self.dump)
+
+    def test_unchanged(self):
+        """Test no table changed when the digests match."""
+        self.assertEqual(failover_import.changedTables(self.state, self.index), [])
+
+    def test_changed(self):
+        """Test a table is changed when the digest of its data differs."""
+        self.state['tableDigests']['TIERS'] = 'other'
+
+        self.assertEqual(failover_import.changedTables(self.state, self.index), ['TIERS'])
+
+    def test_whole_dump(self):
+        """Test the whole dump is loaded when the schema, or set of tables, changed."""
+        self.assertIsNone(failover_import.changedTables({}, self.index))
+        self.assertIsNone(failover_import.changedTables(
+            dict(self.state, schemaDigest='other'), self.index))
+        self.assertIsNone(failover_import.changedTables(
+            dict(self.state, tableDigests={'SITES': 'other'}), self.index))
+
+
+# A transient mysql error.
+LOST = 'ERROR 2013 (HY000): Lost connection to server during query'
+
+
+class TestLoadDB(unittest.TestCase):
+    """This class tests the failover_import.loadDB function."""
+
+    class Checkpoint:
+        """A stand in for a Checkpoint, only resumed."""
+        resuming = False
+
+    def setUp(self):
+        self.calls = 0
+        self.sleep = failover_import.sleep
+        failover_import.sleep = lambda seconds: None
+
+    def tearDown(self):
+        failover_import.sleep = self.sleep
+
+    def failing(self, failures, error):
+        """Return a load failing its first failures calls with error, then returning 'loaded'."""
+        def load():
+            self.calls += 1
+            if self.calls <= failures:
+                raise CommandError(error)
+            return 'loaded'
+        return load
+
+    def test_transient(self):
+        """Test a load is resumed after a transient error."""
+        checkpoint = self.Checkpoint()
+
+        self.assertEqual(failover_import.loadDB(self.failing(1, LOST), 3, False, checkpoint),
+                         'loaded')
+        self.assertEqual(self.calls, 2)
+        self.assertTrue(checkpoint.resuming)
+
+    def test_not_transient(self):
+        """Test a load is not retried after any other error."""
+        with self.assertRaises(CommandError):
+            failover_import.loadDB(self.failing(1, 'ERROR 1064 (42000): syntax error'), 3,
+                                   False, self.Checkpoint())
+
+        self.assertEqual(self.calls, 1)
+
+    def test_retries_exceeded(self):
+        """Test the last transient error is raised once the retries run out."""
+        with self.assertRaises(CommandError):
+            failover_import.loadDB(self.failing(3, LOST), 3, False, self.Checkpoint())
+
+        self.assertEqual(self.calls, 3)
+
+
+class TestState(unittest.TestCase):
+    """This class tests the failover_import.readState and writeState functions."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_missing(self):
+        """Test there is an empty record before the first import."""
+        self.assertEqual(failover_import.readState(self.dir), {})
+
+    def test_replace(self):
+        """Test a record is replaced whole, and by name, without leaving a part written."""
+        failover_import.writeState(self.dir, {'digest': 'a', 'loaded': 1})
+        failover_import.writeState(self.dir, {'digest': 'b'})
+        failover_import.writeState(self.dir, {'rows': 2}, 'other.json')
+
+        self.assertEqual(failover_import.readState(self.dir), {'digest': 'b'})
+        self.assertEqual(failover_import.readState(self.dir, 'other.json'), {'rows': 2})
+        self.assertEqual(sorted(os.listdir(self.dir)), ['lastImport.json', 'other.json'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that loads dumps with the mysql client.
+"""
+
+import gzip
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from mariadbdmp import client, load
+
+# A stand in for the mysql client, which writes the statements it is given
+# with --execute, and the data on its stdin, to files next to it, and fails
+# as mysql does if the statements contain FAIL.
+FAKE_MYSQL = '''#!{python}
+import os
+import sys
+directory = os.path.dirname(sys.argv[0])
+sql = [arg[len("--execute="):] for arg in sys.argv if arg.startswith("--execute=")][0]
+with open(os.path.join(directory, "sql"), "w") as output:
+    output.write(sql)
+with open(os.path.join(directory, "data"), "wb") as output:
+    output.write(sys.stdin.buffer.read())
+if "FAIL" in sql:
+    sys.stderr.write("ERROR 1064 (42000): FAIL\\n")
+    sys.exit(1)
+'''
+
+DATA = b'1\tTier\\tone\t\\N\n2\tTier two\t6869\n'
+
+
+class TestLoadDelimited(unittest.TestCase):
+    """This class tests the mariadbdmp.load.loadDelimited function."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.fake_mysql = os.path.join(self.directory, 'mysql')
+        with open(self.fake_mysql, 'w') as fake:
+            fake.write(FAKE_MYSQL.format(python=sys.executable))
+        os.chmod(self.fake_mysql, stat.S_IRWXU)
+
+        self.real_mysql = client.MYSQL
+        client.MYSQL = self.fake_mysql
+
+    def tearDown(self):
+        client.MYSQL = self.real_mysql
+        shutil.rmtree(self.directory)
+
+    def output(self, name):
+        """Return what the fake mysql client wrote to a file."""
+        with open(os.path.join(self.directory, name), 'rb') as output:
+            return output.read()
+
+    def test_load_data_sql(self):
+        """Test the columns are listed, with binary and bit values converted."""
+        self.assertEqual(
+            load.loadDataSql('TIERS', [('ID', 'int'), ('NAME', 'varchar'),
+                                       ('DATA', 'blob'), ('FLAGS', 'bit')], '/dev/stdin'),
+            "LOAD DATA LOCAL INFILE '/dev/stdin' INTO TABLE `TIERS` CHARACTER SET utf8mb4"
+            r" FIELDS TERMINATED BY '\t' ESCAPED BY '\\' LINES TERMINATED BY '\n'"
+            " (`ID`, `NAME`, @column2, @column3)"
+            " SET `DATA` = UNHEX(@column2), `FLAGS` = CAST(CONV(@column3, 2, 10) AS UNSIGNED)")
+
+    def test_compressed(self):
+        """Test a compressed file is decompressed on the client's stdin."""
+        path = os.path.join(self.directory, 'TIERS.txt.gz')
+        with open(path, 'wb') as chunk:
+            chunk.write(gzip.compress(DATA))
+
+        load.loadDelimited('/dev/null', path, 'TIERS', [('ID', 'int')], b'SET NAMES utf8mb4;\n')
+
+        self.assertEqual(self.output('data'), DATA)
+        self.assertTrue(self.output('sql').startswith(b'SET NAMES utf8mb4;\nLOAD DATA'))
+
+    def test_error(self):
+        """Test a failed load raises an exception with mysql's error."""
+        path = os.path.join(self.directory, 'TIERS.txt')
+        with open(path, 'wb') as chunk:
+            chunk.write(DATA)
+
+        with self.assertRaisesRegex(client.CommandError, 'ERROR 1064'):
+            load.loadDelimited('/dev/null', path, 'TIERS', [('ID', 'int')], b'FAIL;\n')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that measures the phases of a run.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from mariadbdmp import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    """This class tests the mariadbdmp.metrics.Metrics class."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.textfile = os.path.join(self.directory, 'failover_fetch.prom')
+        self.history = os.path.join(self.directory, 'history.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_phase(self):
+        """Test a phase measures its child processes, and adds up when run again."""
+        run = metrics.Metrics('failover_fetch')
+
+        for _ in range(2):
+            with run.phase('mysqldump'):
+                subprocess.check_call([sys.executable, '-c',
+                                       'import sys; sys.stdout.write("x" * 100000)'],
+                                      stdout=subprocess.DEVNULL)
+
+        phase = run.phases['mysqldump']
+        self.assertTrue(phase['ok'])
+        self.assertGreater(phase['seconds'], 0)
+        self.assertGreater(phase['childCpuSeconds'], 0)
+        self.assertGreater(phase['childMaxRssBytes'], 0)
+        if os.path.exists('/proc/self/io'):
+            self.assertGreaterEqual(phase['writtenBytes'], 200000)
+
+    def test_failed_phase(self):
+        """Test a phase that raises an exception is recorded as failed."""
+        run = metrics.Metrics('failover_fetch')
+
+        with self.assertRaises(ValueError):
+            with run.phase('archive'):
+                raise ValueError()
+
+        self.assertFalse(run.phases['archive']['ok'])
+
+    def test_write(self):
+        """Test the textfile is written in the Prometheus format, and the history appended."""
+        for ok in (True, False):
+            run = metrics.Metrics('failover_fetch', self.textfile, self.history)
+            with run.phase('noFetch'):
+                pass
+            run.write(ok)
+
+        with open(self.textfile, encoding='utf-8') as textfile:
+            lines = textfile.read().splitlines()
+
+        self.assertIn('# TYPE gocdb_failover_phase_seconds gauge', lines)
+        self.assertIn('gocdb_failover_run_success{script="failover_fetch"} 0', lines)
+        self.assertEqual(len([line for line in lines if line.startswith(
+            'gocdb_failover_phase_seconds{script="failover_fetch",phase="noFetch"} ')]), 1)
+        self.assertFalse(os.path.exists(self.textfile + '.part'))
+
+        with open(self.history, encoding='utf-8') as history:
+            runs = [json.loads(line) for line in history]
+
+        self.assertEqual([record['ok'] for record in runs], [True, False])
+        self.assertEqual(list(runs[0]['phases']), ['noFetch'])
+
+    def test_unwritable(self):
+        """Test failing to write the metrics does not fail the run."""
+        run = metrics.Metrics('failover_fetch', os.path.join(self.directory, 'none', 'x.prom'))
+
+        with self.assertLogs(level='ERROR'):
+            run.write(True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+#!/usr/bin/python3
+
+"""
+This file tests the script that monitors the production instance.
+"""
+
+import asyncio
+import unittest
+
+from autoEngageFailover import monitor
+
+
+class TestDownWindow(unittest.TestCase):
+    """This class tests the autoEngageFailover.monitor.DownWindow class."""
+
+    def test_outage(self):
+        """Test an outage is down for downSeconds of the window, not in a row."""
+        window = monitor.DownWindow(120, 300)
+
+        for when, down in ((0, True), (30, False), (60, True), (90, False),
+                           (120, True), (150, True)):
+            window.record(when, down)
+
+        self.assertEqual(window.downtime(150), 90)
+        self.assertFalse(window.isOutage(150))
+        self.assertTrue(window.isOutage(180))
+
+    def test_window(self):
+        """Test time down before the window started is not counted."""
+        window = monitor.DownWindow(60, 100)
+
+        window.record(0, True)
+        window.record(80, False)
+
+        self.assertEqual(window.downtime(80), 80)
+        self.assertEqual(window.downtime(150), 30)
+        self.assertFalse(window.isOutage(150))
+
+        window.record(200, False)
+        self.assertEqual(list(window.probes), [(80, False), (200, False)])
+
+
+class TestProbe(unittest.TestCase):
+    """This class tests the autoEngageFailover.monitor.Probe class."""
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.connections = 0
+        self.requests = 0
+        self.delay = 0
+        self.writers = []
+        self.response = b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nOK'
+        self.server = self.loop.run_until_complete(
+            asyncio.start_server(self.serve, '127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:%d/monitor?check=1' % (
+            self.server.sockets[0].getsockname()[1])
+
+    def tearDown(self):
+        self.server.close()
+        # Let the handlers finish responding, and see their connections closed.
+        for writer in self.writers:
+            writer.close()
+        self.loop.run_until_complete(asyncio.sleep(self.delay + 0.05))
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+
+    async def serve(self, reader, writer):
+        """Answer each request on a connection with self.response."""
+        self.connections += 1
+        self.writers.append(writer)
+        try:
+            while True:
+                request = await reader.readuntil(b'\r\n\r\n')
+                self.assertTrue(request.startswith(b'GET /monitor?check=1 HTTP/1.1\r\n'))
+                self.requests += 1
+                await asyncio.sleep(self.delay)
+                writer.write(self.response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def check(self, probe):
+        """Return the result of a probe."""
+        return self.loop.run_until_complete(probe.check())
+
+    def test_keep_alive(self):
+        """Test the probes share one connection."""
+        probe = monitor.Probe('production', self.url, 5)
+
+        self.assertEqual([self.check(probe) for _ in range(3)], [True] * 3)
+        self.assertEqual((self.connections, self.requests), (1, 3))
+        self.assertEqual(probe.latency.count, 3)
+        probe.close()
+
+    def test_chunked(self):
+        """Test a chunked response is read to the end."""
+        self.response = (b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                         b'2\r\nOK\r\n3\r\n!!!\r\n0\r\n\r\n')
+        probe = monitor.Probe('production', self.url, 5)
+
+        self.assertEqual([self.check(probe) for _ in range(2)], [True] * 2)
+        self.assertEqual(self.connections, 1)
+        probe.close()
+
+    def test_closed(self):
+        """Test a new connection is made when the server closes one."""
+        self.response = (b'HTTP/1.1 503 Service Unavailable\r\nConnection: close\r\n'
+                         b'Content-Length: 0\r\n\r\n')
+        probe = monitor.Probe('production', self.url, 5)
+
+        with self.assertLogs(level='WARNING'):
+            self.assertEqual([self.check(probe) for _ in range(2)], [False] * 2)
+        self.assertEqual(self.connections, 2)
+        probe.close()
+
+    def test_timeout(self):
+        """Test a probe fails after its timeout, with its latency recorded."""
+        self.delay = 0.3
+        probe = monitor.Probe('production', self.url, 0.1)
+
+        with self.assertLogs(level='WARNING'):
+            self.assertFalse(self.check(probe))
+        self.assertEqual(probe.latency.counts[monitor.LATENCY_BUCKETS.index(0.25)], 1)
+        self.assertEqual(probe.latency.counts[0], 0)
+        probe.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
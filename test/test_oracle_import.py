@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+
+"""
+This file tests the script that imports a Data Pump dump into Oracle.
+"""
+
+import json
+import logging
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+
+from importDBdmpFile import failover_oracle_import
+from mariadbdmp.metrics import Metrics
+from mariadbdmp.remote import Remote
+
+# A stand in for sqlplus, recording its input, and failing if told to.
+FAKE_SQLPLUS = '''#!/usr/bin/env python3
+import os, sys
+home = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+script = sys.stdin.read()
+with open(os.path.join(home, 'sqlplus.log'), 'a') as log:
+    log.write(script + '----\\n')
+if 'all_tab_statistics' in script and os.path.exists(os.path.join(home, 'stats.txt')):
+    with open(os.path.join(home, 'stats.txt')) as stats:
+        print(stats.read())
+if os.path.exists(os.path.join(home, 'sqlplus.fail')):
+    print('ORA-01031: insufficient privileges')
+    sys.exit(1)
+'''
+
+# A stand in for impdp, recording its arguments, and failing if told to.
+FAKE_IMPDP = '''#!/usr/bin/env python3
+import os, sys
+home = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+with open(os.path.join(home, 'impdp.log'), 'a') as log:
+    log.write(' '.join(sys.argv[1:]) + '\\n')
+print('Processing object type SCHEMA_EXPORT/TABLE/TABLE_DATA')
+print('. . imported "GOCDB5"."DOWNTIMES"                        1.157 MB   11722 rows')
+if os.path.exists(os.path.join(home, 'impdp.fail')):
+    print('ORA-31693: Table data object "GOCDB5"."SITES" failed to load/unload')
+    sys.exit(5)
+print('. . imported "GOCDB5"."SITES"                            243.3 KB     650 rows')
+print('Job "SYSTEM"."SYS_IMPORT_SCHEMA_01" successfully completed at 14:29:54')
+'''
+
+CONFIG = '''[remote]
+host=
+user=
+path={0}/remote/goc5dump_*.dmp
+[local]
+noImport={0}/noImport
+dumpDir={0}/dump
+archiveDir={0}/archive
+format=_goc5dump_new
+[oracle]
+home={0}/home
+passFile={0}/pass_file
+parallel=2
+[logs]
+file={0}/updateLog.txt
+level=DEBUG
+format=%%(levelname)s: %%(message)s
+dateFormat=
+'''
+
+
+class TestOracleImport(unittest.TestCase):
+    """This class tests the importDBdmpFile.failover_oracle_import module."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for name in ('remote', 'dump', 'archive', 'home/bin'):
+            os.makedirs(os.path.join(self.dir, name))
+
+        for name, script in (('sqlplus', FAKE_SQLPLUS), ('impdp', FAKE_IMPDP)):
+            path = os.path.join(self.dir, 'home/bin', name)
+            with open(path, 'w', encoding='utf-8') as command:
+                command.write(script)
+            os.chmod(path, stat.S_IRWXU)
+
+        for number in (1, 2):
+            with open(os.path.join(self.dir, 'remote/goc5dump_%02d.dmp' % number), 'w',
+                      encoding='utf-8') as dump:
+                dump.write('new %s' % number)
+        with open(os.path.join(self.dir, 'archive/_goc5dump_old.dmp'), 'w',
+                  encoding='utf-8') as dump:
+            dump.write('old')
+
+        with open(os.path.join(self.dir, 'pass_file'), 'w', encoding='utf-8') as passFile:
+            passFile.write('userid=system/secret\n')
+        os.chmod(os.path.join(self.dir, 'pass_file'), stat.S_IRUSR | stat.S_IWUSR)
+
+        with open(os.path.join(self.dir, 'config.ini'), 'w', encoding='utf-8') as config:
+            config.write(CONFIG.format(self.dir))
+
+        self.handlers = logging.root.handlers[:]
+        self.cnf = failover_oracle_import.Conf(os.path.join(self.dir, 'config.ini'))
+
+    def tearDown(self):
+        for handler in logging.root.handlers[:]:
+            if handler not in self.handlers:
+                logging.root.removeHandler(handler)
+                handler.close()
+        shutil.rmtree(self.dir)
+
+    def runImport(self):
+        """Run an import, from the local remote directory."""
+        failover_oracle_import.runImport(self.cnf, Remote('', ''), Metrics('test'))
+
+    def logged(self, name):
+        """Return what a fake command recorded."""
+        with open(os.path.join(self.dir, 'home', name), encoding='utf-8') as log:
+            return log.read()
+
+    def test_parse_imported(self):
+        """Test the rows and size of a table, or partition, are parsed from impdp's line."""
+        self.assertEqual(failover_oracle_import.parseImported(
+            '. . imported "GOCDB5"."SITES"    243.3 KB     650 rows\n', 1.5),
+            {'schema': 'GOCDB5', 'table': 'SITES', 'partition': None, 'rows': 650,
+             'bytes': 249139, 'seconds': 1.5})
+        self.assertEqual(failover_oracle_import.parseImported(
+            '. . imported "GOCDB5"."LOGS":"P1"    0 KB       0 rows', 0)['partition'], 'P1')
+        self.assertIsNone(failover_oracle_import.parseImported(
+            'Processing object type SCHEMA_EXPORT/TABLE/TABLE_DATA', 0))
+
+    def test_import(self):
+        """Test the dump-file set is imported in parallel, and replaces the archived dump."""
+        self.runImport()
+
+        self.assertIn('dumpfile=goc5dump_01.dmp,goc5dump_02.dmp', self.logged('impdp.log'))
+        self.assertIn('parallel=2', self.logged('impdp.log'))
+        sqlplus = self.logged('sqlplus.log')
+        self.assertIn("CREATE OR REPLACE DIRECTORY dmpdir AS '{0}/dump';".format(self.dir),
+                      sqlplus)
+        self.assertIn("DROP USER gocdb5 CASCADE", sqlplus)
+        self.assertIn("gather_schema_stats('gocdb5')", sqlplus)
+        self.assertNotIn('secret', self.logged('impdp.log'))
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.dir, 'archive'))), [
+            '_goc5dump_new_01.dmp', '_goc5dump_new_02.dmp', 'lastImport.json'])
+        with open(os.path.join(self.dir, 'archive/lastImport.json'), encoding='utf-8') as state:
+            tables = json.load(state)['tables']
+        self.assertEqual([(table['table'], table['rows']) for table in tables],
+                         [('DOWNTIMES', 11722), ('SITES', 650)])
+
+    def test_import_failed(self):
+        """Test a failed import keeps the archived dump, and discards the copies."""
+        open(os.path.join(self.dir, 'home/impdp.fail'), 'w', encoding='utf-8').close()
+
+        with self.assertRaisesRegex(Exception, r'impdp failed \[5\]: ORA-31693'):
+            self.runImport()
+
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'archive')), ['_goc5dump_old.dmp'])
+
+    def test_fetch_failed(self):
+        """Test the archived dump is imported again if the schema was dropped for nothing."""
+        for name in os.listdir(os.path.join(self.dir, 'remote')):
+            os.remove(os.path.join(self.dir, 'remote', name))
+
+        with self.assertRaisesRegex(Exception, 'cannot stat'):
+            self.runImport()
+
+        # Imported from a copy in dumpDir, as the server may not read archiveDir.
+        self.assertNotIn("'{0}/archive'".format(self.dir), self.logged('sqlplus.log'))
+        self.assertIn('dumpfile=_goc5dump_old.dmp ', self.logged('impdp.log'))
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'dump')), [])
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'archive')), ['_goc5dump_old.dmp'])
+
+    def test_restore_failed(self):
+        """Test a failed restore is reported with the failed fetch, as leaving the schema empty."""
+        for name in os.listdir(os.path.join(self.dir, 'remote')):
+            os.remove(os.path.join(self.dir, 'remote', name))
+        open(os.path.join(self.dir, 'home/impdp.fail'), 'w', encoding='utf-8').close()
+
+        with self.assertRaisesRegex(Exception, 'cannot stat.*restoring the last imported dump'
+                                    ' also failed, so schema gocdb5 is EMPTY: impdp failed'):
+            self.runImport()
+
+        self.assertEqual(os.listdir(os.path.join(self.dir, 'dump')), [])
+
+    def test_nothing_to_restore(self):
+        """Test the schema is reported empty if there is no imported dump to restore."""
+        for directory in ('remote', 'archive'):
+            for name in os.listdir(os.path.join(self.dir, directory)):
+                os.remove(os.path.join(self.dir, directory, name))
+
+        with self.assertRaisesRegex(Exception, 'is EMPTY: no imported dump in '):
+            self.runImport()
+
+    def test_drop_failed(self):
+        """Test nothing is imported if the schema is not dropped."""
+        open(os.path.join(self.dir, 'home/sqlplus.fail'), 'w', encoding='utf-8').close()
+
+        with self.assertRaisesRegex(Exception, 'create directory failed .1.: ORA-01031'):
+            self.runImport()
+
+        self.assertFalse(os.path.exists(os.path.join(self.dir, 'home/impdp.log')))
+
+    def test_stale_tables(self):
+        """Test only tables whose rows changed beyond the threshold, or without stats, are stale."""
+        records = [{'table': 'DOWNTIMES', 'rows': 11722}, {'table': 'LOGS', 'rows': 60},
+                   {'table': 'LOGS', 'rows': 60}, {'table': 'NGIS', 'rows': 38},
+                   {'table': 'STATS', 'rows': 900}, {'table': 'TIERS', 'rows': 0}]
+
+        self.assertEqual(failover_oracle_import.staleTables(
+            records, {'DOWNTIMES': 11000, 'LOGS': 100, 'NGIS': None, 'TIERS': 0}, 0.1,
+            'stats'), ['LOGS', 'NGIS'])
+
+    def test_changed_stats(self):
+        """Test the imported statistics are kept, and only those of changed tables regathered."""
+        self.cnf.stats = 'changed'
+        with open(os.path.join(self.dir, 'home/stats.txt'), 'w', encoding='utf-8') as stats:
+            stats.write('DOWNTIMES                          11000\nSITES  100\n')
+
+        with self.assertLogs(level='INFO') as logs:
+            self.runImport()
+
+        sqlplus = self.logged('sqlplus.log')
+        self.assertNotIn('gather_schema_stats', sqlplus)
+        self.assertNotIn('import_schema_stats', sqlplus)
+        self.assertIn("EXEC DBMS_STATS.gather_table_stats('gocdb5', 'SITES');", sqlplus)
+        self.assertNotIn("'DOWNTIMES'", sqlplus)
+        self.assertIn('kept the imported statistics of 1 tables, regathered 1', logs.output[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that dumps a database over several connections.
+"""
+
+import unittest
+
+from mariadbdmp import paralleldump
+
+
+class FakeSession:
+    """A stand in for mariadbdmp.client.Session returning canned results."""
+
+    def __init__(self, results):
+        self.results = results
+        self.statements = []
+
+    def query(self, sql):
+        self.statements.append(sql)
+        return self.results.pop(0)
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+
+class TestParallelDump(unittest.TestCase):
+    """This class tests the mariadbdmp.paralleldump module."""
+
+    def test_row_expression(self):
+        """Test the SQL used to dump each row."""
+        self.assertEqual(
+            paralleldump.rowExpression([('ID', 'int'), ('DATA', 'blob')]),
+            r"CONCAT('(', CONCAT_WS(',', "
+            r"REPLACE(REPLACE(QUOTE(`ID`), '\n', '\\n'), '\r', '\\r'), "
+            r"IF(`DATA` IS NULL, 'NULL', CONCAT('X''', HEX(`DATA`), ''''))), ')')",
+        )
+
+    def test_tab_row_expression(self):
+        """Test the SQL used to dump each row as tab delimited fields."""
+        self.assertEqual(
+            paralleldump.tabRowExpression([('ID', 'int'), ('NAME', 'varchar'),
+                                           ('DATA', 'blob')]),
+            r"CONCAT_WS('\t', IFNULL(`ID`, '\\N'), "
+            r"IFNULL(REPLACE(REPLACE(REPLACE(REPLACE(REPLACE(`NAME`, '\\', '\\\\'),"
+            r" '\t', '\\t'), '\n', '\\n'), '\r', '\\r'), CHAR(0), '\\0'), '\\N'), "
+            r"IFNULL(HEX(`DATA`), '\\N'))",
+        )
+
+    def test_schema_under_lock(self):
+        """Test the schema is dumped after the snapshots start, before the lock is released."""
+        coordinator = FakeSession([])
+        worker = FakeSession([])
+
+        paralleldump.startSnapshots(coordinator, [worker],
+                                    lambda: coordinator.statements.append('dump schema'))
+
+        self.assertEqual(coordinator.statements[-4:], [
+            'FLUSH TABLES WITH READ LOCK',
+            'START TRANSACTION WITH CONSISTENT SNAPSHOT',
+            'dump schema',
+            'UNLOCK TABLES',
+        ])
+        self.assertEqual(worker.statements[-1], 'START TRANSACTION WITH CONSISTENT SNAPSHOT')
+
+    def test_key_ranges(self):
+        """Test a table is split into ranges covering every key."""
+        session = FakeSession([[['1', '1000']]])
+
+        self.assertEqual(
+            paralleldump.keyRanges(session, 'DOWNTIMES', 'ID', 4),
+            [
+                '`ID` < 251',
+                '`ID` >= 251 AND `ID` < 501',
+                '`ID` >= 501 AND `ID` < 751',
+                '`ID` >= 751',
+            ],
+        )
+
+    def test_key_ranges_empty_table(self):
+        """Test an empty table is dumped as a single chunk."""
+        session = FakeSession([[['NULL', 'NULL']]])
+
+        self.assertEqual(
+            paralleldump.keyRanges(session, 'DOWNTIMES', 'ID', 4),
+            [None],
+        )
+
+    def test_plan_chunks(self):
+        """Test only large tables with an integer primary key are split."""
+        session = FakeSession([
+            # Columns
+            [
+                ['DOWNTIMES', 'ID', 'int', ''],
+                ['DOWNTIMES', 'DESCRIPTION', 'varchar', ''],
+                ['SERVICES_SCOPES', 'SERVICE_ID', 'int', ''],
+                ['SERVICES_SCOPES', 'SCOPE_ID', 'int', ''],
+                ['SERVICES_SCOPES', 'LABEL', 'varchar', 'VIRTUAL GENERATED'],
+            ],
+            # Primary keys
+            [
+                ['DOWNTIMES', 'ID'],
+                ['SERVICES_SCOPES', 'SERVICE_ID'],
+                ['SERVICES_SCOPES', 'SCOPE_ID'],
+            ],
+            # Tables
+            [
+                ['DOWNTIMES', '25', '2000'],
+                ['SERVICES_SCOPES', '25', '1000'],
+            ],
+            # DOWNTIMES primary key range
+            [['1', '30']],
+        ])
+
+        columns, chunks = paralleldump.planChunks(session, 'gocdb', 10, '.gz')
+
+        self.assertEqual(columns['SERVICES_SCOPES'],
+                         [('SERVICE_ID', 'int'), ('SCOPE_ID', 'int')])
+        self.assertEqual(
+            [(chunk['file'], chunk['where'], chunk['order']) for chunk in chunks],
+            # Largest chunks first.
+            [
+                ('SERVICES_SCOPES.sql.gz', None, '`SERVICE_ID`, `SCOPE_ID`'),
+                ('DOWNTIMES.000.sql.gz', '`ID` < 11', '`ID`'),
+                ('DOWNTIMES.001.sql.gz', '`ID` >= 11 AND `ID` < 21', '`ID`'),
+                ('DOWNTIMES.002.sql.gz', '`ID` >= 21', '`ID`'),
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
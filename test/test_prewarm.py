@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that warms the buffer pool of a loaded database.
+"""
+
+import os
+import tempfile
+import unittest
+
+from mariadbdmp import client, prewarm
+
+
+class FakeSession:
+    """A stand in for mariadbdmp.client.Session, counting buffer pool reads."""
+
+    # The statements run, by any session.
+    statements = []
+
+    # The buffer pool read requests and reads from disk so far.
+    status = {'Innodb_buffer_pool_read_requests': 0, 'Innodb_buffer_pool_reads': 0}
+
+    def __init__(self, optionsPath):
+        pass
+
+    def query(self, sql):
+        if 'information_schema.STATISTICS' in sql:
+            return [['SITES', 'PRIMARY'], ['SITES', 'IDX_SITE_NGI']]
+        return [[name, str(value)] for name, value in self.status.items()] + [
+            ['Innodb_buffer_pool_pages_data', '80'], ['Innodb_buffer_pool_pages_total', '100'],
+            ['Innodb_buffer_pool_load_status', 'Loading']]
+
+    def execute(self, sql):
+        self.statements.append(sql)
+        # Each statement reads 10 pages, the first time from disk.
+        self.status['Innodb_buffer_pool_read_requests'] += 10
+        if self.statements.count(sql) == 1:
+            self.status['Innodb_buffer_pool_reads'] += 10
+
+    def close(self):
+        pass
+
+
+class TestPrewarm(unittest.TestCase):
+    """This class tests the mariadbdmp.prewarm module."""
+
+    def setUp(self):
+        FakeSession.statements = []
+        self.real = client.Session, prewarm.Session
+        client.Session = prewarm.Session = FakeSession
+
+    def tearDown(self):
+        client.Session, prewarm.Session = self.real
+
+    def test_read_queries(self):
+        """Test the statements of a file are read, less comments."""
+        with tempfile.NamedTemporaryFile('w', suffix='.sql', delete=False) as sqlFile:
+            sqlFile.write("-- Sites by name\nSELECT * FROM SITES\n WHERE NAME = 'a;b';\n\n"
+                          "SELECT 1;\n")
+        self.addCleanup(os.remove, sqlFile.name)
+
+        self.assertEqual(prewarm.readQueries(sqlFile.name),
+                         ["SELECT * FROM SITES\n WHERE NAME = 'a;b'", 'SELECT 1'])
+
+    def test_prewarm(self):
+        """Test every index is read, and the hit rate is of the queries run again."""
+        with self.assertLogs(level='INFO') as logs:
+            hitRate = prewarm.prewarm('options', ['SITES'], ['SELECT 1'], 2)
+
+        self.assertEqual(sorted(FakeSession.statements), [
+            'SELECT 1', 'SELECT 1',
+            'SELECT COUNT(*) FROM `SITES` FORCE INDEX (PRIMARY)',
+            'SELECT COUNT(*) FROM `SITES` FORCE INDEX (`IDX_SITE_NGI`)'])
+        self.assertEqual(hitRate, 1.0)
+        self.assertIn('hit rate 100.0%, 80 of 100 pages', logs.output[0])
+
+    def test_no_tables(self):
+        """Test no index is read without tables."""
+        self.assertEqual(prewarm.indexScans(FakeSession('options'), []), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
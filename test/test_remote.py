@@ -0,0 +1,78 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that inspects and copies a dump on its host.
+"""
+
+import os
+import tempfile
+import unittest
+
+from mariadbdmp import remote
+
+
+class TestRemote(unittest.TestCase):
+    """This class tests the mariadbdmp.remote.Remote class."""
+
+    def setUp(self):
+        """Create a dump file and chunked dump directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.dumpPath = os.path.join(self.directory.name, 'dump.sql')
+        with open(self.dumpPath, 'w', encoding='utf-8') as dumpFile:
+            dumpFile.write('CREATE TABLE `TIERS` (`ID` int);\n')
+
+        self.chunkedPath = os.path.join(self.directory.name, 'chunked')
+        os.mkdir(self.chunkedPath)
+        with open(os.path.join(self.chunkedPath, 'manifest.json'), 'w',
+                  encoding='utf-8') as manifestFile:
+            manifestFile.write('{}')
+
+    def tearDown(self):
+        """Remove the dumps."""
+        self.directory.cleanup()
+
+    def test_ssh_multiplexed(self):
+        """Test ssh commands share the master connection when there is one."""
+        host = remote.Remote('gocdb', 'goc.example.org', '/tmp/.ssh-%C')
+        args = host.sshCommand('true')
+
+        self.assertIn('ControlMaster=auto', args)
+        self.assertIn('ControlPath=/tmp/.ssh-%C', args)
+        self.assertEqual(args[-2:], ['gocdb@goc.example.org', 'true'])
+
+        self.assertNotIn('ControlMaster=auto', remote.Remote('gocdb', 'goc').sshCommand('true'))
+
+    def test_fingerprint(self):
+        """Test the fingerprint of a file, and of a chunked dump's manifest."""
+        local = remote.Remote('', '')
+
+        fingerprint = local.fingerprint(self.dumpPath, checksum=True)
+        self.assertEqual(fingerprint['size'], 33)
+        self.assertEqual(len(fingerprint['sha256']), 64)
+
+        fingerprint = local.fingerprint(self.chunkedPath, True, 'manifest.json')
+        self.assertTrue(fingerprint['path'].endswith('/manifest.json'))
+        self.assertEqual(fingerprint['size'], 2)
+
+    def test_same_fingerprint(self):
+        """Test a checksum, when there is one, overrides the modification time."""
+        local = remote.Remote('', '')
+        previous = local.fingerprint(self.dumpPath)
+
+        self.assertFalse(remote.sameFingerprint(None, previous))
+        self.assertTrue(remote.sameFingerprint(previous, dict(previous)))
+        self.assertFalse(remote.sameFingerprint(previous, dict(previous, mtime=0)))
+
+        previous = local.fingerprint(self.dumpPath, checksum=True)
+        self.assertTrue(remote.sameFingerprint(previous, dict(previous, mtime=0)))
+
+    def test_copy(self):
+        """Test a local copy."""
+        os.mkdir(os.path.join(self.directory.name, 'work'))
+        remote.Remote('', '').copy(self.dumpPath, os.path.join(self.directory.name, 'work'))
+
+        self.assertTrue(os.path.isfile(os.path.join(self.directory.name, 'work', 'dump.sql')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that splits a schema dump into loading phases.
+"""
+
+import unittest
+
+from mariadbdmp import schema
+
+# An abridged schema, as dumped by mysqldump --no-data --routines.
+SCHEMA = """/*!40101 SET NAMES utf8mb4 */;
+/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, FOREIGN_KEY_CHECKS=0 */;
+DROP TABLE IF EXISTS `DOWNTIMES`;
+CREATE TABLE `DOWNTIMES` (
+  `ID` int(11) NOT NULL AUTO_INCREMENT,
+  `PRIMARYKEY` varchar(255) NOT NULL,
+  `SERVICE_ID` int(11) DEFAULT NULL,
+  PRIMARY KEY (`ID`),
+  UNIQUE KEY `UNIQ_PK` (`PRIMARYKEY`),
+  KEY `IDX_SERVICE` (`SERVICE_ID`),
+  CONSTRAINT `FK_SERVICE` FOREIGN KEY (`SERVICE_ID`) REFERENCES `SERVICES` (`ID`)
+) ENGINE=InnoDB AUTO_INCREMENT=42 DEFAULT CHARSET=utf8mb4;
+/*!50003 SET @saved_sql_mode       = @@sql_mode */ ;
+DELIMITER ;;
+/*!50003 CREATE*/ /*!50003 TRIGGER `T` BEFORE INSERT ON `DOWNTIMES` FOR EACH ROW BEGIN
+  SET NEW.ID = NEW.ID;
+END */;;
+DELIMITER ;
+/*!50003 SET sql_mode              = @saved_sql_mode */ ;
+DROP TABLE IF EXISTS `TIERS`;
+CREATE TABLE `TIERS` (
+  `ID` int(11) NOT NULL AUTO_INCREMENT,
+  `NAME` varchar(255) NOT NULL,
+  PRIMARY KEY (`ID`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;
+"""
+
+
+class TestSplitSchema(unittest.TestCase):
+    """This class tests the mariadbdmp.schema.splitSchema function."""
+
+    def setUp(self):
+        (self.tables, self.indexes,
+         self.foreign_keys, self.post) = schema.splitSchema(SCHEMA)
+
+    def test_tables(self):
+        """Test tables are created with only their primary keys."""
+        self.assertEqual(
+            self.tables,
+            "/*!40101 SET NAMES utf8mb4 */;\n"
+            "/*!40014 SET @OLD_FOREIGN_KEY_CHECKS=@@FOREIGN_KEY_CHECKS, "
+            "FOREIGN_KEY_CHECKS=0 */;\n"
+            "DROP TABLE IF EXISTS `DOWNTIMES`;\n"
+            "CREATE TABLE `DOWNTIMES` (\n"
+            "  `ID` int(11) NOT NULL AUTO_INCREMENT,\n"
+            "  `PRIMARYKEY` varchar(255) NOT NULL,\n"
+            "  `SERVICE_ID` int(11) DEFAULT NULL,\n"
+            "  PRIMARY KEY (`ID`)\n"
+            ") ENGINE=InnoDB AUTO_INCREMENT=42 DEFAULT CHARSET=utf8mb4;\n"
+            "DROP TABLE IF EXISTS `TIERS`;\n"
+            "CREATE TABLE `TIERS` (\n"
+            "  `ID` int(11) NOT NULL AUTO_INCREMENT,\n"
+            "  `NAME` varchar(255) NOT NULL,\n"
+            "  PRIMARY KEY (`ID`)\n"
+            ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;\n"
+            "/*!40014 SET FOREIGN_KEY_CHECKS=@OLD_FOREIGN_KEY_CHECKS */;\n",
+        )
+
+    def test_indexes(self):
+        """Test secondary indexes are added in one statement per table."""
+        self.assertEqual(
+            self.indexes,
+            ["ALTER TABLE `DOWNTIMES` ADD UNIQUE KEY `UNIQ_PK` (`PRIMARYKEY`), "
+             "ADD KEY `IDX_SERVICE` (`SERVICE_ID`)"],
+        )
+
+    def test_foreign_keys(self):
+        """Test foreign keys are added separately from the indexes."""
+        self.assertEqual(
+            self.foreign_keys,
+            ["ALTER TABLE `DOWNTIMES` ADD CONSTRAINT `FK_SERVICE` FOREIGN KEY "
+             "(`SERVICE_ID`) REFERENCES `SERVICES` (`ID`)"],
+        )
+
+    def test_post(self):
+        """Test triggers, and their settings, are created last."""
+        self.assertEqual(self.post.splitlines()[0], "/*!40101 SET NAMES utf8mb4 */;")
+        self.assertIn("TRIGGER `T` BEFORE INSERT", self.post)
+        self.assertEqual(self.post.count("/*!50003 SET"), 2)
+        self.assertTrue(self.post.rstrip().endswith("@saved_sql_mode */ ;"))
+
+
+class TestSchemaSplitter(unittest.TestCase):
+    """This class tests the mariadbdmp.schema.SchemaSplitter class."""
+
+    def test_data_passed_through(self):
+        """Test the data in a full dump is passed through unchanged."""
+        insert = b"INSERT INTO `DOWNTIMES` VALUES (1,'KEY ',NULL);\n"
+        dump = SCHEMA.encode().replace(
+            b"/*!50003 SET @saved_sql_mode", insert + b"/*!50003 SET @saved_sql_mode")
+
+        splitter = schema.SchemaSplitter()
+        lines = list(splitter.filter(dump.splitlines(True)))
+
+        self.assertIn(insert, lines)
+        self.assertEqual(splitter.tables, ['DOWNTIMES', 'TIERS'])
+        self.assertEqual(len(splitter.indexes), 1)
+        self.assertEqual(len(splitter.foreignKeys), 1)
+
+    def test_count_rows(self):
+        """Test the rows inserted into each table are counted, if asked to."""
+        inserts = (b"INSERT INTO `DOWNTIMES` VALUES (1,'a),(b'),(2,NULL);\n"
+                   b"INSERT INTO `DOWNTIMES` VALUES (3,NULL);\n")
+        dump = SCHEMA.encode().replace(
+            b"/*!50003 SET @saved_sql_mode", inserts + b"/*!50003 SET @saved_sql_mode")
+
+        splitter = schema.SchemaSplitter(countRows=True)
+        list(splitter.filter(dump.splitlines(True)))
+        self.assertEqual(splitter.rows, {'DOWNTIMES': 3})
+
+        splitter = schema.SchemaSplitter()
+        list(splitter.filter(dump.splitlines(True)))
+        self.assertEqual(splitter.rows, {})
+
+
+class TestWithoutDatabaseStatements(unittest.TestCase):
+    """This class tests the mariadbdmp.schema.withoutDatabaseStatements function."""
+
+    def test_database_statements_removed(self):
+        """Test the statements mysqldump --databases adds are removed."""
+        lines = [b'CREATE DATABASE /*!32312 IF NOT EXISTS*/ `gocdb`;\n', b'\n',
+                 b'USE `gocdb`;\n', b'DROP TABLE IF EXISTS `TIERS`;\n']
+
+        self.assertEqual(list(schema.withoutDatabaseStatements(lines)),
+                         [b'\n', b'DROP TABLE IF EXISTS `TIERS`;\n'])
+
+
+class TestDumpSections(unittest.TestCase):
+    """This class tests the mariadbdmp.schema.dumpSections function."""
+
+    def test_sections(self):
+        """Test a dump is split at the comments starting each table and view."""
+        lines = [b'SET NAMES utf8mb4;\n',
+                 b'-- Table structure for table `TIERS`\n', b'CREATE TABLE `TIERS` (\n',
+                 b'-- Dumping data for table `TIERS`\n', b'INSERT INTO `TIERS` VALUES (1);\n',
+                 b'-- Final view structure for view `TIER_VIEW`\n', b'CREATE VIEW\n']
+
+        self.assertEqual([(name, list(section))
+                          for name, section in schema.dumpSections(lines)],
+                         [(None, lines[:1]),
+                          ('Table structure for table `TIERS`', lines[1:5]),
+                          ('Final view structure for view `TIER_VIEW`', lines[5:])])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that swaps a shadow database in for the live one.
+"""
+
+import re
+import unittest
+
+from mariadbdmp import shadow
+
+
+class FakeSession:
+    """A stand in for mariadbdmp.client.Session, answering from a model of the server."""
+
+    def __init__(self, tables, triggers=None, views=None):
+        # The tables, triggers and views in each database, by database name.
+        self.tables = tables
+        self.triggers = triggers or {}
+        self.views = views or {}
+        self.statements = []
+
+    def query(self, sql):
+        database = re.search(r"SCHEMA(?:_NAME)? = '([^']*)'", sql).group(1)
+        if 'information_schema.TABLES' in sql:
+            return [[table] for table in self.tables.get(database, [])]
+        if 'information_schema.SCHEMATA' in sql:
+            return [['utf8mb4', 'utf8mb4_general_ci']] if database in self.tables else []
+        if 'information_schema.TRIGGERS' in sql:
+            return self.triggers.get(database, [])
+        if 'SELECT TABLE_NAME FROM information_schema.VIEWS' in sql:
+            return [[view[0]] for view in self.views.get(database, [])]
+        return [[name, definition.encode().hex(), 'DEFINER', 'root@localhost']
+                for name, definition in self.views.get(database, [])]
+
+    def execute(self, sql):
+        self.statements.append(sql)
+
+
+class TestSwap(unittest.TestCase):
+    """This class tests the mariadbdmp.shadow.swap and rollback functions."""
+
+    def test_swap(self):
+        """Test every table is moved in one statement, after the triggers are dropped."""
+        session = FakeSession(
+            {'gocdb': ['SITES', 'TIERS'], 'gocdb_shadow': ['SITES', 'SERVICES']},
+            triggers={'gocdb': [['T_SITES', 'SITES', 'BEFORE', 'INSERT',
+                                 b'SET NEW.ID = NEW.ID'.hex(), 'root@%', '']]})
+
+        triggersSql = shadow.swap(session, 'gocdb', 'gocdb_shadow', 'gocdb_previous')
+
+        self.assertEqual(session.statements[:5], [
+            'CREATE DATABASE IF NOT EXISTS `gocdb`',
+            'DROP DATABASE IF EXISTS `gocdb_previous`',
+            'CREATE DATABASE `gocdb_previous` CHARACTER SET utf8mb4'
+            ' COLLATE utf8mb4_general_ci',
+            'DROP TRIGGER `gocdb`.`T_SITES`',
+            'RENAME TABLE `gocdb`.`SITES` TO `gocdb_previous`.`SITES`,'
+            ' `gocdb`.`TIERS` TO `gocdb_previous`.`TIERS`,'
+            ' `gocdb_shadow`.`SITES` TO `gocdb`.`SITES`,'
+            ' `gocdb_shadow`.`SERVICES` TO `gocdb`.`SERVICES`',
+        ])
+        self.assertIn("CREATE DEFINER='root'@'%' TRIGGER `T_SITES` BEFORE INSERT ON `SITES`"
+                      " FOR EACH ROW SET NEW.ID = NEW.ID;;", triggersSql)
+
+    def test_rollback(self):
+        """Test the live and previous tables are exchanged in one statement."""
+        session = FakeSession({'gocdb': ['SITES'], 'gocdb_previous': ['SITES', 'TIERS']})
+
+        shadow.rollback(session, 'gocdb', 'gocdb_shadow', 'gocdb_previous')
+
+        self.assertEqual(session.statements[-1],
+                         'RENAME TABLE `gocdb`.`SITES` TO `gocdb_shadow`.`SITES`,'
+                         ' `gocdb_previous`.`SITES` TO `gocdb`.`SITES`,'
+                         ' `gocdb_previous`.`TIERS` TO `gocdb`.`TIERS`,'
+                         ' `gocdb_shadow`.`SITES` TO `gocdb_previous`.`SITES`')
+
+    def test_rollback_without_previous(self):
+        """Test there is no rollback with no previous generation."""
+        session = FakeSession({'gocdb': ['SITES']})
+
+        with self.assertRaisesRegex(Exception, 'no tables'):
+            shadow.rollback(session, 'gocdb', 'gocdb_shadow', 'gocdb_previous')
+        self.assertEqual(session.statements, [])
+
+
+class TestViews(unittest.TestCase):
+    """This class tests the views are recreated in the live database."""
+
+    def test_copy_views(self):
+        """Test views are created after the views they use, referring to the live tables."""
+        session = FakeSession({}, views={
+            'gocdb_shadow': [
+                ('A_SITE_NAMES', 'select `gocdb_shadow`.`V_SITES`.`NAME` AS `NAME`'
+                                 ' from `gocdb_shadow`.`V_SITES`'),
+                ('V_SITES', 'select `gocdb_shadow`.`SITES`.`NAME` AS `NAME`'
+                            ' from `gocdb_shadow`.`SITES`'),
+            ],
+        })
+
+        shadow.copyViews(session, 'gocdb_shadow', 'gocdb')
+
+        self.assertEqual(session.statements, [
+            "CREATE DEFINER='root'@'localhost' SQL SECURITY DEFINER VIEW `gocdb`.`V_SITES` AS"
+            " select `gocdb`.`SITES`.`NAME` AS `NAME` from `gocdb`.`SITES`",
+            "CREATE DEFINER='root'@'localhost' SQL SECURITY DEFINER VIEW `gocdb`.`A_SITE_NAMES`"
+            " AS select `gocdb`.`V_SITES`.`NAME` AS `NAME` from `gocdb`.`V_SITES`",
+        ])
+
+
+class TestValidate(unittest.TestCase):
+    """This class tests the mariadbdmp.shadow.validate function."""
+
+    def test_missing_table(self):
+        """Test a shadow database missing a table the dump created is rejected."""
+        session = FakeSession({'gocdb_shadow': ['SITES']})
+
+        shadow.validate(session, 'gocdb_shadow', ['SITES'])
+        with self.assertRaisesRegex(Exception, 'missing tables: TIERS'):
+            shadow.validate(session, 'gocdb_shadow', ['SITES', 'TIERS'])
+        with self.assertRaisesRegex(Exception, 'no tables'):
+            shadow.validate(session, 'gocdb_empty', [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that streams and decompresses a dump.
+"""
+
+import gzip
+import io
+import lzma
+import unittest
+import zipfile
+
+from mariadbdmp import stream
+
+DUMP = b''.join(b"INSERT INTO `TIERS` VALUES (%d,'Tier %d');\n" % (i, i)
+                for i in range(20000))
+
+
+def blocks(data, size=4096):
+    """Split data into blocks of the given size."""
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class UnseekableFile(io.RawIOBase):
+    """A write only file, so zipfile writes data descriptors."""
+
+    def __init__(self):
+        """Start empty."""
+        super().__init__()
+        self.data = bytearray()
+
+    def writable(self):
+        """Allow writing."""
+        return True
+
+    def write(self, data):
+        """Append the data."""
+        self.data += data
+        return len(data)
+
+
+class TestDecompressBlocks(unittest.TestCase):
+    """This class tests the mariadbdmp.stream.decompressBlocks function."""
+
+    def assertDecompresses(self, data, path):
+        """Assert data, split into blocks, decompresses to DUMP."""
+        self.assertEqual(b''.join(stream.decompressBlocks(blocks(data), path)), DUMP)
+
+    def zipArchive(self, compression, count=1):
+        """Return a zip archive containing count copies of DUMP."""
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, 'w', compression) as output:
+            for i in range(count):
+                output.writestr('dump%d.sql' % i, DUMP)
+        return archive.getvalue()
+
+    def test_uncompressed(self):
+        """Test an uncompressed dump is passed through."""
+        self.assertDecompresses(DUMP, 'dump.sql')
+
+    def test_zip(self):
+        """Test deflated and stored zip archives."""
+        self.assertDecompresses(self.zipArchive(zipfile.ZIP_DEFLATED), 'dump.zip')
+        self.assertDecompresses(self.zipArchive(zipfile.ZIP_STORED), 'dump.zip')
+
+    def test_zip_data_descriptor(self):
+        """Test a zip archive written as a stream, with sizes after the data."""
+        archive = UnseekableFile()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as output:
+            with output.open('dump.sql', 'w') as member:
+                member.write(DUMP)
+
+        self.assertDecompresses(bytes(archive.data), 'dump.zip')
+
+    def test_zip_many_files(self):
+        """Test a zip archive with more than one file is rejected."""
+        with self.assertRaisesRegex(Exception, 'only 1 file'):
+            self.assertDecompresses(self.zipArchive(zipfile.ZIP_DEFLATED, 2), 'dump.zip')
+
+    def test_zip_corrupt(self):
+        """Test a zip archive with the wrong CRC is rejected."""
+        archive = bytearray(self.zipArchive(zipfile.ZIP_STORED))
+        archive[100] ^= 0xFF
+
+        with self.assertRaisesRegex(Exception, 'CRC'):
+            self.assertDecompresses(bytes(archive), 'dump.zip')
+
+    def test_gzip(self):
+        """Test a gzip dump, as concatenated gzip streams."""
+        data = gzip.compress(DUMP[:1000]) + gzip.compress(DUMP[1000:])
+        self.assertDecompresses(data, 'dump.sql.gz')
+
+    def test_xz(self):
+        """Test an xz dump, and a truncated one."""
+        data = lzma.compress(DUMP)
+        self.assertDecompresses(data, 'dump.sql.xz')
+
+        with self.assertRaisesRegex(Exception, 'truncated'):
+            self.assertDecompresses(data[:-100], 'dump.sql.xz')
+
+    def test_bounded(self):
+        """Test a highly compressed dump is decompressed a block at a time."""
+        data = b"\n" * (16 * 1024 * 1024)
+
+        for compressed, path in ((gzip.compress(data), 'dump.sql.gz'),
+                                 (lzma.compress(data), 'dump.sql.xz')):
+            sizes = [len(block) for block in stream.decompressBlocks([compressed], path)]
+            self.assertEqual(sum(sizes), len(data))
+            self.assertLessEqual(max(sizes), stream.COPY_BUFFER_SIZE)
+
+
+class TestBlockLines(unittest.TestCase):
+    """This class tests the mariadbdmp.stream.blockLines function."""
+
+    def test_lines(self):
+        """Test lines split across blocks, and a last line with no newline."""
+        self.assertEqual(list(stream.blockLines([b'a\nb', b'c', b'\nd'])),
+                         [b'a\n', b'bc\n', b'd'])
+        self.assertEqual(b''.join(stream.blockLines(blocks(DUMP, 7))), DUMP)
+
+
+if __name__ == "__main__":
+    unittest.main()
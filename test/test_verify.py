@@ -0,0 +1,108 @@
+#!/usr/bin/python3
+
+"""
+This file tests the module that checks a loaded database against its dump.
+"""
+
+import functools
+import re
+import unittest
+
+from mariadbdmp import client, verify
+
+# The keys of the rows in each table of the fake server.
+TABLES = {'DOWNTIMES': list(range(1, 1001)), 'NGIS': [1, 2, 3]}
+
+
+class FakeSession:
+    """A stand in for mariadbdmp.client.Session, answering from TABLES."""
+
+    def __init__(self, tables, optionsPath):
+        self.tables = tables
+
+    def query(self, sql):
+        if 'information_schema.COLUMNS' in sql:
+            return [[table, column, dataType] for table in sorted(self.tables)
+                    for column, dataType in (('ID', 'bigint'), ('NAME', 'varchar'))]
+        if 'information_schema.KEY_COLUMN_USAGE' in sql:
+            return [[table, 'ID'] for table in sorted(self.tables)]
+        if 'information_schema.TABLES' in sql:
+            return [[table, str(len(keys))] for table, keys in self.tables.items()]
+
+        table = re.search(r'FROM `(\w+)`', sql).group(1)
+        keys = self.tables[table]
+        if sql.startswith('SELECT MIN'):
+            return [[str(min(keys)), str(max(keys))]]
+
+        for operator, bound in re.findall(r'`ID` (<|>=) (\d+)', sql):
+            keys = [key for key in keys
+                    if (key < int(bound) if operator == '<' else key >= int(bound))]
+
+        # Each row's digest is its key.
+        return [[str(len(keys)), str(functools.reduce(lambda a, b: a ^ b, keys, 0))]]
+
+    def close(self):
+        pass
+
+
+class TestVerify(unittest.TestCase):
+    """This class tests the mariadbdmp.verify module."""
+
+    def setUp(self):
+        self.expected = {'DOWNTIMES': {'rows': 1000, 'digest': 'a'},
+                         'NGIS': {'rows': 3, 'digest': 'b'}}
+        self.real = client.Session, verify.Session, verify.CHUNK_ROWS
+        client.Session = verify.Session = functools.partial(FakeSession, TABLES)
+        verify.CHUNK_ROWS = 300
+
+    def tearDown(self):
+        client.Session, verify.Session, verify.CHUNK_ROWS = self.real
+
+    def test_ranges(self):
+        """Test a large table is split into ranges of its key, and started first."""
+        ranges = verify.planRanges(FakeSession(TABLES, None), ['NGIS', 'DOWNTIMES'])
+
+        self.assertEqual([table for table, _ in ranges], ['DOWNTIMES'] * 4 + ['NGIS'])
+        self.assertTrue(ranges[0][1].endswith(' FROM `DOWNTIMES` WHERE `ID` < 251'))
+        self.assertTrue(ranges[-1][1].endswith(' FROM `NGIS`'))
+        self.assertIn("MD5(CONCAT_WS('#', `ID`, `NAME`, CONCAT(ISNULL(`ID`), ISNULL(`NAME`))))",
+                      ranges[-1][1])
+
+    def test_verified(self):
+        """Test the rows and checksums of the ranges add up to those of the tables."""
+        with self.assertLogs(level='INFO'):
+            verified = verify.verifyTables('options', self.expected, {}, 3)
+
+        self.assertEqual(verified['DOWNTIMES'], {
+            'digest': 'a', 'rows': 1000,
+            'checksum': functools.reduce(lambda a, b: a ^ b, range(1, 1001))})
+        self.assertEqual(verified['NGIS']['checksum'], 1 ^ 2 ^ 3)
+
+    def test_missing_rows(self):
+        """Test a table without the rows of the dump fails."""
+        self.expected['NGIS']['rows'] = 4
+
+        with self.assertRaisesRegex(Exception, 'NGIS has 3 rows, the dump 4'):
+            verify.verifyTables('options', self.expected, {}, 3)
+
+    def test_missing_table(self):
+        """Test a table of the dump missing from the database fails."""
+        self.expected['SITES'] = {'rows': 0, 'digest': None}
+
+        with self.assertRaisesRegex(Exception, 'missing from the database: SITES'):
+            verify.verifyTables('options', self.expected, {}, 3)
+
+    def test_checksum(self):
+        """Test the checksum is only compared with one of the same data."""
+        recorded = {'NGIS': {'digest': 'b', 'rows': 3, 'checksum': 7}}
+
+        with self.assertRaisesRegex(Exception, 'NGIS differs from the last load'):
+            verify.verifyTables('options', self.expected, recorded, 3)
+
+        recorded['NGIS']['digest'] = 'c'
+        with self.assertLogs(level='INFO'):
+            verify.verifyTables('options', self.expected, recorded, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()